@@ -4,15 +4,25 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from io import BytesIO
-import base64
-import soundfile as sf
 from datetime import datetime, timedelta
-import streamlit.components.v1 as components
 import time
 import os
 
+# Modul ringan / dipakai di semua halaman. Yang berat atau khusus satu halaman di-import saat
+# dipakai: nadi_ingest & nadi_store (halaman Input / job), nadi_audio (overlay; soundfile),
+# matplotlib (di dalam nadi_charts, hanya saat grafik belum ada di cache).
+from nadi_engine import (detect_anomaly_df, rk4_forecast_bp, analyze_population_sharded,
+                         profile_anomalies, THRESHOLD_PROFILES)
+from nadi_metrics import metrics_run, end_run, stage, add_records
+from nadi_results import (query_result, prepare_result, put_result, get_result, release_result,
+                          PAGE_SIZES, KINDS)
+from nadi_schema import expand_result, has_flags, SOURCE_COL
+from nadi_charts import bp_chart_png, population_chart_png
+from nadi_trends import rolling_trends, SLOPE_WINDOW, SUSTAINED_READINGS
+from nadi_jobs import (submit_job, get_job, cancel_job, take_result, queue_position,
+                       QUEUED, FAILED, CANCELLED, DONE)
+
 # -----------------------
 # Page config & session
 # -----------------------
@@ -20,16 +30,24 @@ st.set_page_config(page_title="NADI (RK4) — Soft Blue", layout="wide")
 
 if "page" not in st.session_state:
     st.session_state.page = "beranda"
-if "last_result" not in st.session_state:
-    st.session_state.last_result = None
-if "last_context" not in st.session_state:
-    st.session_state.last_context = None
+if "last_handle" not in st.session_state:
+    # sesi hanya memegang handle ke store hasil bersama; handle juga di URL (?hasil=...)
+    # supaya hasil tetap ada setelah halaman di-refresh
+    st.session_state.last_handle = st.query_params.get("hasil")
+if "job_id" not in st.session_state:
+    # analisis populasi berjalan sebagai job di background (nadi_jobs); id juga di URL (?job=...)
+    st.session_state.job_id = st.query_params.get("job")
+
+# Diagnostik performa (waktu / baris / delta RSS per tahap): expander + JSON lines di NADI_METRICS_LOG
+diagnostics = st.sidebar.checkbox("🩺 Diagnostik performa", value=os.environ.get("NADI_DIAGNOSTICS") == "1",
+                                  key="diagnostics")
 
 # -----------------------
 # GLOBAL CSS (app look)
 # -----------------------
-st.markdown(
-    """
+# satu blok <style> (dulu dua st.markdown terpisah); tetap dikirim tiap rerun karena
+# Streamlit hanya menampilkan elemen yang dibuat pada run terakhir
+APP_CSS = """
     <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600;700&display=swap');
     :root{ --bg1: #f3f9ff; --bg2: #eaf6ff; --primary-1: #0b63d9; --muted: #6b7280; }
@@ -41,11 +59,6 @@ st.markdown(
     .spacer { margin-top:14px; margin-bottom:14px; }
     @media (max-width:600px) { .big-nadi-title { font-size:36px; } }
     </style>
-    """,
-    unsafe_allow_html=True
-)
-st.markdown(
-    """
     <style>
     button.bigglass {
     background: rgba(255, 255, 255, 0.55) !important;
@@ -65,85 +78,33 @@ st.markdown(
     box-shadow: 0 10px 28px rgba(11,99,217,0.25);
     }
     </style>
-    """,
-    unsafe_allow_html=True
-)
-# -----------------------
-# AUDIO HELPERS (siren + ting)
-# -----------------------
-def generate_siren_wav(duration=6.0, sr=44100):
-    # siren dengan pitch modulation (untuk peringatan)
-    t = np.linspace(0, duration, int(sr * duration), endpoint=False)
-    mod = 0.5 * (1 + np.sin(2 * np.pi * 2.2 * t))
-    freq = 700 + 600 * np.sin(2 * np.pi * 1.0 * t)
-    tone = 0.9 * np.sin(2 * np.pi * freq * t) * (0.6 + 0.4 * mod)
-    env = np.linspace(1, 0.01, len(t))
-    tone = tone * env
-    tone = np.clip(tone, -1, 1)
-    buf = BytesIO()
-    sf.write(buf, tone, sr, format='WAV')
-    buf.seek(0)
-    return buf.read()
-
-def generate_ting_wav(duration=3.0, sr=44100):
-    t = np.linspace(0, duration, int(sr * duration), endpoint=False)
-    tone1 = 0.7 * np.sin(2 * np.pi * 1400 * t) * np.linspace(1, 0, len(t))
-    tone2 = 0.5 * np.sin(2 * np.pi * 1800 * t) * np.linspace(1, 0, len(t))
-    tone = tone1 + 0.6 * tone2
-    tone = np.clip(tone, -1, 1)
-    buf = BytesIO()
-    sf.write(buf, tone, sr, format='WAV')
-    buf.seek(0)
-    return buf.read()
-
-def wav_bytes_to_datauri(wav_bytes):
-    b64 = base64.b64encode(wav_bytes).decode()
-    return f"data:audio/wav;base64,{b64}"
+"""
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 # -----------------------
-# RK4 PREDICTION
+# AUDIO (aset dibuat sekali per proses, lihat nadi_audio.py)
 # -----------------------
-def rk4_predict_value(last, prev, h=1.0):
-    slope = last - prev
-    def f(t, y): return slope
-    k1 = f(0, last)
-    k2 = f(h/2, last + h*k1/2)
-    k3 = f(h/2, last + h*k2/2)
-    k4 = f(h, last + h*k3)
-    return last + (h/6)*(k1 + 2*k2 + 2*k3 + k4)
-
-def rk4_predict_series(arr):
-    arr = list(arr)
-    if len(arr) < 2:
-        return None
-    return rk4_predict_value(arr[-1], arr[-2])
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+def alert_audio_html(kind, duration):
+    # Jika server.enableStaticServing aktif, audio di-serve lewat URL (di-cache browser, tidak ikut
+    # payload HTML); selain itu data URI WAV 8-bit / 11 kHz yang ringkas.
+    from nadi_audio import get_alert_audio, get_alert_datauri, write_static_audio
+    if st.get_option("server.enableStaticServing"):
+        sources = [write_static_audio(kind, duration, STATIC_DIR, encoding=enc) for enc in ("ogg", "wav8")]
+        tags = "".join(f'<source src="app/static/{fname}" type="{mime}">' for fname, mime in sources)
+    else:
+        mime = get_alert_audio(kind, duration)[1]
+        tags = f'<source src="{get_alert_datauri(kind, duration)}" type="{mime}">'
+    return f'<audio autoplay>{tags}</audio>'
 
 # -----------------------
-# ANOMALY DETECTION
-# -----------------------
-def detect_anomaly_df(df,
-                      thresh_sys_high=140,
-                      thresh_dia_high=90,
-                      thresh_sys_low=90,
-                      thresh_dia_low=60):
-    df = df.copy()
-    df['Systolic'] = pd.to_numeric(df['Systolic'], errors='coerce')
-    df['Diastolic'] = pd.to_numeric(df['Diastolic'], errors='coerce')
-    df['Hipertensi'] = (df['Systolic'] > thresh_sys_high) | (df['Diastolic'] > thresh_dia_high)
-    df['Hipotensi'] = (df['Systolic'] < thresh_sys_low) | (df['Diastolic'] < thresh_dia_low)
-    df['Anom_Total'] = df['Hipertensi'] | df['Hipotensi']
-    return df
-# -----------------------
 # RENDER NORMAL — INLINE FULLSCREEN (overlay via st.markdown)
 # -----------------------
-def render_normal_overlay(datauri=None, duration_ms=1500):
+def render_normal_overlay(audio_html="", duration_ms=1500):
     import time
     uid = str(int(time.time() * 1000))
 
-    audio_html = ""
-    if datauri:
-        audio_html = f'<audio autoplay><source src="{datauri}" type="audio/wav"></audio>'
-
     html = f"""
     <div id="normal-root-{uid}" class="nadi-popup-normal">
         <div class="nadi-popup-box">
@@ -203,8 +164,7 @@ def render_normal_overlay(datauri=None, duration_ms=1500):
 def render_warning_inline(duration_ms=1200):
     import time
     uid = str(int(time.time() * 1000))
-    wav = generate_siren_wav(duration=1.0)
-    datauri = wav_bytes_to_datauri(wav)
+    audio_html = alert_audio_html("siren", 1.0)
 
     html = f"""
     <div id="warn-root-{uid}" class="nadi-popup-warn">
@@ -213,9 +173,7 @@ def render_warning_inline(duration_ms=1200):
             <h1 style="margin:0; font-size:36px; font-weight:900;">PERINGATAN TENSI TIDAK NORMAL!</h1>
             <p style="font-size:20px; opacity:0.95;">Hipertensi / hipotensi terdeteksi.</p>
         </div>
-        <audio autoplay>
-            <source src="{datauri}" type="audio/wav">
-        </audio>
+        {audio_html}
     </div>
 
     <style>
@@ -260,6 +218,321 @@ def render_warning_inline(duration_ms=1200):
     </script>
     """
     st.markdown(html, unsafe_allow_html=True)
+
+def render_diagnostics():
+    records = end_run()
+    if records:
+        with st.expander("🩺 Diagnostik performa", expanded=False):
+            st.dataframe(pd.DataFrame(records))
+            st.caption(f"Total: {sum(r['seconds'] for r in records):.3f} s — log JSON lines: NADI_METRICS_LOG")
+
+def save_result(view, context):
+    # view dari prepare_result (hasil + ringkasan per pasien + agregat) -> store bersama
+    # (nadi_results); hasil lama sesi ini dilepas
+    release_result(st.session_state.last_handle)
+    st.session_state.last_handle = put_result(view, context)
+    st.query_params["hasil"] = st.session_state.last_handle
+
+def clear_result():
+    release_result(st.session_state.last_handle)
+    st.session_state.last_handle = None
+    st.query_params.pop("hasil", None)
+
+def load_result():
+    # Return: (view, context) atau (None, None)
+    return get_result(st.session_state.last_handle)
+
+def render_result_viewer(view, key):
+    # hanya satu halaman yang dikirim ke browser; filter dijalankan di server
+    frame, agg = view["frame"], view["agg"]
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Baris", f"{agg['rows']:,}")
+    m2.metric("Pasien", f"{agg['patients']:,}")
+    m3.metric("Anomali (baris)", f"{agg.get('anom_rows', 0):,}")
+    m4.metric("Pasien anomali", f"{agg.get('anom_patients', 0):,}")
+    if view.get("charts") is not None:
+        # dari agregat yang dihitung saat hasil disimpan -> waktu gambar konstan
+        with stage("population_chart"):
+            png = population_chart_png(view["charts"])
+        if png is not None:
+            st.image(png, width="stretch")
+
+    f1, f2, f3, f4 = st.columns([1, 2, 2, 1])
+    anomalies_only = f1.checkbox("Hanya anomali", key=f"{key}_anom")
+    name = f2.text_input("Cari nama pasien", key=f"{key}_name")
+    dates = f3.date_input("Rentang tanggal", value=(), key=f"{key}_dates")
+    kind = f4.selectbox("Jenis", KINDS, key=f"{key}_kind") if has_flags(frame) else "Semua"
+    source = "Semua"
+    if SOURCE_COL in frame.columns:
+        source = st.selectbox("Sumber file", ["Semua"] + list(frame[SOURCE_COL].cat.categories), key=f"{key}_source")
+    p1, p2 = st.columns([1, 1])
+    page_size = p1.selectbox("Baris per halaman", PAGE_SIZES, index=1, key=f"{key}_size")
+    page = p2.number_input("Halaman", min_value=1, value=1, step=1, key=f"{key}_page")
+
+    date_from = dates[0] if len(dates) >= 1 else None
+    date_to = dates[1] if len(dates) >= 2 else date_from
+    rows, total, n_pages = query_result(frame, page=int(page) - 1, page_size=int(page_size),
+                                        anomalies_only=anomalies_only, name=name,
+                                        date_from=date_from, date_to=date_to, kind=kind, source=source)
+    st.caption(f"{total:,} baris cocok — halaman {min(int(page), n_pages)} / {n_pages}")
+    with stage("render_table", rows=len(rows)):
+        # kolom bool Hipertensi/Hipotensi/Anom_Total dibentuk hanya untuk halaman yang tampil
+        st.dataframe(expand_result(rows))
+        patients = view.get("patients")
+        if patients is not None and len(rows) and has_flags(frame):
+            with st.expander("Ringkasan & prediksi RK4 pasien di halaman ini"):
+                st.dataframe(patients.take(rows["Nama"]))
+    if has_flags(frame):
+        render_profile_compare(frame, key)
+
+@st.fragment
+def render_profile_compare(frame, key, max_rows=500):
+    # what-if ambang: semua profil dievaluasi sekaligus dari hasil tersimpan (tanpa RK4 /
+    # analisis ulang); sebagai fragment, ganti profil hanya menjalankan ulang bagian ini
+    with st.expander("⚖️ Bandingkan profil ambang (JNC7 / ESH / Puskesmas ...)"):
+        chosen = st.multiselect("Profil", list(THRESHOLD_PROFILES), default=list(THRESHOLD_PROFILES),
+                                key=f"{key}_profiles")
+        if not chosen:
+            return
+        st.caption(" · ".join(
+            f"{n}: >{'=' if p.get('inclusive') else ''}{p['sys_high']:g}/{p['dia_high']:g}, <{p['sys_low']:g}/{p['dia_low']:g}"
+            for n, p in ((n, THRESHOLD_PROFILES[n]) for n in chosen)))
+        with stage("profile_compare", rows=len(frame)):
+            counts, per_patient = profile_anomalies(frame, chosen)
+        st.dataframe(counts)
+        flags = per_patient.to_numpy() > 0
+        differ = per_patient[flags.any(axis=1) & ~flags.all(axis=1)]
+        st.caption(f"{len(differ):,} pasien berstatus berbeda antar profil (jumlah bacaan anomali per profil)"
+                   + (f" — {max_rows} pertama ditampilkan" if len(differ) > max_rows else ""))
+        st.dataframe(differ.head(max_rows))
+
+# -----------------------
+# JOB ANALISIS (background, lihat nadi_jobs.py)
+# -----------------------
+def _prepare_view(result, predictions=None):
+    # ringkasan per pasien, tren & agregat dihitung di worker job, bukan di script saat pickup
+    if result is None:
+        return None
+    with stage("prepare_result", rows=len(result)):
+        return prepare_result(result, predictions)
+
+def run_population_job(df, file_name, progress=None):
+    # file besar dipecah per hash(Nama) ke beberapa core (NADI_WORKERS / NADI_SHARD_ROWS);
+    # progress dilaporkan per shard
+    result, predictions, alert_names, processing_errors = analyze_population_sharded(df, progress=progress)
+    return {"view": _prepare_view(result, predictions), "alert_names": alert_names,
+            "errors": processing_errors, "context": {"mode":"Input","file":file_name}}
+
+def run_incremental_job(df, file_name, progress=None):
+    # state per pasien di SQLite (NADI_STORE): hanya baris setelah high-water mark yang diproses
+    from nadi_store import incremental_analyze
+    if progress:
+        progress(0, 0)
+    summary, new_rows, alert_names, processing_errors, info = incremental_analyze(df)
+    return {"view": _prepare_view(summary), "alert_names": alert_names,
+            "errors": processing_errors, "info": info,
+            "context": {"mode":"Input","file":file_name,"incremental":info}}
+
+def run_stream_job(data, file_name, chunk_rows, n_rows=None, progress=None):
+    # file dibaca per chunk (XLSX: semua sheet, read-only), hanya state ringkas per pasien di memori
+    # baris beranotasi tidak disimpan (tidak bisa diakses dari browser); untuk file beranotasi
+    # pakai nadi_cli
+    from nadi_ingest import iter_table_chunks, stream_population
+    with open(os.devnull, "w", encoding="utf-8") as sink:
+        summary, alert_names, processing_errors, total_rows = stream_population(
+            iter_table_chunks(BytesIO(data), file_name, chunksize=chunk_rows), sink,
+            n_rows=n_rows, progress=progress)
+    return {"view": _prepare_view(summary), "alert_names": alert_names,
+            "errors": processing_errors, "total_rows": total_rows,
+            "context": {"mode":"Input","file":file_name,"streaming":True}}
+
+def start_job(fn, *args, label, rows_total=None, patients_total=None):
+    # diagnostik aktif -> job diukur di worker (nadi_metrics per thread), record diambil di pickup_job
+    job_id = submit_job(fn, *args, label=label, rows_total=rows_total, patients_total=patients_total,
+                        metrics=diagnostics)
+    st.session_state.job_id = job_id
+    st.query_params["job"] = job_id
+
+def forget_job():
+    st.session_state.job_id = None
+    st.query_params.pop("job", None)
+
+def _fmt_seconds(sec):
+    if sec is None:
+        return "—"
+    sec = int(round(sec))
+    return f"{sec // 60}m {sec % 60:02d}s" if sec >= 60 else f"{sec}s"
+
+@st.fragment(run_every=1.0)
+def render_job_progress(job_id):
+    # hanya fragment ini yang di-refresh tiap detik; saat job berhenti -> rerun penuh untuk pickup
+    job = get_job(job_id)
+    if job is None or not job.active:
+        st.rerun()
+    if job.status == QUEUED:
+        st.info(f"⏳ {job.label}: menunggu giliran (antrian #{queue_position(job_id) or 1}).")
+    else:
+        frac = job.fraction()
+        total = f" / {job.rows_total:,}" if job.rows_total else ""
+        st.progress(frac if frac is not None else 0.0,
+                    text=f"⚙️ {job.label}: {job.rows_done:,}{total} baris")
+        c1, c2, c3, c4 = st.columns(4)
+        patients_total = f" / {job.patients_total:,}" if job.patients_total else ""
+        c1.metric("Pasien", f"{job.patients_done:,}{patients_total}")
+        c2.metric("Baris/detik", f"{job.rows_per_sec():,.0f}")
+        c3.metric("Berjalan", _fmt_seconds(job.elapsed()))
+        c4.metric("Perkiraan sisa", _fmt_seconds(job.eta()))
+    if st.button("⛔ Batalkan analisis", key=f"cancel_{job_id}"):
+        cancel_job(job_id)
+        st.rerun()
+
+def pickup_job():
+    # Return: output job selesai (sekali) atau None; job yang masih jalan ditampilkan progress-nya
+    job_id = st.session_state.job_id
+    if not job_id:
+        return None
+    job = get_job(job_id)
+    if job is None:
+        forget_job()
+        st.warning("Status analisis tidak ditemukan lagi (kedaluwarsa atau server dimulai ulang). Silakan upload ulang.")
+        return None
+    if job.active:
+        render_job_progress(job_id)
+        return None
+    forget_job()
+    add_records(job.metrics_records, prefix="job:")
+    if job.status == FAILED:
+        st.error(f"Terjadi error saat analisis: {job.error}")
+    elif job.status == CANCELLED:
+        st.warning(f"Analisis dibatalkan ({job.rows_done:,} baris sempat diproses).")
+    elif job.status == DONE:
+        out = take_result(job_id)
+        if out is not None:
+            st.caption(f"{job.label}: selesai dalam {_fmt_seconds(job.elapsed())}.")
+        return out
+    return None
+
+def render_job_outcome(out):
+    if out.get("info") is not None:
+        info = out["info"]
+        st.info(f"Mode inkremental: {info['rows_new']} baris baru dari {info['rows_total']} "
+                f"({info['patients_new']} pasien baru, {info['patients_updated']} pasien diperbarui).")
+    if out.get("total_rows") is not None:
+        st.write(f"Streaming selesai: {out['total_rows']} baris diproses.")
+
+    if out["view"] is None:
+        if out.get("info") is not None:
+            st.success("Tidak ada data baru sejak upload sebelumnya.")
+        else:
+            st.warning("Tidak ada data pasien yang berhasil diproses. Periksa isi file (baris/kolom/format).")
+    else:
+        save_result(out["view"], out["context"])
+        with stage("audio_overlay"):
+            render_population_alert(out["alert_names"])
+
+    # tampilkan log error per-pasien bila ada
+    if out["errors"]:
+        st.markdown("*Catatan pemrosesan (beberapa entry dilewati / error):*")
+        for msg in out["errors"]:
+            st.markdown(f"- {msg}")
+
+def render_bp_chart(tanggal, systolic, diastolic, name, fc_s=None, fc_d=None):
+    # grafik tensi gaya halaman Personal; fc_s/fc_d = proyeksi RK4 (langkah 1..N, per hari).
+    # PNG di-cache per hash data (nadi_charts), riwayat panjang diperkecil dengan LTTB
+    png, shown, total = bp_chart_png(tanggal, systolic, diastolic, name, fc_s, fc_d)
+    st.image(png, width="stretch")
+    if shown < total:
+        st.caption(f"{shown:,} dari {total:,} titik ditampilkan (LTTB, bentuk kurva dipertahankan).")
+
+def render_patient_panel(view, key):
+    # cari pasien lewat index ringkasan (awalan nama), status terbaru per pasien, dan
+    # drill-down satu pasien: hanya potongan barisnya yang diambil dari tabel hasil
+    patients = view.get("patients")
+    if patients is None or not len(patients):
+        return
+    st.subheader("🔎 Status Terbaru per Pasien")
+    prefix = st.text_input("Cari pasien (awalan nama)", key=f"{key}_prefix")
+    if prefix.strip():
+        matches = patients.search(prefix, limit=50)
+        st.caption(f"{len(matches)} pasien cocok" + (" (50 pertama)" if len(matches) == 50 else ""))
+        st.dataframe(matches, hide_index=True)
+        options = matches["Nama"].tolist()
+    else:
+        p1, p2, p3 = st.columns([1, 1, 1])
+        anom_only = p1.checkbox("Hanya pasien dengan anomali", key=f"{key}_pat_anom")
+        sustained_only = False
+        if "Hipertensi_Menetap" in patients.summary.columns:
+            sustained_only = p1.checkbox(f"Hanya hipertensi menetap (≥{SUSTAINED_READINGS} bacaan berturut-turut)",
+                                         key=f"{key}_pat_sustained")
+        page_size = p2.selectbox("Pasien per halaman", PAGE_SIZES, index=0, key=f"{key}_pat_size")
+        page = p3.number_input("Halaman pasien", min_value=1, value=1, step=1, key=f"{key}_pat_page")
+        rows, total, n_pages = query_result(patients.summary, page=int(page) - 1, page_size=int(page_size),
+                                            anomalies_only=anom_only, sustained_only=sustained_only)
+        st.caption(f"{total:,} pasien — halaman {min(int(page), n_pages)} / {n_pages}")
+        st.dataframe(rows, hide_index=True)
+        options = rows["Nama"].tolist()
+    if not options:
+        return
+
+    name = st.selectbox("Detail pasien", options, key=f"{key}_patient")
+    info = patients.get(name)
+    if info is None:
+        return
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Bacaan terakhir", f"{info['Systolic_Terakhir']:.0f}/{info['Diastolic_Terakhir']:.0f}")
+    c2.metric("Jumlah anomali", f"{int(info['Jumlah_Anomali'])} / {int(info['Jumlah_Data'])}")
+    c3.metric("Prediksi RK4", "—" if pd.isna(info["Prediksi_Systolic"])
+              else f"{info['Prediksi_Systolic']:.1f}/{info['Prediksi_Diastolic']:.1f}")
+    c4.metric("Tanggal terakhir", "—" if pd.isna(info["Tanggal_Terakhir"])
+              else pd.Timestamp(info["Tanggal_Terakhir"]).strftime("%d-%m-%Y"))
+    trend = "Tren_Systolic" in info.index
+    if trend:
+        def bp(s, d, fmt=".1f"):
+            return "—" if pd.isna(s) else f"{s:{fmt}}/{d:{fmt}}"
+        t1, t2, t3, t4 = st.columns(4)
+        t1.metric("Rata-rata 7 bacaan", bp(info.get("MA7_Systolic"), info.get("MA7_Diastolic")))
+        t2.metric("Rata-rata 30 bacaan", bp(info.get("MA30_Systolic"), info.get("MA30_Diastolic")))
+        t3.metric(f"Tren {SLOPE_WINDOW} bacaan (mmHg/bacaan)", bp(info["Tren_Systolic"], info["Tren_Diastolic"], "+.2f"))
+        t4.metric("Run hipertensi (terakhir / terpanjang)",
+                  f"{int(info['Run_Hipertensi'])} / {int(info['Run_Hipertensi_Maks'])}",
+                  "menetap" if info["Hipertensi_Menetap"] else None, delta_color="inverse")
+
+    rows = patients.rows(view["frame"], name)
+    if rows is None:
+        st.caption("Hasil ini hanya berisi ringkasan per pasien (mode streaming / inkremental); grafik riwayat tidak tersedia.")
+        return
+    h1, h2 = st.columns(2)
+    horizon = h1.selectbox("Horizon prediksi (hari)", [1, 7, 30], index=0, key=f"{key}_horizon")
+    derivative = h2.selectbox("Turunan RK4", ["Selisih 2 bacaan terakhir", f"Tren least-squares {SLOPE_WINDOW} bacaan"],
+                              key=f"{key}_derivative") if trend else None
+    with stage("patient_chart", rows=len(rows)):
+        slopes = (info["Tren_Systolic"], info["Tren_Diastolic"]) if derivative and derivative.startswith("Tren") else None
+        fc_s, fc_d = rk4_forecast_bp(rows["Systolic"], rows["Diastolic"], steps=int(horizon), slopes=slopes)
+        render_bp_chart(rows["Tanggal"], rows["Systolic"], rows["Diastolic"], name, fc_s, fc_d)
+        with st.expander(f"Riwayat {name} ({len(rows)} bacaan)"):
+            # rata-rata bergerak / tren / run per baris hanya untuk potongan pasien ini
+            st.dataframe(pd.concat([expand_result(rows), rolling_trends(rows)], axis=1), hide_index=True)
+
+@st.cache_data(show_spinner=False)
+def landing_template(today):
+    # contoh template + bytes CSV: dibuat sekali per hari (tanggal relatif terhadap hari ini)
+    sample_df = pd.DataFrame({
+        "Nama": ["Budi","Budi","Siti","Siti"],
+        "Tanggal": [today-timedelta(days=3), today-timedelta(days=1), today-timedelta(days=2), today],
+        "Systolic": [120, 145, 130, 170],
+        "Diastolic": [80,  95,  85, 105]
+    })
+    return sample_df, sample_df.to_csv(index=False).encode("utf-8")
+
+def render_population_alert(alert_names):
+    if alert_names:
+        more = f" dan {len(alert_names) - 8:,} pasien lainnya (lihat Status Terbaru per Pasien di menu Hasil)" \
+            if len(alert_names) > 8 else ""
+        st.error(f"🚨 Anomali terdeteksi pada: {', '.join(map(str, alert_names[:8]))}{more}")
+        render_warning_inline(duration_ms=1000)
+    else:
+        render_normal_overlay(audio_html=alert_audio_html("ting", 0.45), duration_ms=1400)
+        st.success("✔ Tidak ada hipertensi/hipotensi terdeteksi.")
 # ============================================================
 # BERANDA / LANDING
 # ============================================================
@@ -301,142 +574,186 @@ if st.session_state.page == "beranda":
     with c:
         st.markdown('<button class="bigglass" onclick="document.querySelector(\'button[kind=tertiary]\').click()">🔄 Reset Hasil</button>', unsafe_allow_html=True)
         if st.button("🔄 Reset Hasil", key="btn_reset", help="trigger"):
-             st.session_state.last_result = None
-             st.session_state.last_context = None
+             clear_result()
              st.success("Riwayat berhasil dibersihkan.")
 
 
     st.markdown("---")
     st.subheader("Contoh Template Data (Upload)")
-    sample_df = pd.DataFrame({
-        "Nama": ["Budi","Budi","Siti","Siti"],
-        "Tanggal": [
-            datetime.now().date()-timedelta(days=3),
-            datetime.now().date()-timedelta(days=1),
-            datetime.now().date()-timedelta(days=2),
-            datetime.now().date()
-        ],
-        "Systolic": [120, 145, 130, 170],
-        "Diastolic": [80,  95,  85, 105]
-    })
+    sample_df, csv = landing_template(datetime.now().date())
     st.dataframe(sample_df)
-    csv = sample_df.to_csv(index=False).encode("utf-8")
     st.download_button("Download template CSV", csv, "template_tensi.csv", "text/csv")
     st.stop()
 # ============================================================
 # INPUT DATA (UPLOAD) - REVISI (menggunakan st.form + debug)
 # ============================================================
 if st.session_state.page == "input":
-    st.header("📁 Analisis Data Populasi (Upload CSV / XLSX)")
-
-    # Form: file_uploader + submit dalam satu interaksi
-    with st.form("upload_form", clear_on_submit=False):
-        uploaded = st.file_uploader("Upload CSV / XLSX (minimal kolom: Nama, Systolic, Diastolic)", type=["csv","xlsx"])
-        submitted = st.form_submit_button("Analisis (RK4)")
-
-    # Quick debug info tentang file
-    if uploaded is not None:
-        st.info(f"File terdeteksi: *{uploaded.name}* — ukuran: {getattr(uploaded, 'size', 'n/a')} bytes")
-        try:
-            if uploaded.name.lower().endswith(".csv"):
-                df = pd.read_csv(uploaded)
-            else:
-                df = pd.read_excel(uploaded)
-        except Exception as e:
-            st.error(f"Gagal membaca file: {e}")
-            st.stop()
-
-        # Bersihkan nama kolom
-        df.columns = [c.strip() for c in df.columns]
-        st.info(f"Kolom terdeteksi: {list(df.columns)}")
-        st.dataframe(df.head(30))
-
-        required = {"Nama","Systolic","Diastolic"}
-        if not required.issubset(df.columns):
-            st.error(f"Kolom minimal harus ada: {sorted(required)}. Periksa header CSV (spasi / BOM / encoding).")
-            st.stop()
+    from nadi_ingest import load_upload, load_uploads, count_table_rows, preview_table
+    from nadi_dates import date_note
 
-        # handle tanggal
-        if "Tanggal" in df.columns:
-            df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors="coerce")
-            if df["Tanggal"].isna().any():
-                df["Tanggal"] = df["Tanggal"].fillna(method="ffill")
-        else:
-            today = datetime.now().date()
-            N = len(df)
-            df["Tanggal"] = [pd.Timestamp(today - timedelta(days=(N-1-i))) for i in range(N)]
+    def render_input_result(file_name, title):
+        # viewer tetap tampil saat filter/halaman diubah (rerun tanpa submit)
+        # file_name None: hasil Input terakhir apa pun (mis. halaman di-refresh saat job berjalan)
+        view, ctx = load_result()
+        if view is not None and ctx.get("mode") == "Input" and file_name in (None, ctx.get("file")):
+            st.subheader(title)
+            render_result_viewer(view, key="input")
 
-        # Jika user menekan Analisis
-        if submitted:
+    st.header("📁 Analisis Data Populasi (Upload CSV / XLSX)")
+    with metrics_run("input", enabled=diagnostics):
+        # Form: file_uploader + submit dalam satu interaksi
+        with st.form("upload_form", clear_on_submit=False):
+            uploads = st.file_uploader("Upload CSV / XLSX (minimal kolom: Nama, Systolic, Diastolic) — boleh beberapa file sekaligus",
+                                       type=["csv","xlsx"], accept_multiple_files=True) or []
+            stream_mode = st.checkbox("Mode streaming (CSV / XLSX besar, hemat memori)", value=False)
+            incremental = st.checkbox("Mode inkremental (hanya proses data yang lebih baru dari upload sebelumnya)", value=False)
+            chunk_rows = st.number_input("Ukuran chunk streaming (baris)", min_value=1000, max_value=2_000_000, value=100_000, step=10_000)
+            submitted = st.form_submit_button("Analisis (RK4)")
+
+        # analisis berjalan di background: progress / pembatalan di sini, hasil diambil saat selesai
+        job_out = pickup_job()
+        if job_out is not None:
+            render_job_outcome(job_out)
+        if submitted and get_job(st.session_state.job_id) is not None:
+            st.warning("Masih ada analisis yang berjalan untuk sesi ini. Tunggu atau batalkan dulu.")
+            submitted = False
+        uploaded = uploads[0] if len(uploads) == 1 else None
+
+        if len(uploads) > 1 and stream_mode:
+            st.error("Mode streaming memproses satu file. Matikan mode streaming untuk menggabungkan beberapa file.")
+
+        # Beberapa file: di-parse paralel (process pool, di-cache per hash isi tiap file) lalu
+        # digabung jadi satu populasi dengan kolom Sumber_File
+        elif len(uploads) > 1:
+            files = [(f.getvalue(), f.name) for f in uploads]
+            st.info(f"{len(files)} file terdeteksi — total ukuran: {sum(len(data) for data, _ in files):,} bytes")
             try:
-                parts = []
-                alert_needed = False
-                alert_names = []
-                processing_errors = []
-
-                # Pastikan kolom numeric
-                df["Systolic"] = pd.to_numeric(df["Systolic"], errors="coerce")
-                df["Diastolic"] = pd.to_numeric(df["Diastolic"], errors="coerce")
-
-                # Tampilkan ringkasan sebelum loop
-                st.write(f"Memulai analisis untuk {df['Nama'].nunique()} pasien, total baris: {len(df)}")
-
-                for name, g in df.groupby("Nama", sort=False):
-                    try:
-                        g2 = g.sort_values("Tanggal").reset_index(drop=True)
-                        g2 = g2[["Nama","Tanggal","Systolic","Diastolic"]].copy()
-
-                        # Jika semua nilai NaN untuk tensi -> lewati & catat
-                        if g2["Systolic"].isna().all() and g2["Diastolic"].isna().all():
-                            processing_errors.append(f"{name}: semua nilai Systolic/Diastolic kosong. Dilewati.")
-                            continue
-
-                        g2 = detect_anomaly_df(g2)
-
-                        pred_s = rk4_predict_series(g2["Systolic"])
-                        pred_d = rk4_predict_series(g2["Diastolic"])
-
-                        g2["Prediksi_Systolic"] = np.nan
-                        g2["Prediksi_Diastolic"] = np.nan
-                        if pred_s is not None:
-                            g2.at[len(g2)-1, "Prediksi_Systolic"] = pred_s
-                            g2.at[len(g2)-1, "Prediksi_Diastolic"] = pred_d
-
-                        parts.append(g2)
-                        if g2["Anom_Total"].any():
-                            alert_needed = True
-                            alert_names.append(name)
-                    except Exception as e:
-                        processing_errors.append(f"{name}: error saat proses -> {e}")
-
-                if len(parts) == 0:
-                    st.warning("Tidak ada data pasien yang berhasil diproses. Periksa isi file (baris/kolom/format).")
-                else:
-                    result = pd.concat(parts, ignore_index=True)
-                    st.subheader("Hasil Analisis")
-                    st.dataframe(result)
-                    st.session_state.last_result = result
-                    st.session_state.last_context = {"mode":"Input","file":uploaded.name}
-
-                    if alert_needed:
-                        st.error(f"🚨 Anomali terdeteksi pada: {', '.join(alert_names[:8])}")
-                        render_warning_inline(duration_ms=1000)
-                    else:
-                        wav = generate_ting_wav(duration=0.45)
-                        datauri = wav_bytes_to_datauri(wav)
-                        render_normal_overlay(datauri=datauri, duration_ms=1400)
-                        st.success("✔ Tidak ada hipertensi/hipotensi terdeteksi.")
-
-                # tampilkan log error per-pasien bila ada
-                if processing_errors:
-                    st.markdown("*Catatan pemrosesan (beberapa entry dilewati / error):*")
-                    for msg in processing_errors:
-                        st.markdown(f"- {msg}")
-
+                df, sources = load_uploads(files)
             except Exception as e:
-                st.error(f"Terjadi error saat analisis: {e}")
-                import traceback
-                st.text(traceback.format_exc())
+                st.error(f"Gagal membaca file: {e}")
+                st.stop()
+
+            st.dataframe(pd.DataFrame({"File": [s["file"] for s in sources],
+                                       "Baris": [s["rows"] for s in sources],
+                                       "Kolom terdeteksi": [", ".join(s["raw_columns"]) for s in sources],
+                                       "Dari cache": [s["cache_hit"] for s in sources]}), hide_index=True)
+            for s in sources:
+                if date_note(s["date_report"]):
+                    st.warning(f"{s['file']}: {date_note(s['date_report'])}")
+            bad = [s["file"] for s in sources if s["missing"]]
+            if bad:
+                st.error(f"Kolom minimal harus ada: {['Nama', 'Systolic', 'Diastolic']}. Tidak lengkap di: {', '.join(bad)}. "
+                         "Periksa header CSV (spasi / BOM / encoding).")
+                st.stop()
+            with stage("render_preview", rows=min(len(df), 30)):
+                st.dataframe(df.head(30))
+
+            file_name = ", ".join(s["file"] for s in sources)
+            if submitted and incremental:
+                from nadi_store import incremental_problem
+                problems = [f"{s['file']}: {p}" for s in sources
+                            if (p := incremental_problem(s["raw_columns"], s["date_report"]))]
+                if problems:
+                    for msg in problems:
+                        st.error(msg)
+                    submitted = False
+            if submitted:
+                try:
+                    runner = run_incremental_job if incremental else run_population_job
+                    start_job(runner, df, file_name, label=f"Analisis {len(files)} file",
+                              rows_total=len(df), patients_total=int(df["Nama"].nunique()))
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Terjadi error saat analisis: {e}")
+                    import traceback
+                    st.text(traceback.format_exc())
+
+            render_input_result(file_name, "Hasil Analisis")
+
+        # Mode streaming: file dibaca per chunk (XLSX: semua sheet, read-only), hanya state ringkas
+        # per pasien yang disimpan di memori
+        elif uploaded is not None and stream_mode:
+            st.info(f"File terdeteksi: *{uploaded.name}* — ukuran: {getattr(uploaded, 'size', 'n/a')} bytes (mode streaming)")
+            try:
+                preview = preview_table(uploaded, uploaded.name, nrows=30)
+            except Exception as e:
+                st.error(f"Gagal membaca file: {e}")
+                st.stop()
+
+            st.info(f"Kolom terdeteksi: {list(preview.columns)}")
+            st.dataframe(preview)
+
+            required = {"Nama","Systolic","Diastolic"}
+            if not required.issubset(preview.columns):
+                st.error(f"Kolom minimal harus ada: {sorted(required)}. Periksa header CSV (spasi / BOM / encoding).")
+                st.stop()
+
+            if submitted:
+                try:
+                    data = uploaded.getvalue()
+                    n_rows = None if "Tanggal" in preview.columns else count_table_rows(BytesIO(data), uploaded.name)
+                    # total baris untuk progress/ETA: CSV dari jumlah baris teks (murah), XLSX hanya
+                    # jika sudah dihitung (tanpa Tanggal)
+                    rows_total = n_rows
+                    if rows_total is None and uploaded.name.lower().endswith(".csv"):
+                        rows_total = max(data.count(b"\n") - 1, 0) or None
+                    start_job(run_stream_job, data, uploaded.name, int(chunk_rows), n_rows,
+                              label=f"Streaming {uploaded.name}", rows_total=rows_total)
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Terjadi error saat analisis: {e}")
+                    import traceback
+                    st.text(traceback.format_exc())
+
+            render_input_result(uploaded.name, "Ringkasan per Pasien")
+
+        # Quick debug info tentang file
+        elif uploaded is not None:
+            st.info(f"File terdeteksi: *{uploaded.name}* — ukuran: {getattr(uploaded, 'size', 'n/a')} bytes")
+            try:
+                # parse + normalisasi (Tanggal, numeric) di-cache per hash isi file -> rerun tidak parse ulang
+                df, raw_columns, cache_hit, date_report = load_upload(uploaded.getvalue(), uploaded.name)
+            except Exception as e:
+                st.error(f"Gagal membaca file: {e}")
+                st.stop()
+
+            st.info(f"Kolom terdeteksi: {raw_columns}" + (" (dari cache)" if cache_hit else ""))
+            if date_note(date_report):
+                st.warning(date_note(date_report))
+            with stage("render_preview", rows=min(len(df), 30)):
+                st.dataframe(df.head(30))
+
+            required = {"Nama","Systolic","Diastolic"}
+            if not required.issubset(df.columns):
+                st.error(f"Kolom minimal harus ada: {sorted(required)}. Periksa header CSV (spasi / BOM / encoding).")
+                st.stop()
+
+            if submitted and incremental:
+                from nadi_store import incremental_problem
+                problem = incremental_problem(raw_columns, date_report)
+                if problem:
+                    st.error(problem)
+                    submitted = False
+
+            # Jika user menekan Analisis
+            if submitted:
+                try:
+                    # satu kali jalan untuk seluruh populasi (tanpa loop per pasien), di background
+                    runner = run_incremental_job if incremental else run_population_job
+                    start_job(runner, df, uploaded.name, label=f"Analisis {uploaded.name}",
+                              rows_total=len(df), patients_total=int(df["Nama"].nunique()))
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Terjadi error saat analisis: {e}")
+                    import traceback
+                    st.text(traceback.format_exc())
+
+            render_input_result(uploaded.name, "Hasil Analisis")
+
+        elif job_out is not None:
+            render_input_result(None, "Hasil Analisis")
+
+        render_diagnostics()
 
     # Back button
     if st.button("⬅ Kembali"):
@@ -463,60 +780,60 @@ if st.session_state.page == "personal":
         systolic.append(s)
         diastolic.append(d)
 
+    horizon = st.selectbox("Horizon prediksi (hari)", [1, 7, 30], index=0)
+
     analyze = st.button("Analisis (RK4)")
 
     if analyze:
         if not name:
             st.error("Masukkan nama terlebih dahulu.")
             st.stop()
+        with metrics_run("personal", enabled=diagnostics):
+            dfp = pd.DataFrame({
+                "Nama":[name]*int(n),
+                "Tanggal":[pd.Timestamp(datetime.now().date()-timedelta(days=(int(n)-1-i))) for i in range(int(n))],
+                "Systolic":systolic,
+                "Diastolic":diastolic
+            })
+
+            with stage("detect_anomaly", rows=len(dfp)):
+                dfp = detect_anomaly_df(dfp)
+            # proyeksi RK4 N langkah (Systolic & Diastolic sekaligus); langkah 1 = prediksi lama
+            with stage("rk4_forecast", rows=len(dfp)):
+                fc_s, fc_d = rk4_forecast_bp(dfp["Systolic"], dfp["Diastolic"], steps=int(horizon))
+            pred_s = None if np.isnan(fc_s[0]) else float(fc_s[0])
+            pred_d = None if np.isnan(fc_d[0]) else float(fc_d[0])
+
+            dfp["Prediksi_Systolic"] = np.nan
+            dfp["Prediksi_Diastolic"] = np.nan
+            if pred_s is not None:
+                dfp.at[len(dfp)-1, "Prediksi_Systolic"] = pred_s
+                dfp.at[len(dfp)-1, "Prediksi_Diastolic"] = pred_d
+
+            st.subheader("Hasil Analisis Personal")
+            with stage("render_table", rows=len(dfp)):
+                st.dataframe(dfp)
+
+            # Chart
+            with stage("chart", rows=len(dfp)):
+                render_bp_chart(dfp["Tanggal"], dfp["Systolic"], dfp["Diastolic"], name, fc_s, fc_d)
+
+            # anomaly handling
+            with stage("audio_overlay"):
+                if dfp["Anom_Total"].iloc[-1]:
+                    st.error("⚠ Terdeteksi hipertensi / hipotensi!")
+                    render_warning_inline(duration_ms=1000)
+                else:
+                    render_normal_overlay(audio_html=alert_audio_html("ting", 0.45), duration_ms=1400)
+                    st.success("✔ Datamu Normal. Jaga Kesehatan Yaa!!!")
 
-        dfp = pd.DataFrame({
-            "Nama":[name]*int(n),
-            "Tanggal":[pd.Timestamp(datetime.now().date()-timedelta(days=(int(n)-1-i))) for i in range(int(n))],
-            "Systolic":systolic,
-            "Diastolic":diastolic
-        })
-
-        dfp = detect_anomaly_df(dfp)
-        pred_s = rk4_predict_series(dfp["Systolic"])
-        pred_d = rk4_predict_series(dfp["Diastolic"])
-
-        dfp["Prediksi_Systolic"] = np.nan
-        dfp["Prediksi_Diastolic"] = np.nan
-        if pred_s is not None:
-            dfp.at[len(dfp)-1, "Prediksi_Systolic"] = pred_s
-            dfp.at[len(dfp)-1, "Prediksi_Diastolic"] = pred_d
-
-        st.subheader("Hasil Analisis Personal")
-        st.dataframe(dfp)
-
-        # Chart
-        fig, ax = plt.subplots(figsize=(9,3))
-        ax.plot(dfp["Tanggal"], dfp["Systolic"], marker="o", label="Systolic")
-        ax.plot(dfp["Tanggal"], dfp["Diastolic"], marker="o", label="Diastolic")
-        if pred_s is not None:
-            nd = dfp["Tanggal"].iloc[-1] + pd.Timedelta(days=1)
-            ax.scatter([nd],[pred_s], marker='D', s=80)
-            ax.scatter([nd],[pred_d], marker='D', s=80)
-        ax.set_title(f"Tensi - {name}")
-        ax.legend()
-        st.pyplot(fig)
-
-        # anomaly handling
-        if dfp["Anom_Total"].iloc[-1]:
-            st.error("⚠ Terdeteksi hipertensi / hipotensi!")
-            render_warning_inline(duration_ms=1000)
-        else:
-            wav = generate_ting_wav(duration=0.45)
-            datauri = wav_bytes_to_datauri(wav)
-            render_normal_overlay(datauri=datauri, duration_ms=1400)
-            st.success("✔ Datamu Normal. Jaga Kesehatan Yaa!!!")
-
-        if pred_s is not None:
-            st.markdown(f"*Prediksi RK4 (1 langkah)* — Sistolik: *{pred_s:.2f}, Diastolik: **{pred_d:.2f}*")
+            if pred_s is not None:
+                st.markdown(f"*Prediksi RK4 (1 langkah)* — Sistolik: *{pred_s:.2f}, Diastolik: **{pred_d:.2f}*")
+                if int(horizon) > 1:
+                    st.markdown(f"*Proyeksi RK4 ({int(horizon)} hari)* — Sistolik: *{fc_s[-1]:.2f}, Diastolik: **{fc_d[-1]:.2f}*")
 
-        st.session_state.last_result = dfp
-        st.session_state.last_context = {"mode":"Personal", "name":name}
+            save_result(prepare_result(dfp), {"mode":"Personal", "name":name})
+            render_diagnostics()
 
     if st.button("⬅ Kembali"):
         st.session_state.page = "beranda"
@@ -527,14 +844,17 @@ if st.session_state.page == "personal":
 # ============================================================
 if st.session_state.page == "hasil":
     st.header("📊 Hasil Analisis Terakhir")
-    if st.session_state.last_result is None:
-        st.info("Belum ada hasil. Lakukan analisis pada menu Input Data atau Personal.")
+    view, ctx = load_result()
+    if view is None:
+        if st.session_state.last_handle:
+            st.info("Hasil sebelumnya sudah kedaluwarsa. Lakukan analisis ulang pada menu Input Data atau Personal.")
+        else:
+            st.info("Belum ada hasil. Lakukan analisis pada menu Input Data atau Personal.")
     else:
-        st.write("Context:", st.session_state.last_context)
-        st.dataframe(st.session_state.last_result)
-        df_show = st.session_state.last_result
-        total_anom = int(df_show["Anom_Total"].sum()) if "Anom_Total" in df_show.columns else 0
-        st.markdown(f"*Total hipertensi / hipotensi terdeteksi:* {total_anom}")
+        st.write("Context:", ctx)
+        render_result_viewer(view, key="hasil")
+        st.markdown(f"*Total hipertensi / hipotensi terdeteksi:* {view['agg'].get('anom_rows', 0)}")
+        render_patient_panel(view, key="hasil")
 
     if st.button("⬅ Kembali"):
         st.session_state.page = "beranda"
@@ -0,0 +1,91 @@
+# nadi_audio.py — NADI (RK4) — aset audio overlay (siren + ting), dibuat sekali per proses
+# ============================================================
+
+from functools import lru_cache
+from io import BytesIO
+import base64
+import os
+
+import numpy as np
+
+# -----------------------
+# WAVEFORM (float, -1..1)
+# -----------------------
+def siren_tone(duration=6.0, sr=44100):
+    # siren dengan pitch modulation (untuk peringatan)
+    t = np.linspace(0, duration, int(sr * duration), endpoint=False)
+    mod = 0.5 * (1 + np.sin(2 * np.pi * 2.2 * t))
+    freq = 700 + 600 * np.sin(2 * np.pi * 1.0 * t)
+    tone = 0.9 * np.sin(2 * np.pi * freq * t) * (0.6 + 0.4 * mod)
+    env = np.linspace(1, 0.01, len(t))
+    tone = tone * env
+    return np.clip(tone, -1, 1)
+
+def ting_tone(duration=3.0, sr=44100):
+    t = np.linspace(0, duration, int(sr * duration), endpoint=False)
+    tone1 = 0.7 * np.sin(2 * np.pi * 1400 * t) * np.linspace(1, 0, len(t))
+    tone2 = 0.5 * np.sin(2 * np.pi * 1800 * t) * np.linspace(1, 0, len(t))
+    tone = tone1 + 0.6 * tone2
+    return np.clip(tone, -1, 1)
+
+ALERT_TONES = {"siren": siren_tone, "ting": ting_tone}
+
+# nama encoding -> (format soundfile, subtype, mime, ekstensi)
+AUDIO_ENCODINGS = {
+    "wav": ("WAV", "PCM_16", "audio/wav", "wav"),
+    "wav8": ("WAV", "PCM_U8", "audio/wav", "wav"),
+    "ogg": ("OGG", "VORBIS", "audio/ogg", "ogg"),
+}
+
+# default ringkas untuk overlay: 11.025 kHz / 8-bit (nada tertinggi 1.8 kHz, jauh di bawah Nyquist)
+DEFAULT_SR = 11025
+DEFAULT_ENCODING = "wav8"
+
+def encode_tone(tone, sr, encoding="wav"):
+    import soundfile as sf    # lazy: libsndfile hanya dimuat saat aset pertama dibuat
+    fmt, subtype, _, _ = AUDIO_ENCODINGS[encoding]
+    buf = BytesIO()
+    sf.write(buf, tone, sr, format=fmt, subtype=subtype)
+    buf.seek(0)
+    return buf.read()
+
+# -----------------------
+# REGISTRY (memo per (kind, duration, sr, encoding))
+# -----------------------
+@lru_cache(maxsize=64)
+def get_alert_audio(kind, duration, sr=DEFAULT_SR, encoding=DEFAULT_ENCODING):
+    # Return: (bytes, mime). Dihitung sekali per proses lalu dipakai ulang di setiap render.
+    tone = ALERT_TONES[kind](duration=duration, sr=sr)
+    return encode_tone(tone, sr, encoding), AUDIO_ENCODINGS[encoding][2]
+
+@lru_cache(maxsize=64)
+def get_alert_datauri(kind, duration, sr=DEFAULT_SR, encoding=DEFAULT_ENCODING):
+    data, mime = get_alert_audio(kind, duration, sr, encoding)
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+@lru_cache(maxsize=64)
+def write_static_audio(kind, duration, static_dir, sr=DEFAULT_SR, encoding=DEFAULT_ENCODING):
+    # Tulis aset ke folder static (sekali per proses) supaya bisa di-serve lewat URL & di-cache browser.
+    # Return: (nama file, mime)
+    data, mime = get_alert_audio(kind, duration, sr, encoding)
+    fname = f"nadi_{kind}_{duration:g}s_{sr}_{encoding}.{AUDIO_ENCODINGS[encoding][3]}"
+    os.makedirs(static_dir, exist_ok=True)
+    path = os.path.join(static_dir, fname)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return fname, mime
+
+# -----------------------
+# API LAMA (WAV 16-bit 44.1 kHz)
+# -----------------------
+def generate_siren_wav(duration=6.0, sr=44100):
+    return get_alert_audio("siren", duration, sr, "wav")[0]
+
+def generate_ting_wav(duration=3.0, sr=44100):
+    return get_alert_audio("ting", duration, sr, "wav")[0]
+
+def wav_bytes_to_datauri(wav_bytes):
+    b64 = base64.b64encode(wav_bytes).decode()
+    return f"data:audio/wav;base64,{b64}"
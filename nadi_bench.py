@@ -0,0 +1,215 @@
+# nadi_bench.py — NADI (RK4) — benchmark pipeline analisis per tahap
+# ============================================================
+# Contoh:
+#   python nadi_bench.py                          # 1k, 100k, 1M baris
+#   python nadi_bench.py --rows 10000000 --repeat 1 --json bench.jsonl
+#   python nadi_bench.py --rows 100000 --xlsx     # + ingest XLSX: pd.read_excel vs streaming XML
+#     (200k baris, 2 sheet: pd.read_excel ~14 s / 52 MB puncak, streaming ~7 s / 38 MB)
+#   python nadi_bench.py --app                    # waktu app.py (Streamlit AppTest): cold start + rerun per halaman
+#     (sebelum / sesudah lazy import + template memo: cold start ~1.30 s -> ~0.66 s,
+#      rerun beranda ~75 ms -> ~62 ms, halaman lain ~67-77 ms -> ~53 ms; termasuk overhead
+#      polling AppTest, script kosong ~4 ms)
+# Tiap tahap diukur terpisah: waktu (min dari --repeat), baris/detik, dan puncak memori
+# (tracemalloc, pass terpisah supaya tidak memengaruhi waktu).
+# Ukuran frame upload & hasil juga dilaporkan per 1 juta baris, layout lama vs skema ringkas
+# (nadi_schema). Hasil di pandas 3 / numpy 2, 1M baris, ~50k pasien:
+#   upload (Nama, Tanggal, Systolic, Diastolic):   ~88 MB  ->  ~21 MB
+#   hasil (+ 3 flag, 2 prediksi per baris):         ~107 MB ->  ~25 MB (termasuk tabel pasien)
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from io import BytesIO, StringIO
+
+import pandas as pd
+import numpy as np
+
+from nadi_engine import (detect_anomaly_df, rk4_forecast_bp, analyze_population, profile_anomalies,
+                         summarize_result)
+from nadi_charts import population_aggregates, population_chart_png, clear_chart_cache
+from nadi_ingest import normalize_frame, read_excel_fast
+from nadi_dates import DateParser
+from nadi_schema import expand_result, frame_nbytes
+from nadi_synth import generate_rows
+from nadi_trends import patient_trends, rolling_trends
+
+DEFAULT_ROWS = [1_000, 100_000, 1_000_000]
+
+def _measure(fn, repeat=3, memory=True):
+    best = float("inf")
+    out = None
+    for _ in range(max(repeat, 1)):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return out, best, peak
+
+def _last_two(norm):
+    # array (pasien, 2) untuk tahap RK4 (disiapkan di luar pengukuran)
+    s = norm.sort_values(["Nama","Tanggal"], kind="stable")
+    g = s.groupby("Nama", sort=False, observed=True)
+    last = g.nth(-1).set_index("Nama")
+    prev = g.nth(-2).set_index("Nama").reindex(last.index)
+    return (np.column_stack([prev["Systolic"], last["Systolic"]]),
+            np.column_stack([prev["Diastolic"], last["Diastolic"]]))
+
+def bench_size(n_rows, repeat=3, memory=True, seed=0, missing=0.02, bad_dates=0.01, xlsx=False):
+    df = generate_rows(n_rows, readings_per_patient=20, missing_rate=missing,
+                       bad_date_rate=bad_dates, seed=seed)
+    csv_bytes = df.to_csv(index=False).encode("utf-8")
+    xlsx_bytes = None
+    if xlsx:
+        # 2 sheet (mis. per bulan), seperti rekap klinik
+        buf = BytesIO()
+        with pd.ExcelWriter(buf) as w:
+            half = len(df) // 2
+            df.iloc[:half].to_excel(w, sheet_name="Bulan_1", index=False)
+            df.iloc[half:].to_excel(w, sheet_name="Bulan_2", index=False)
+        xlsx_bytes = buf.getvalue()
+    del df
+
+    stages = []
+    def run(stage, fn, rows):
+        out, sec, peak = _measure(fn, repeat=repeat, memory=memory)
+        stages.append({"rows": n_rows, "stage": stage, "seconds": sec,
+                       "rows_per_sec": rows / sec if sec > 0 else float("inf"),
+                       "peak_mb": None if peak is None else peak / 2**20})
+        return out
+
+    raw = run("ingest_csv", lambda: pd.read_csv(BytesIO(csv_bytes)), n_rows)
+    if xlsx_bytes is not None:
+        run("ingest_xlsx_pandas", lambda: pd.read_excel(BytesIO(xlsx_bytes), sheet_name=None), n_rows)
+        run("ingest_xlsx_stream", lambda: read_excel_fast(BytesIO(xlsx_bytes)), n_rows)
+    run("parse_dates", lambda: DateParser().parse(raw["Tanggal"]).ffill(), n_rows)
+    # export campuran: separuh baris "dd/mm/YYYY", separuh ISO (tanpa format pd.to_datetime
+    # menghasilkan NaT untuk salah satu kelompok, format="mixed" parse per elemen)
+    iso = pd.to_datetime(raw["Tanggal"], format="%Y-%m-%d", errors="coerce")
+    mixed = raw["Tanggal"].where(np.arange(len(raw)) % 2 == 0, iso.dt.strftime("%d/%m/%Y"))
+    run("parse_dates_mixed", lambda: DateParser().parse(mixed).ffill(), n_rows)
+    norm = normalize_frame(raw.copy())
+    run("detect_anomaly", lambda: detect_anomaly_df(norm), n_rows)
+    hist_s, hist_d = _last_two(norm)
+    run("rk4_predict", lambda: rk4_forecast_bp(hist_s, hist_d), n_rows)
+    result, predictions, _, _ = run("analyze_population", lambda: analyze_population(norm), n_rows)
+    # semua profil ambang (THRESHOLD_PROFILES) sekaligus vs detect_anomaly_df sekali per profil
+    run("profile_anomalies", lambda: profile_anomalies(result), n_rows)
+    # statistik tren: ringkasan per pasien (disimpan bersama hasil) dan versi per baris (export)
+    run("patient_trends", lambda: patient_trends(result), n_rows)
+    run("rolling_trends", lambda: rolling_trends(result), n_rows)
+    # agregat grafik populasi dihitung sekali per hasil; gambar (tanpa cache) hanya dari agregat
+    aggs = run("chart_aggregates", lambda: population_aggregates(result, summarize_result(result, predictions)), n_rows)
+    run("chart_population", lambda: (clear_chart_cache(), population_chart_png(aggs)), n_rows)
+    parts = np.array_split(np.arange(len(result)), 32)
+    pieces = [result.iloc[p] for p in parts]
+    run("result_concat", lambda: pd.concat(pieces, ignore_index=True), n_rows)
+    run("export_csv", lambda: expand_result(result, predictions).to_csv(StringIO(), index=False), n_rows)
+    return stages, layout_memory(n_rows, norm, result, predictions)
+
+def _legacy_layout(frame):
+    # layout sebelum skema ringkas: Nama objek string, tensi float64
+    out = frame.copy()
+    out["Nama"] = out["Nama"].astype(str).astype(object)
+    for col in ("Systolic", "Diastolic"):
+        out[col] = out[col].astype("float64")
+    return out
+
+def layout_memory(n_rows, norm, result, predictions):
+    # byte per baris & MB per 1 juta baris: layout lama vs skema ringkas
+    legacy_result = _legacy_layout(expand_result(result, predictions))
+    sizes = [("upload", "lama", frame_nbytes(_legacy_layout(norm))),
+             ("upload", "ringkas", frame_nbytes(norm)),
+             ("hasil", "lama", frame_nbytes(legacy_result)),
+             ("hasil", "ringkas", frame_nbytes(result) + frame_nbytes(predictions))]
+    return [{"rows": n_rows, "frame": frame, "layout": layout, "bytes_per_row": nbytes / n_rows,
+             "mb_per_million": nbytes / n_rows * 1e6 / 2**20} for frame, layout, nbytes in sizes]
+
+# -----------------------
+# APP (cold start & rerun)
+# -----------------------
+APP_PAGES = ["beranda", "input", "personal", "hasil", "rk4info"]
+_APP_PROBE = r"""
+import json, statistics, sys, time
+from streamlit.testing.v1 import AppTest
+path, repeat = sys.argv[1], int(sys.argv[2])
+at = AppTest.from_file(path, default_timeout=120)
+t = time.perf_counter(); at.run(); out = {"cold_start": time.perf_counter() - t}
+for page in sys.argv[3:]:
+    times = []
+    for _ in range(repeat):
+        at.session_state["page"] = page
+        t = time.perf_counter(); at.run(); times.append(time.perf_counter() - t)
+    out[page] = statistics.median(times)
+print(json.dumps(out))
+"""
+
+def bench_app(repeat=7, starts=3):
+    # tiap start = interpreter baru (import modul ikut terukur); rerun = median per halaman
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    runs = []
+    for _ in range(starts):
+        proc = subprocess.run([sys.executable, "-c", _APP_PROBE, path, str(repeat)] + APP_PAGES,
+                              capture_output=True, text=True, check=True, cwd=os.path.dirname(path))
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return [{"stage": "app_" + key, "seconds": statistics.median(r[key] for r in runs)} for key in runs[0]]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="nadi_bench", description="Benchmark pipeline NADI per tahap")
+    ap.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="ukuran data (baris)")
+    ap.add_argument("--repeat", type=int, default=3, help="pengulangan per tahap (diambil tercepat)")
+    ap.add_argument("--no-memory", action="store_true", help="lewati pengukuran puncak memori")
+    ap.add_argument("--json", default=None, help="tulis hasil sebagai JSON lines ke file ini")
+    ap.add_argument("--xlsx", action="store_true", help="ukur juga ingest XLSX (menulis workbook lambat)")
+    ap.add_argument("--app", action="store_true", help="ukur cold start & rerun app.py saja (butuh streamlit)")
+    args = ap.parse_args(argv)
+
+    if args.app:
+        print(f"python {platform.python_version()} | pandas {pd.__version__} | numpy {np.__version__}")
+        records = bench_app(repeat=max(args.repeat, 5))
+        for rec in records:
+            print(f"{rec['stage']:<20} {rec['seconds'] * 1000:>9.1f} ms")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                for rec in records:
+                    f.write(json.dumps(rec) + "\n")
+        return 0
+
+    print(f"python {platform.python_version()} | pandas {pd.__version__} | numpy {np.__version__}")
+    print(f"{'rows':>10} {'stage':<20} {'seconds':>9} {'rows/s':>14} {'peak MB':>9}")
+    records = []
+    layouts = []
+    for n in args.rows:
+        stages, layout = bench_size(n, repeat=args.repeat, memory=not args.no_memory, xlsx=args.xlsx)
+        layouts.extend(layout)
+        for rec in stages:
+            records.append(rec)
+            peak = "-" if rec["peak_mb"] is None else f"{rec['peak_mb']:.1f}"
+            print(f"{rec['rows']:>10} {rec['stage']:<20} {rec['seconds']:>9.4f} "
+                  f"{rec['rows_per_sec']:>14,.0f} {peak:>9}")
+    print(f"\n{'rows':>10} {'frame':<8} {'layout':<8} {'byte/baris':>11} {'MB per 1M baris':>16}")
+    for rec in layouts:
+        print(f"{rec['rows']:>10} {rec['frame']:<8} {rec['layout']:<8} {rec['bytes_per_row']:>11.1f} "
+              f"{rec['mb_per_million']:>16.1f}")
+    maxrss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"max RSS proses: {maxrss_mb:.1f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            for rec in records + layouts:
+                f.write(json.dumps(rec) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
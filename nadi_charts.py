@@ -0,0 +1,207 @@
+# nadi_charts.py — NADI (RK4) — grafik: PNG di-cache per hash data, downsampling LTTB, agregat populasi
+# ============================================================
+# Grafik digambar dengan matplotlib.figure.Figure (tanpa pyplot: tanpa state global, aman
+# dipanggil dari banyak sesi; matplotlib baru di-import saat gambar pertama) lalu disimpan sebagai PNG di cache LRU per proses, dengan kunci
+# hash data + parameter. Klik ulang / rerun dengan data yang sama tidak menggambar ulang.
+#   - riwayat panjang: diperkecil ke <= NADI_CHART_POINTS titik dengan LTTB (Largest Triangle
+#     Three Buckets), bentuk (puncak / lembah) tetap terlihat;
+#   - populasi: hanya dari agregat yang dihitung sekali saat hasil disimpan (histogram tensi
+#     terakhir per pasien, rasio anomali per tanggal) -> waktu gambar tidak tergantung ukuran data.
+
+from collections import OrderedDict
+from io import BytesIO
+import hashlib
+import os
+import threading
+
+import pandas as pd
+import numpy as np
+
+from nadi_schema import flag, has_flags
+
+CHART_POINTS = int(os.environ.get("NADI_CHART_POINTS", "500"))
+CHART_CACHE_SIZE = int(os.environ.get("NADI_CHART_CACHE", "128"))
+PRESSURE_BINS = np.arange(40, 255, 5)
+
+# -----------------------
+# DOWNSAMPLING (LTTB)
+# -----------------------
+def lttb(x, y, n_out):
+    # Return: posisi titik terpilih (naik, termasuk titik pertama & terakhir). NaN pada y
+    # dilewati (tidak bisa ikut menghitung luas segitiga).
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    valid = np.flatnonzero(~np.isnan(y) & ~np.isnan(x))
+    n = len(valid)
+    if n_out >= n or n_out < 3:
+        return valid
+    xv, yv = x[valid], y[valid]
+    edges = np.linspace(1, n - 1, n_out - 1).astype("int64")
+    out = np.empty(n_out, dtype="int64")
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            nstart, nstop = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = xv[nstart:nstop].mean(), yv[nstart:nstop].mean()
+        else:
+            avg_x, avg_y = xv[-1], yv[-1]
+        area = np.abs((xv[a] - avg_x) * (yv[start:stop] - yv[a])
+                      - (xv[a] - xv[start:stop]) * (avg_y - yv[a]))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return valid[np.unique(out)]
+
+def downsample_bp(tanggal, systolic, diastolic, n_out=CHART_POINTS):
+    # posisi titik untuk grafik Systolic & Diastolic bersama: gabungan LTTB tiap seri
+    # (masing-masing n_out // 2) -> paling banyak n_out titik, bentuk kedua seri terjaga
+    t = pd.to_datetime(pd.Series(tanggal))
+    n = len(t)
+    if n <= n_out:
+        return np.arange(n)
+    x = t.to_numpy(dtype="datetime64[ns]").view("int64").astype("float64")
+    x[t.isna().to_numpy()] = np.nan
+    keep = np.union1d(lttb(x, systolic, n_out // 2), lttb(x, diastolic, n_out // 2))
+    return keep
+
+# -----------------------
+# CACHE PNG (LRU per proses)
+# -----------------------
+_charts = OrderedDict()
+_charts_lock = threading.Lock()
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        if p is None:
+            h.update(b"\0")
+        elif isinstance(p, (np.ndarray, pd.Series, pd.Index)):
+            arr = np.ascontiguousarray(np.asarray(p))
+            if arr.dtype == object:
+                arr = np.asarray(arr.astype(str), dtype="U")
+            h.update(str(arr.dtype).encode() + arr.tobytes())
+        else:
+            h.update(repr(p).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+def _cached_png(key, figsize, draw):
+    # draw(fig) hanya dipanggil jika key belum ada di cache; Return: (png bytes, return draw)
+    with _charts_lock:
+        hit = _charts.get(key)
+        if hit is not None:
+            _charts.move_to_end(key)
+            return hit
+    from matplotlib.figure import Figure    # ~0.5 s import, hanya jika memang menggambar
+    fig = Figure(figsize=figsize)
+    meta = draw(fig)
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=100, bbox_inches="tight")
+    hit = (buf.getvalue(), meta)
+    with _charts_lock:
+        _charts[key] = hit
+        while len(_charts) > CHART_CACHE_SIZE:
+            _charts.popitem(last=False)
+    return hit
+
+def clear_chart_cache():
+    with _charts_lock:
+        _charts.clear()
+
+# -----------------------
+# GRAFIK PASIEN (gaya halaman Personal)
+# -----------------------
+def bp_chart_png(tanggal, systolic, diastolic, name, fc_s=None, fc_d=None, max_points=CHART_POINTS):
+    # fc_s/fc_d = proyeksi RK4 (langkah 1..N, per hari setelah tanggal terakhir)
+    # Return: (png bytes, jumlah titik digambar, jumlah titik asli)
+    tanggal = pd.Series(pd.to_datetime(pd.Series(tanggal))).reset_index(drop=True)
+    systolic = np.asarray(systolic, dtype="float64")
+    diastolic = np.asarray(diastolic, dtype="float64")
+    key = _digest("bp", name, tanggal.to_numpy(dtype="datetime64[ns]"), systolic, diastolic,
+                  None if fc_s is None else np.asarray(fc_s), None if fc_d is None else np.asarray(fc_d),
+                  max_points)
+
+    def draw(fig):
+        keep = downsample_bp(tanggal, systolic, diastolic, max_points)
+        ax = fig.subplots()
+        ax.plot(tanggal.iloc[keep], systolic[keep], marker="o" if len(keep) <= 60 else None, label="Systolic")
+        ax.plot(tanggal.iloc[keep], diastolic[keep], marker="o" if len(keep) <= 60 else None, label="Diastolic")
+        last_date = tanggal.dropna().iloc[-1] if tanggal.notna().any() else None
+        if fc_s is not None and len(fc_s) and not np.isnan(fc_s[0]) and last_date is not None:
+            horizon = len(fc_s)
+            nd = last_date + pd.Timedelta(days=1)
+            if horizon > 1:
+                fd = last_date + pd.to_timedelta(np.arange(1, horizon+1), unit="D")
+                ax.plot(fd, fc_s, linestyle="--", label=f"Proyeksi Systolic ({horizon} hari)")
+                ax.plot(fd, fc_d, linestyle="--", label=f"Proyeksi Diastolic ({horizon} hari)")
+            ax.scatter([nd], [fc_s[0]], marker="D", s=80)
+            ax.scatter([nd], [fc_d[0]], marker="D", s=80)
+        ax.set_title(f"Tensi - {name}")
+        ax.legend()
+        fig.autofmt_xdate()
+        return len(keep)
+
+    png, n_shown = _cached_png(key, (9, 3), draw)
+    return png, n_shown, len(tanggal)
+
+# -----------------------
+# AGREGAT & GRAFIK POPULASI
+# -----------------------
+def population_aggregates(result, summary=None):
+    # dihitung sekali saat hasil disimpan (nadi_results.prepare_result); ukurannya kecil
+    # (jumlah bin + jumlah tanggal), tidak tergantung jumlah baris
+    aggs = {"bins": PRESSURE_BINS}
+    if summary is not None and len(summary) and "Systolic_Terakhir" in summary.columns:
+        for col, out in (("Systolic_Terakhir", "sys_hist"), ("Diastolic_Terakhir", "dia_hist")):
+            v = summary[col].to_numpy(dtype="float64")
+            v = np.clip(v[~np.isnan(v)], PRESSURE_BINS[0], PRESSURE_BINS[-1])
+            aggs[out] = np.histogram(v, bins=PRESSURE_BINS)[0]
+    if has_flags(result) and "Tanggal" in result.columns and len(result):
+        # bincount per hari sejak tanggal terkecil (tanpa sort / groupby)
+        t = pd.to_datetime(result["Tanggal"]).to_numpy(dtype="datetime64[D]")
+        ok = ~np.isnat(t)
+        if ok.any():
+            day = t[ok].view("int64")
+            lo = day.min()
+            rows = np.bincount(day - lo)
+            anom = np.bincount(day - lo, weights=flag(result, "Anom_Total")[ok])
+            used = np.flatnonzero(rows)
+            aggs["daily"] = pd.DataFrame({"Tanggal": (used + lo).astype("datetime64[D]").astype("datetime64[ns]"),
+                                          "Baris": rows[used], "Anomali": anom[used].astype("int64"),
+                                          "Rasio": anom[used] / rows[used]})
+    return aggs
+
+def population_chart_png(aggs, max_points=CHART_POINTS):
+    # Return: png bytes atau None jika tidak ada agregat yang bisa digambar
+    has_hist = "sys_hist" in aggs
+    daily = aggs.get("daily")
+    panels = int(has_hist) + int(daily is not None and len(daily) > 0)
+    if not panels:
+        return None
+    key = _digest("populasi", aggs["bins"], aggs.get("sys_hist"), aggs.get("dia_hist"),
+                  None if daily is None else daily["Tanggal"].to_numpy(),
+                  None if daily is None else daily["Rasio"].to_numpy(), max_points)
+
+    def draw(fig):
+        axes = list(np.atleast_1d(fig.subplots(1, panels)))
+        if has_hist:
+            ax = axes.pop(0)
+            bins = aggs["bins"]
+            ax.stairs(aggs["sys_hist"], bins, label="Systolic", fill=True, alpha=0.5)
+            ax.stairs(aggs["dia_hist"], bins, label="Diastolic", fill=True, alpha=0.5)
+            ax.set_title("Distribusi tensi terakhir per pasien")
+            ax.set_xlabel("mmHg")
+            ax.set_ylabel("Pasien")
+            ax.legend()
+        if axes:
+            ax = axes.pop(0)
+            x = daily["Tanggal"].to_numpy()
+            y = daily["Rasio"].to_numpy() * 100
+            keep = lttb(x.view("int64"), y, max_points) if len(daily) > max_points else np.arange(len(daily))
+            ax.plot(x[keep], y[keep], color="tab:red")
+            ax.set_title("Rasio anomali per tanggal")
+            ax.set_ylabel("% bacaan anomali")
+            ax.tick_params(axis="x", labelrotation=30)
+
+    return _cached_png(key, (10, 3.2), draw)[0]
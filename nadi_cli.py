@@ -0,0 +1,172 @@
+# nadi_cli.py — NADI (RK4) — batch headless (tanpa Streamlit / matplotlib)
+# ============================================================
+# Contoh:
+#   python nadi_cli.py data/klinik_*.csv -o hasil/
+#   python nadi_cli.py exports/ -o hasil/ --workers 8
+#   python nadi_cli.py besar.csv -o hasil/ --stream --chunksize 200000
+#   python nadi_cli.py rekap_tahunan.xlsx -o hasil/ --stream     # semua sheet
+#   python nadi_cli.py riwayat.csv -o hasil/ --trends              # + rata-rata bergerak / tren per pasien
+# Output per file: <nama>_hasil.csv, <nama>_ringkasan.csv (+ <nama>_tren.csv); nama file yang
+# bentrok (a.csv & a.xlsx, nama sama dari folder berbeda) memakai ekstensi / akhiran _2, _3, ...
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from nadi_engine import analyze_population_sharded, summarize_result
+from nadi_ingest import read_table, iter_table_chunks, count_table_rows, preview_table, stream_population
+from nadi_store import incremental_analyze, incremental_problem
+from nadi_schema import expand_result
+from nadi_dates import date_note
+from nadi_trends import patient_trends
+
+INPUT_EXTS = (".csv", ".xlsx")
+
+def collect_inputs(paths):
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            for fname in sorted(os.listdir(p)):
+                if fname.lower().endswith(INPUT_EXTS):
+                    files.append(os.path.join(p, fname))
+        else:
+            files.append(p)
+    return files
+
+def output_prefixes(files):
+    # prefix output per file: nama tanpa ekstensi; jika bentrok (a.csv & a.xlsx, atau nama sama
+    # dari folder berbeda) -> nama lengkap dengan ekstensi, masih kembar -> akhiran _2, _3, ...
+    stems = [os.path.splitext(os.path.basename(f))[0] for f in files]
+    names = [s if stems.count(s) == 1 else os.path.basename(f) for s, f in zip(stems, files)]
+    seen, out = {}, []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        out.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    return out
+
+def process_file(path, out_dir, stream=False, chunksize=100_000, shard_workers=1, shard_rows=None,
+                 store=None, trends=False, prefix=None):
+    # Return: dict ringkas (dipakai untuk laporan di stdout). prefix: nama dasar file output
+    # (default nama file tanpa ekstensi, lihat output_prefixes)
+    t0 = time.perf_counter()
+    stem = prefix or os.path.splitext(os.path.basename(path))[0]
+    out_rows = os.path.join(out_dir, f"{stem}_hasil.csv")
+    out_summary = os.path.join(out_dir, f"{stem}_ringkasan.csv")
+    out_trends = os.path.join(out_dir, f"{stem}_tren.csv")
+
+    date_report = {}
+    if store:
+        # inkremental: hanya baris setelah high-water mark per pasien di store SQLite
+        df, raw_columns = read_table(path, path, date_report=date_report)
+        missing = {"Nama","Systolic","Diastolic"} - set(df.columns)
+        if missing:
+            raise ValueError(f"Kolom minimal harus ada: {sorted(missing)}")
+        problem = incremental_problem(raw_columns, date_report)
+        if problem:
+            raise ValueError(problem)
+        summary, new_rows, alert_names, processing_errors, info = incremental_analyze(df, db_path=store)
+        total_rows = info["rows_new"]
+        new_rows.to_csv(out_rows, index=False)
+    elif stream:
+        has_tanggal = "Tanggal" in preview_table(path, path, nrows=1).columns
+        n_rows = None if has_tanggal else count_table_rows(path, path)
+        summary, alert_names, processing_errors, total_rows = stream_population(
+            iter_table_chunks(path, path, chunksize=chunksize), out_rows, n_rows=n_rows)
+    else:
+        df, _ = read_table(path, path, date_report=date_report)
+        missing = {"Nama","Systolic","Diastolic"} - set(df.columns)
+        if missing:
+            raise ValueError(f"Kolom minimal harus ada: {sorted(missing)}")
+        total_rows = len(df)
+        result, predictions, alert_names, processing_errors = analyze_population_sharded(
+            df, workers=shard_workers, shard_rows=shard_rows)
+        summary = None
+        if result is not None:
+            # export tetap layout lama (kolom bool + prediksi di baris terakhir pasien)
+            expand_result(result, predictions).to_csv(out_rows, index=False)
+            summary = summarize_result(result, predictions)
+            if trends:
+                # butuh tabel baris lengkap -> tidak tersedia di mode streaming / inkremental
+                patient_trends(result).to_csv(out_trends)
+
+    if summary is not None:
+        summary.to_csv(out_summary, index=False)
+    if date_note(date_report):
+        processing_errors = [date_note(date_report)] + processing_errors
+    return {
+        "file": path,
+        "prefix": stem,
+        "rows": total_rows,
+        "patients": 0 if summary is None else len(summary),
+        "alerts": len(alert_names),
+        "notes": processing_errors,
+        "seconds": time.perf_counter() - t0,
+    }
+
+def _run_one(args):
+    path, out_dir, stream, chunksize, shard_workers, shard_rows, store, trends, prefix = args
+    try:
+        return process_file(path, out_dir, stream=stream, chunksize=chunksize, shard_workers=shard_workers,
+                            shard_rows=shard_rows, store=store, trends=trends, prefix=prefix)
+    except Exception as e:
+        return {"file": path, "error": f"{type(e).__name__}: {e}"}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="nadi_cli", description="NADI (RK4) — analisis populasi tanpa UI")
+    ap.add_argument("inputs", nargs="+", help="file CSV/XLSX atau folder berisi file tersebut")
+    ap.add_argument("-o", "--out-dir", default="hasil_nadi", help="folder output (default: hasil_nadi)")
+    ap.add_argument("--workers", type=int, default=1, help="jumlah proses paralel antar-file (default: 1)")
+    ap.add_argument("--stream", action="store_true", help="mode streaming per chunk untuk CSV / XLSX besar")
+    ap.add_argument("--chunksize", type=int, default=100_000, help="baris per chunk pada mode streaming")
+    ap.add_argument("--shard-workers", type=int, default=0,
+                    help="core per file (shard per hash Nama); 0 = otomatis, 1 = tanpa shard")
+    ap.add_argument("--shard-rows", type=int, default=None, help="target baris per shard")
+    ap.add_argument("--store", default=None,
+                    help="file SQLite state per pasien; hanya baris baru yang diproses (file diproses berurutan)")
+    ap.add_argument("--trends", action="store_true",
+                    help="tulis juga <nama>_tren.csv: rata-rata bergerak, run hipertensi, tren least-squares per pasien")
+    ap.add_argument("-q", "--quiet", action="store_true", help="tidak menampilkan catatan per pasien")
+    args = ap.parse_args(argv)
+
+    files = collect_inputs(args.inputs)
+    if not files:
+        print("Tidak ada file CSV/XLSX yang ditemukan.", file=sys.stderr)
+        return 2
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    # paralel antar-file sudah memakai banyak core -> shard per file dimatikan (hindari oversubscription)
+    # store SQLite ditulis per file -> file diproses berurutan
+    parallel_files = args.workers > 1 and len(files) > 1 and not args.store
+    shard_workers = 1 if parallel_files else args.shard_workers
+    jobs = [(f, args.out_dir, args.stream, args.chunksize, shard_workers, args.shard_rows, args.store, args.trends, p)
+            for f, p in zip(files, output_prefixes(files))]
+    t0 = time.perf_counter()
+    if parallel_files:
+        with ProcessPoolExecutor(max_workers=args.workers) as ex:
+            reports = list(ex.map(_run_one, jobs))
+    else:
+        reports = [_run_one(j) for j in jobs]
+
+    failed = 0
+    total_rows = 0
+    for r in reports:
+        if "error" in r:
+            failed += 1
+            print(f"GAGAL  {r['file']}: {r['error']}", file=sys.stderr)
+            continue
+        total_rows += r["rows"]
+        print(f"OK     {r['file']}: {r['rows']} baris, {r['patients']} pasien, "
+              f"{r['alerts']} pasien anomali, {r['seconds']:.2f} s -> {r['prefix']}_*.csv")
+        if not args.quiet:
+            for msg in r["notes"]:
+                print(f"       - {msg}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - t0
+    print(f"Selesai: {len(reports) - failed}/{len(reports)} file, {total_rows} baris, "
+          f"{elapsed:.2f} s ({total_rows / max(elapsed, 1e-9):,.0f} baris/s)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
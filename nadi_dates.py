@@ -0,0 +1,173 @@
+# nadi_dates.py — NADI (RK4) — parsing kolom Tanggal (inferensi format + cache nilai)
+# ============================================================
+# pd.to_datetime tanpa format pada export campuran (mis. "05/01/2024" dan "2024-01-05", atau
+# "5 Januari 2024") menebak format dari baris pertama lalu diam-diam membuat NaT untuk sisanya,
+# atau (format="mixed") mem-parse per elemen dan sangat lambat (dan dengan dayfirst membaca
+# "2024-01-05" sebagai 1 Mei). Di sini:
+#   1. nilai unik saja yang diparse (tanggal sangat berulang), hasilnya di-cache antar-chunk;
+#   2. format diinferensi sekali dari sampel nilai unik, lalu parse vektor dengan format itu;
+#   3. nilai unik yang gagal dicoba dengan format kandidat lain (fallback, tetap vektor);
+#   4. sisanya (mis. "2024-01-05 08:30", ISO dengan pecahan detik, "January 5, 2024") lewat
+#      pd.to_datetime(format="mixed") per nilai unik -> semua yang dulu diterima parser lama
+#      tetap ter-parse; yang masih gagal = tidak valid (NaT -> ffill seperti sebelumnya).
+# Laporan: baris dengan format utama / fallback / tidak valid.
+
+from datetime import date, datetime
+import re
+
+import pandas as pd
+import numpy as np
+
+# urutan = prioritas saat skor sama (day-first: format Indonesia)
+DATE_FORMATS = [
+    "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d", "%d/%m/%y", "%d-%m-%y",
+    "%d %b %Y", "%d-%b-%Y", "%d %b %y", "%d-%b-%y",
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S",
+    "%m/%d/%Y",
+]
+INFER_SAMPLE = 500
+CACHE_SIZE = 200_000
+
+# nama bulan Indonesia (dan singkatannya) -> singkatan Inggris untuk %b
+_ID_MONTHS = {
+    "januari": "jan", "februari": "feb", "pebruari": "feb", "maret": "mar", "april": "apr",
+    "mei": "may", "juni": "jun", "juli": "jul", "agustus": "aug", "agu": "aug", "agt": "aug",
+    "september": "sep", "oktober": "oct", "okt": "oct", "nopember": "nov", "november": "nov",
+    "desember": "dec", "des": "dec",
+}
+_ID_MONTH_RE = re.compile(r"\b(" + "|".join(sorted(_ID_MONTHS, key=len, reverse=True)) + r")\b")
+_ID_DAY_RE = re.compile(r"^(senin|selasa|rabu|kamis|jumat|jum'at|sabtu|minggu|ahad),?\s*")
+
+def _normalize_text(values):
+    # Series string nilai unik -> huruf kecil, nama hari dibuang, nama bulan Indonesia diganti
+    txt = values.astype(str).str.strip().str.lower().str.replace(_ID_DAY_RE, "", regex=True)
+    return txt.str.replace(_ID_MONTH_RE, lambda m: _ID_MONTHS[m.group(1)], regex=True)
+
+def infer_date_format(texts, formats=DATE_FORMATS, sample=INFER_SAMPLE):
+    # format dengan proporsi parse sukses tertinggi pada sampel; None jika tidak ada yang cocok
+    texts = pd.Series(texts, dtype=object).dropna()
+    if texts.empty:
+        return None
+    if len(texts) > sample:
+        texts = texts.sample(sample, random_state=0)
+    best, best_rate = None, 0.0
+    for fmt in formats:
+        rate = pd.to_datetime(texts, format=fmt, errors="coerce").notna().mean()
+        if rate > best_rate:
+            best, best_rate = fmt, rate
+            if rate == 1.0:
+                break
+    return best
+
+def _parse_mixed(texts):
+    # format per elemen (lambat, hanya untuk sisa nilai unik). Zona waktu dibuang: satu zona ->
+    # jam lokal dipertahankan; zona campuran -> dikonversi ke UTC dulu.
+    try:
+        got = pd.to_datetime(texts, format="mixed", errors="coerce")
+    except ValueError:
+        got = pd.to_datetime(texts, format="mixed", errors="coerce", utc=True)
+    if getattr(got.dtype, "tz", None) is not None:
+        got = got.dt.tz_localize(None)
+    return got
+
+class DateParser:
+    # satu parser per file: format diinferensi di chunk pertama, dipakai ulang untuk chunk
+    # berikutnya; cache nilai -> tanggal juga dibagi antar-chunk.
+    def __init__(self, formats=DATE_FORMATS, cache_size=CACHE_SIZE):
+        self.formats = formats
+        self.cache_size = cache_size
+        self.format = None
+        self._cache = {}
+        self.rows = 0
+        self.rows_format = 0
+        self.rows_fallback = 0
+        self.rows_invalid = 0
+
+    def parse(self, values):
+        # Return: Series datetime64[ns] (NaT = kosong / tidak valid), index sama dengan input
+        s = values if isinstance(values, pd.Series) else pd.Series(values)
+        self.rows += len(s)
+        if pd.api.types.is_datetime64_any_dtype(s.dtype):
+            out = s.astype("datetime64[ns]")
+            self.rows_invalid += int(out.isna().sum())
+            return out
+
+        codes, uniques = pd.factorize(s, use_na_sentinel=True)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        uniq = pd.Series(np.asarray(uniques, dtype=object))
+        parsed = np.full(len(uniq), np.datetime64("NaT"), dtype="datetime64[ns]")
+        how = np.zeros(len(uniq), dtype="int8")     # 0 = tidak valid, 1 = format utama / datetime, 2 = fallback
+
+        cached = np.array([v in self._cache for v in uniq], dtype=bool)
+        if cached.any():
+            hits = [self._cache[v] for v in uniq[cached]]
+            parsed[cached] = [t for t, _ in hits]
+            how[cached] = [k for _, k in hits]
+        # sel Excel bertanggal sudah berupa datetime
+        is_dt = ~cached & uniq.map(lambda v: isinstance(v, (datetime, date, np.datetime64))).to_numpy(dtype=bool)
+        if is_dt.any():
+            parsed[is_dt] = pd.to_datetime(uniq[is_dt]).to_numpy(dtype="datetime64[ns]")
+            how[is_dt] = 1
+
+        todo = np.flatnonzero(~cached & ~is_dt)
+        if len(todo):
+            txt = _normalize_text(uniq.iloc[todo])
+            if self.format is None:
+                self.format = infer_date_format(txt, self.formats)
+            ok = np.zeros(len(todo), dtype=bool)
+            if self.format is not None:
+                got = pd.to_datetime(txt, format=self.format, errors="coerce")
+                ok = got.notna().to_numpy()
+                parsed[todo[ok]] = got[ok].to_numpy(dtype="datetime64[ns]")
+                how[todo[ok]] = 1
+            rest = ~ok & (txt != "").to_numpy()
+            for fmt in self.formats:
+                if not rest.any():
+                    break
+                if fmt == self.format:
+                    continue
+                got = pd.to_datetime(txt[rest], format=fmt, errors="coerce")
+                good = got.notna().to_numpy()
+                hit = np.flatnonzero(rest)[good]
+                parsed[todo[hit]] = got[good].to_numpy(dtype="datetime64[ns]")
+                how[todo[hit]] = 2
+                rest[hit] = False
+            if rest.any():
+                # catch-all: per nilai unik (hanya yang tersisa), tanpa dayfirst seperti parser lama
+                got = _parse_mixed(txt[rest])
+                good = got.notna().to_numpy()
+                hit = np.flatnonzero(rest)[good]
+                parsed[todo[hit]] = got[good].to_numpy(dtype="datetime64[ns]")
+                how[todo[hit]] = 2
+                rest[hit] = False
+            for v, t, k in zip(uniq.iloc[todo], parsed[todo], how[todo]):
+                if len(self._cache) >= self.cache_size:
+                    break
+                self._cache[v] = (t, k)
+
+        self.rows_format += int(counts[how == 1].sum())
+        self.rows_fallback += int(counts[how == 2].sum())
+        self.rows_invalid += len(s) - int(counts[how > 0].sum())
+        out = np.full(len(s), np.datetime64("NaT"), dtype="datetime64[ns]")
+        valid = codes >= 0
+        out[valid] = parsed[codes[valid]]
+        return pd.Series(out, index=s.index, name=s.name)
+
+    def report(self, ffilled=0):
+        return {"format": self.format, "rows": self.rows, "rows_format": self.rows_format,
+                "rows_fallback": self.rows_fallback, "rows_invalid": self.rows_invalid,
+                "rows_ffilled": int(ffilled)}
+
+def parse_dates(values, formats=DATE_FORMATS):
+    # Return: (Series datetime64[ns], laporan) — satu kali pakai (tanpa cache antar-chunk)
+    parser = DateParser(formats)
+    return parser.parse(values), parser.report()
+
+def date_note(report):
+    # catatan singkat untuk UI / CLI; None jika semua baris ter-parse dengan format utama
+    if not report or not (report["rows_fallback"] or report["rows_invalid"] or report["rows_ffilled"]):
+        return None
+    fmt = report["format"] or "tidak terdeteksi"
+    return (f"Tanggal (format {fmt}): {report['rows_fallback']} baris dengan format lain, "
+            f"{report['rows_invalid']} baris kosong/tidak valid, {report['rows_ffilled']} baris diisi "
+            f"dari baris sebelumnya (ffill).")
@@ -0,0 +1,430 @@
+# nadi_engine.py — NADI (RK4) — engine analisis (tanpa Streamlit)
+# ============================================================
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+import logging
+import multiprocessing
+import os
+import threading
+
+import pandas as pd
+import numpy as np
+
+from nadi_schema import (PRESSURE_DTYPE, PRED_COLS, PATIENT_COLS, FLAG_COLUMN, FLAG_HIPERTENSI, FLAG_HIPOTENSI,
+                         SOURCE_COL, pack_flags, flag, empty_patients, pressure_values)
+
+# -----------------------
+# RK4 PREDICTION
+# -----------------------
+def rk4_predict_value(last, prev, h=1.0):
+    slope = last - prev
+    def f(t, y): return slope
+    k1 = f(0, last)
+    k2 = f(h/2, last + h*k1/2)
+    k3 = f(h/2, last + h*k2/2)
+    k4 = f(h, last + h*k3)
+    return last + (h/6)*(k1 + 2*k2 + 2*k3 + k4)
+
+def rk4_predict_series(arr):
+    arr = list(arr)
+    if len(arr) < 2:
+        return None
+    return rk4_predict_value(arr[-1], arr[-2])
+
+# -----------------------
+# RK4 FORECAST (batch, berbasis array)
+# -----------------------
+def _rk4_step(f, t, y, h):
+    k1 = f(t, y)
+    k2 = f(t + h/2, y + h*k1/2)
+    k3 = f(t + h/2, y + h*k2/2)
+    k4 = f(t + h, y + h*k3)
+    return y + (h/6)*(k1 + 2*k2 + 2*k3 + k4)
+
+def rk4_forecast(history, steps=1, h=1.0, slope=None):
+    # history: array (..., n_riwayat), mis. (pasien, riwayat). Turunan = selisih dua
+    # bacaan terakhir per satu langkah, sama seperti rk4_predict_value; atau slope (array
+    # (...), mis. kemiringan least-squares dari nadi_trends) jika diberikan.
+    # Return: array (..., steps) berisi prediksi langkah 1..steps (jarak h per langkah).
+    hist = np.asarray(history, dtype="float64")
+    out = np.full(hist.shape[:-1] + (int(steps),), np.nan)
+    if hist.shape[-1] < (1 if slope is not None else 2):
+        return out
+    y = hist[..., -1]
+    slope = y - hist[..., -2] if slope is None else np.broadcast_to(np.asarray(slope, dtype="float64"), y.shape)
+    def f(t, y): return slope
+    for i in range(int(steps)):
+        y = _rk4_step(f, i*h, y, h)
+        out[..., i] = y
+    return out
+
+def rk4_forecast_bp(systolic, diastolic, steps=1, h=1.0, slopes=None):
+    # Systolic & Diastolic dihitung bersama dalam satu operasi array.
+    # slopes: (slope_sys, slope_dia) sebagai turunan (default: selisih dua bacaan terakhir)
+    # Return: array (2, ..., steps) -> `pred_sys, pred_dia = rk4_forecast_bp(...)`
+    if slopes is not None:
+        slopes = np.stack([np.asarray(slopes[0], dtype="float64"), np.asarray(slopes[1], dtype="float64")])
+    return rk4_forecast(np.stack([np.asarray(systolic, dtype="float64"),
+                                  np.asarray(diastolic, dtype="float64")]), steps=steps, h=h, slope=slopes)
+
+# -----------------------
+# ANOMALY DETECTION
+# -----------------------
+def detect_anomaly_df(df,
+                      thresh_sys_high=140,
+                      thresh_dia_high=90,
+                      thresh_sys_low=90,
+                      thresh_dia_low=60):
+    # shallow copy: kolom baru / kolom yang diganti tidak mengubah frame pemanggil,
+    # data kolom lain tidak ikut disalin
+    df = df.copy(deep=False)
+    for col in ('Systolic', 'Diastolic'):
+        if not pd.api.types.is_numeric_dtype(df[col].dtype):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['Hipertensi'] = (df['Systolic'] > thresh_sys_high) | (df['Diastolic'] > thresh_dia_high)
+    df['Hipotensi'] = (df['Systolic'] < thresh_sys_low) | (df['Diastolic'] < thresh_dia_low)
+    df['Anom_Total'] = df['Hipertensi'] | df['Hipotensi']
+    return df
+
+def anomaly_codes(systolic, diastolic,
+                  thresh_sys_high=140,
+                  thresh_dia_high=90,
+                  thresh_sys_low=90,
+                  thresh_dia_low=60):
+    # versi ringkas detect_anomaly_df: satu kolom uint8 (lihat nadi_schema), NaN -> bukan anomali
+    s = np.asarray(systolic)
+    d = np.asarray(diastolic)
+    return pack_flags((s > thresh_sys_high) | (d > thresh_dia_high),
+                      (s < thresh_sys_low) | (d < thresh_dia_low))
+
+# -----------------------
+# PROFIL AMBANG (what-if: beberapa pedoman sekaligus)
+# -----------------------
+log = logging.getLogger(__name__)
+
+def _env_profile(var, default):
+    # nilai env rusak tidak boleh menggagalkan import modul (app, CLI & server sekaligus)
+    try:
+        sys_high, dia_high, sys_low, dia_low = (float(x) for x in os.environ.get(var, default).split(","))
+    except ValueError:
+        log.warning("%s=%r tidak valid (harus 'sys_high,dia_high,sys_low,dia_low'); memakai default %s",
+                    var, os.environ.get(var), default)
+        sys_high, dia_high, sys_low, dia_low = (float(x) for x in default.split(","))
+    return {"sys_high": sys_high, "dia_high": dia_high, "sys_low": sys_low, "dia_low": dia_low,
+            "inclusive": True}
+
+# inclusive=True: hipertensi jika >= ambang (definisi pedoman); tanpa itu > ambang seperti
+# detect_anomaly_df. Hipotensi selalu < ambang. JNC7 dan ESH memakai batas 140/90 yang sama
+# untuk hipertensi (beda hanya di kategori di bawahnya); ACC/AHA 2017 turun ke 130/80.
+# Puskesmas: ambang lokal "sys_high,dia_high,sys_low,dia_low" dari NADI_PROFILE_PUSKESMAS
+# (default batas rujukan 160/100).
+THRESHOLD_PROFILES = {
+    "NADI": {"sys_high": 140, "dia_high": 90, "sys_low": 90, "dia_low": 60},
+    "JNC7": {"sys_high": 140, "dia_high": 90, "sys_low": 90, "dia_low": 60, "inclusive": True},
+    "ESH 2023": {"sys_high": 140, "dia_high": 90, "sys_low": 90, "dia_low": 60, "inclusive": True},
+    "ACC/AHA 2017": {"sys_high": 130, "dia_high": 80, "sys_low": 90, "dia_low": 60, "inclusive": True},
+    "Puskesmas": _env_profile("NADI_PROFILE_PUSKESMAS", "160,100,90,60"),
+}
+
+def _profile_matrix(profiles):
+    # (K, 4) ambang float64; ">= t" ditulis sebagai "> nextafter(t, -inf)" supaya semua
+    # profil cukup satu perbandingan broadcast
+    rows = []
+    for name in profiles:
+        p = THRESHOLD_PROFILES[name] if isinstance(name, str) else name
+        high = np.array([p["sys_high"], p["dia_high"]], dtype="float64")
+        if p.get("inclusive"):
+            high = np.nextafter(high, -np.inf)
+        rows.append([high[0], high[1], p["sys_low"], p["dia_low"]])
+    return np.array(rows, dtype="float64").reshape(-1, 4)
+
+def anomaly_codes_profiles(systolic, diastolic, profiles):
+    # anomaly_codes untuk K profil dalam satu pass: Return array uint8 (K, n_baris)
+    th = _profile_matrix(profiles)[:, :, None]
+    s = np.asarray(systolic)[None, :]
+    d = np.asarray(diastolic)[None, :]
+    return pack_flags((s > th[:, 0]) | (d > th[:, 1]), (s < th[:, 2]) | (d < th[:, 3]))
+
+def profile_anomalies(result, profiles=None):
+    # result: frame baris (ringkas atau layout lama) dengan Nama, Systolic, Diastolic.
+    # Return: (counts per profil [Hipertensi, Hipotensi, Anom_Total baris, Pasien_Anomali],
+    #          per_patient: jumlah bacaan anomali per pasien x profil, index Nama)
+    profiles = list(THRESHOLD_PROFILES) if profiles is None else list(profiles)
+    labels = [p if isinstance(p, str) else p.get("name", f"Profil {i+1}") for i, p in enumerate(profiles)]
+    names = result["Nama"]
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        codes, patients = names.cat.codes.to_numpy(), names.cat.categories
+    else:
+        codes, patients = pd.factorize(names, sort=False)
+    patients = pd.Index(np.asarray(patients, dtype=object), name="Nama")
+
+    flags = anomaly_codes_profiles(result["Systolic"].to_numpy(), result["Diastolic"].to_numpy(), profiles)
+    anom = flags != 0
+    k_idx, row_idx = np.nonzero(anom & (codes >= 0)[None, :])
+    per = np.bincount(k_idx * len(patients) + codes[row_idx], minlength=len(profiles) * len(patients))
+    per = per.reshape(len(profiles), len(patients)).astype("int32")
+
+    counts = pd.DataFrame({
+        "Hipertensi": ((flags & FLAG_HIPERTENSI) != 0).sum(axis=1),
+        "Hipotensi": ((flags & FLAG_HIPOTENSI) != 0).sum(axis=1),
+        "Anom_Total": anom.sum(axis=1),
+        "Pasien_Anomali": (per > 0).sum(axis=1),
+    }, index=pd.Index(labels, name="Profil"))
+    per_patient = pd.DataFrame(per.T, index=patients, columns=labels)
+    return counts, per_patient
+
+# -----------------------
+# POPULATION ANALYSIS (vectorized, satu kali jalan untuk semua pasien)
+# -----------------------
+def _date_sort_key(tanggal):
+    # NaT diurutkan paling akhir, sama seperti sort_values(na_position="last")
+    t = pd.to_datetime(tanggal, errors="coerce")
+    key = t.to_numpy(dtype="datetime64[ns]").view("int64").copy()
+    key[t.isna().to_numpy()] = np.iinfo(np.int64).max
+    return key
+
+def _skip_note(name):
+    return f"{name}: semua nilai Systolic/Diastolic kosong. Dilewati."
+
+def analyze_population(df):
+    # Hasil sama dengan loop lama `for name, g in df.groupby("Nama", sort=False)`:
+    # urutan pasien = urutan kemunculan pertama, tiap pasien diurutkan per Tanggal.
+    # result memakai skema ringkas (nadi_schema); ringkasan per pasien (bacaan terakhir,
+    # jumlah anomali, tanggal pertama/terakhir, prediksi RK4) ada di tabel samping berindex
+    # Nama -> nadi_schema.expand_result(result, patients) = layout lama.
+    # Return: (result atau None, patients, alert_names, processing_errors)
+    result, patients, alert_names, skipped = _analyze_population(df)
+    return result, patients, alert_names, [_skip_note(name) for name in skipped]
+
+def _input_cols(df):
+    return ["Nama","Tanggal","Systolic","Diastolic"] + ([SOURCE_COL] if SOURCE_COL in df.columns else [])
+
+def _analyze_population(df):
+    # sama dengan analyze_population, tapi pasien yang dilewati dikembalikan sebagai nama
+    cols = _input_cols(df)
+    work = df.loc[df["Nama"].notna(), cols]
+
+    codes, names = pd.factorize(work["Nama"], sort=False)
+    names = pd.Index(np.asarray(names, dtype=object))
+    if len(names) == 0:
+        return None, empty_patients(), [], []
+
+    # satu sort global (pasien, Tanggal); lexsort stabil -> urutan baris asli dipertahankan saat tanggal sama
+    order = np.lexsort((_date_sort_key(work["Tanggal"]), codes))
+    codes = codes[order]
+    sys_arr = pd.to_numeric(work["Systolic"], errors="coerce").to_numpy(dtype=PRESSURE_DTYPE)[order]
+    dia_arr = pd.to_numeric(work["Diastolic"], errors="coerce").to_numpy(dtype=PRESSURE_DTYPE)[order]
+    tanggal = work["Tanggal"].to_numpy()[order]
+    # kolom sumber file (upload banyak file) ikut per baris, tetap category
+    source = work[SOURCE_COL].array.take(order) if SOURCE_COL in cols else None
+
+    # pasien yang semua tensinya kosong -> dilewati & dicatat
+    has_value = ~(np.isnan(sys_arr) & np.isnan(dia_arr))
+    n_groups = len(names)
+    valid_group = np.bincount(codes, weights=has_value, minlength=n_groups) > 0
+    skipped = list(names[~valid_group])
+
+    keep = valid_group[codes]
+    if not keep.any():
+        return None, empty_patients(), [], skipped
+    if not keep.all():
+        codes, sys_arr, dia_arr, tanggal = codes[keep], sys_arr[keep], dia_arr[keep], tanggal[keep]
+        source = None if source is None else source[keep]
+    g = pd.DataFrame({
+        # kategori = nama pasien dalam urutan kemunculan pertama
+        "Nama": pd.Categorical.from_codes(codes, categories=names),
+        "Tanggal": tanggal,
+        "Systolic": sys_arr,
+        "Diastolic": dia_arr,
+        FLAG_COLUMN: anomaly_codes(sys_arr, dia_arr),
+    })
+    if source is not None:
+        g[SOURCE_COL] = source
+
+    # baris pertama, terakhir & sebelumnya tiap pasien (data sudah terurut per pasien,
+    # Tanggal naik, NaT di akhir -> baris pertama = Tanggal terkecil)
+    sizes = np.bincount(codes, minlength=n_groups)[valid_group]
+    end_pos = np.cumsum(sizes) - 1
+    first_pos = end_pos - sizes + 1
+    multi = sizes >= 2
+    last_pos = end_pos[multi]
+    prev_pos = last_pos - 1
+
+    # prediksi (pasien dengan 1 bacaan: NaN); dihitung dari nilai float64 seperti di file
+    fc_sys, fc_dia = rk4_forecast_bp(pressure_values(np.column_stack([sys_arr[prev_pos], sys_arr[last_pos]])),
+                                     pressure_values(np.column_stack([dia_arr[prev_pos], dia_arr[last_pos]])))
+    pred_sys = np.full(len(sizes), np.nan)
+    pred_dia = np.full(len(sizes), np.nan)
+    pred_sys[multi] = fc_sys[:, 0]
+    pred_dia[multi] = fc_dia[:, 0]
+
+    # ringkasan per pasien dalam pass yang sama -> tabel samping (kolom PATIENT_COLS)
+    anom_count = np.bincount(codes, weights=g[FLAG_COLUMN].to_numpy() != 0, minlength=n_groups)
+    patients = pd.DataFrame({
+        "Jumlah_Data": sizes.astype("int64"),
+        "Jumlah_Anomali": anom_count[valid_group].astype("int64"),
+        "Tanggal_Pertama": tanggal[first_pos],
+        "Tanggal_Terakhir": tanggal[end_pos],
+        "Systolic_Terakhir": pressure_values(sys_arr[end_pos]),
+        "Diastolic_Terakhir": pressure_values(dia_arr[end_pos]),
+        "Prediksi_Systolic": pred_sys,
+        "Prediksi_Diastolic": pred_dia,
+    }, index=pd.Index(names[valid_group], name="Nama"))
+
+    alert_names = list(names[(anom_count > 0) & valid_group])
+    return g, patients, alert_names, skipped
+
+# -----------------------
+# SHARDED (multi-core) POPULATION ANALYSIS
+# -----------------------
+# Pasien saling independen -> data dipecah per hash(Nama), tiap shard dianalisis di
+# process pool, lalu digabung ulang mengikuti urutan kemunculan pertama (= groupby sort=False).
+SHARD_WORKERS = int(os.environ.get("NADI_WORKERS", "0")) or (os.cpu_count() or 1)
+SHARD_ROWS = int(os.environ.get("NADI_SHARD_ROWS", "250000"))
+SHARD_MIN_ROWS = int(os.environ.get("NADI_SHARD_MIN_ROWS", "200000"))
+# dengan progress: data minimal dipecah jadi sekian bagian supaya progress bergerak bertahap
+PROGRESS_SHARDS = 20
+PROGRESS_MIN_ROWS = 50_000
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    # satu pool SHARD_WORKERS proses, dipakai ulang antar-analisis (start proses + import pandas
+    # cukup mahal) dan tidak pernah dibuat ulang: job background / load_uploads lain bisa sedang
+    # submit ke pool yang sama. Paralelisme per pemanggil dibatasi lewat pool_map(limit=...).
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: aman dipanggil dari server multi-thread (Streamlit)
+            _pool = ProcessPoolExecutor(max_workers=SHARD_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def pool_map(fn, arg_tuples, limit):
+    # fn(*args) untuk tiap tuple di pool bersama, maksimal `limit` tugas antri/berjalan sekaligus.
+    # Yield (index, future) sesuai urutan selesai; pemanggil mengambil fut.result(). Jika
+    # pemanggil berhenti (exception / pembatalan), tugas yang belum selesai dibatalkan.
+    pool = _get_pool()
+    todo = enumerate(arg_tuples)
+    pending = {}
+    def submit(n):
+        for i, args in islice(todo, n):
+            pending[pool.submit(fn, *args)] = i
+    try:
+        submit(max(int(limit), 1))
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = pending.pop(fut)
+                submit(1)
+                yield i, fut
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+def shard_ids(names, n_shards):
+    # hash deterministik (tidak tergantung PYTHONHASHSEED)
+    h = pd.util.hash_pandas_object(pd.Series(names), index=False).to_numpy()
+    return (h % np.uint64(n_shards)).astype("int64")
+
+def _analyze_whole(df, progress=None):
+    # tanpa shard: progress dilaporkan di awal & akhir, supaya progress bar job tetap selesai
+    if progress is not None:
+        progress(0, 0)
+    out = analyze_population(df)
+    if progress is not None:
+        progress(len(df), 0 if out[0] is None else len(out[1]))
+    return out
+
+def analyze_population_sharded(df, workers=None, shard_rows=None, min_rows=None, progress=None):
+    # Return sama dengan analyze_population(df); input kecil dijalankan in-process.
+    # progress(rows_done, patients_done) dipanggil tiap shard selesai (mis. nadi_jobs.Job.update,
+    # yang juga bisa membatalkan dengan melempar exception).
+    workers = int(workers or SHARD_WORKERS)
+    shard_rows = int(shard_rows or SHARD_ROWS)
+    min_rows = SHARD_MIN_ROWS if min_rows is None else int(min_rows)
+    in_process = workers <= 1 or len(df) < max(min_rows, 2)
+    if in_process and (progress is None or len(df) < PROGRESS_MIN_ROWS):
+        return _analyze_whole(df, progress)
+
+    work = df.loc[df["Nama"].notna(), _input_cols(df)]
+    _, names = pd.factorize(work["Nama"], sort=False)
+    if len(names) < 2:
+        return _analyze_whole(df, progress)
+    n_shards = max(workers, -(-len(work) // shard_rows))
+    if progress is not None:
+        n_shards = max(n_shards, PROGRESS_SHARDS)
+    n_shards = int(min(len(names), n_shards))
+    sid = shard_ids(work["Nama"], n_shards)
+    shards = [work.iloc[np.flatnonzero(sid == i)] for i in range(n_shards)]
+    shards = [s for s in shards if len(s)]
+
+    outputs = [None] * len(shards)
+    rows_done = patients_done = 0
+    def report(i, out):
+        nonlocal rows_done, patients_done
+        outputs[i] = out
+        rows_done += len(shards[i])
+        patients_done += len(out[1]) + len(out[3])
+        if progress is not None:
+            progress(rows_done, patients_done)
+
+    if in_process:
+        for i, shard in enumerate(shards):
+            report(i, _analyze_population(shard))
+    else:
+        running = pool_map(_analyze_population, [(s,) for s in shards], limit=workers)
+        try:
+            for i, fut in running:
+                report(i, fut.result())
+        finally:
+            running.close()
+
+    # gabung deterministik: urutkan pasien menurut kemunculan pertama di file asli
+    rank = pd.Index(np.asarray(names, dtype=object))
+    parts = [r for r, _, _, _ in outputs if r is not None]
+    alert_names = [n for _, _, a, _ in outputs for n in a]
+    skipped = [n for _, _, _, sk in outputs for n in sk]
+    alert_names = [alert_names[i] for i in np.argsort(rank.get_indexer(alert_names), kind="stable")]
+    skipped = [skipped[i] for i in np.argsort(rank.get_indexer(skipped), kind="stable")]
+    if not parts:
+        return None, empty_patients(), [], [_skip_note(n) for n in skipped]
+
+    # kategori tiap shard berbeda -> susun ulang kode ke kategori global (urutan kemunculan)
+    shard_codes = np.concatenate([rank.get_indexer(r["Nama"].cat.categories)[r["Nama"].cat.codes.to_numpy()]
+                                  for r in parts])
+    order = np.argsort(shard_codes, kind="stable")
+    result = pd.concat([r.drop(columns="Nama") for r in parts], ignore_index=True).iloc[order]
+    result.insert(0, "Nama", pd.Categorical.from_codes(shard_codes[order], categories=rank))
+    result = result.reset_index(drop=True)
+    patients = pd.concat([p for _, p, _, _ in outputs])
+    patients = patients.iloc[np.argsort(rank.get_indexer(patients.index), kind="stable")]
+    return result, patients, alert_names, [_skip_note(n) for n in skipped]
+
+def summarize_result(result, predictions=None):
+    # ringkasan per pasien dari tabel hasil (urutan pasien sama dengan result)
+    # kolom sama dengan ringkasan mode streaming (nadi_ingest.stream_population).
+    # predictions = tabel pasien dari analyze_population -> langsung dipakai (tanpa groupby)
+    if predictions is not None and set(PATIENT_COLS).issubset(predictions.columns):
+        out = predictions[PATIENT_COLS].reset_index()
+        out["Nama"] = out["Nama"].astype(object)
+        return out
+    anom = pd.Series(flag(result, "Anom_Total"), index=result.index)
+    g = result.groupby("Nama", sort=False, observed=True)
+    last = g.tail(1).set_index("Nama")
+    if predictions is not None:
+        pred = predictions.reindex(np.asarray(last.index, dtype=object))
+    else:
+        pred = last[PRED_COLS]
+    return pd.DataFrame({
+        "Nama": np.asarray(last.index, dtype=object),
+        "Jumlah_Data": g.size().to_numpy(),
+        "Jumlah_Anomali": anom.groupby(result["Nama"], sort=False, observed=True).sum().to_numpy(dtype="int64"),
+        "Tanggal_Pertama": g["Tanggal"].min().to_numpy(),
+        "Tanggal_Terakhir": last["Tanggal"].to_numpy(),
+        "Systolic_Terakhir": pressure_values(last["Systolic"]),
+        "Diastolic_Terakhir": pressure_values(last["Diastolic"]),
+        "Prediksi_Systolic": pred["Prediksi_Systolic"].to_numpy(),
+        "Prediksi_Diastolic": pred["Prediksi_Diastolic"].to_numpy(),
+    })
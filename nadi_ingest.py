@@ -0,0 +1,582 @@
+# nadi_ingest.py — NADI (RK4) — ingestion file upload (tanpa Streamlit)
+# ============================================================
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from io import BytesIO
+from xml.etree import ElementTree
+import hashlib
+import os
+import threading
+import zipfile
+
+import pandas as pd
+import numpy as np
+
+from nadi_engine import detect_anomaly_df, rk4_forecast_bp, _date_sort_key, pool_map, SHARD_WORKERS
+from nadi_metrics import stage
+from nadi_schema import compact_readings, SOURCE_COL
+from nadi_dates import DateParser, date_note
+
+BASE_COLS = ["Nama","Tanggal","Systolic","Diastolic"]
+REQUIRED_COLS = {"Nama","Systolic","Diastolic"}
+FLAG_COLS = ["Hipertensi","Hipotensi","Anom_Total"]
+
+# -----------------------
+# PARSE + NORMALISASI UPLOAD (dengan cache hash konten)
+# -----------------------
+def normalize_frame(df, today=None, date_report=None):
+    # kolom dibersihkan, Tanggal -> datetime (+ffill / dibuat dari posisi baris), tensi -> numeric
+    # date_report (dict, opsional) diisi laporan parsing Tanggal (nadi_dates.DateParser.report)
+    df.columns = [str(c).strip() for c in df.columns]
+    if not {"Nama","Systolic","Diastolic"}.issubset(df.columns):
+        return df
+    with stage("parse_dates", rows=len(df)):
+        if "Tanggal" in df.columns:
+            parser = DateParser()
+            df["Tanggal"] = parser.parse(df["Tanggal"])
+            missing = int(df["Tanggal"].isna().sum())
+            if missing:
+                df["Tanggal"] = df["Tanggal"].ffill()
+            if date_report is not None:
+                date_report.update(parser.report(ffilled=missing - int(df["Tanggal"].isna().sum())))
+        else:
+            today = today or datetime.now().date()
+            N = len(df)
+            df["Tanggal"] = [pd.Timestamp(today - timedelta(days=(N-1-i))) for i in range(N)]
+    with stage("normalize", rows=len(df)):
+        # skema ringkas (nadi_schema): Nama category, tensi float32
+        compact_readings(df)
+    return df
+
+def read_table(source, filename, today=None, date_report=None):
+    # source: path atau file-like; filename menentukan parser (CSV / Excel)
+    with stage("read_csv" if filename.lower().endswith(".csv") else "read_excel") as s:
+        if filename.lower().endswith(".csv"):
+            df = pd.read_csv(source)
+            raw_columns = [str(c).strip() for c in df.columns]
+        else:
+            df, raw_columns = read_excel_fast(source)
+        s.rows = len(df)
+    return normalize_frame(df, today=today, date_report=date_report), raw_columns
+
+def parse_upload(data, filename, today=None, date_report=None):
+    return read_table(BytesIO(data), filename, today=today, date_report=date_report)
+
+# Streamlit menjalankan ulang app.py setiap interaksi, tapi modul ini tetap di sys.modules,
+# jadi cache di level modul bertahan antar-rerun (dan dibagi antar-sesi).
+PARSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+_parse_cache = OrderedDict()   # key -> (df, raw_columns, nbytes, date_report)
+_parse_cache_bytes = 0
+_parse_cache_lock = threading.Lock()
+
+def _upload_cache_key(data, filename, today):
+    h = hashlib.blake2b(data, digest_size=20).hexdigest()
+    ext = filename.lower().rsplit(".", 1)[-1]
+    # today ikut di key karena Tanggal dibuat dari tanggal hari ini jika kolomnya tidak ada
+    return (h, ext, str(today))
+
+def _cache_get(key):
+    with _parse_cache_lock:
+        hit = _parse_cache.get(key)
+        if hit is not None:
+            _parse_cache.move_to_end(key)
+            return hit[0].copy(deep=False), list(hit[1]), True, dict(hit[3])
+    return None
+
+def _cache_put(key, df, raw_columns, date_report):
+    global _parse_cache_bytes
+    nbytes = int(df.memory_usage(deep=True).sum())
+    if nbytes <= PARSE_CACHE_MAX_BYTES:
+        with _parse_cache_lock:
+            if key not in _parse_cache:
+                _parse_cache[key] = (df, raw_columns, nbytes, date_report)
+                _parse_cache_bytes += nbytes
+            while _parse_cache_bytes > PARSE_CACHE_MAX_BYTES:
+                _, (_, _, old, _) = _parse_cache.popitem(last=False)
+                _parse_cache_bytes -= old
+    return df.copy(deep=False), list(raw_columns), False, dict(date_report)
+
+def load_upload(data, filename, today=None):
+    # Return: (df, raw_columns, cache_hit, date_report). df adalah salinan dangkal -> aman
+    # dimodifikasi per-kolom. date_report: laporan parsing Tanggal (kosong jika kolom tidak ada).
+    today = today or datetime.now().date()
+    with stage("hash_upload"):
+        key = _upload_cache_key(data, filename, today)
+    hit = _cache_get(key)
+    if hit is not None:
+        return hit
+    date_report = {}
+    df, raw_columns = parse_upload(data, filename, today=today, date_report=date_report)
+    return _cache_put(key, df, raw_columns, date_report)
+
+# -----------------------
+# UPLOAD BANYAK FILE (parse paralel + gabung dengan kolom sumber file)
+# -----------------------
+# Parse XLSX (iterparse XML) & CSV terikat GIL -> file di-parse di process pool engine
+# (NADI_WORKERS proses, dipakai ulang dengan analisis sharded), total waktu ~ file terlambat.
+# Upload kecil di-parse in-process: start / kirim data ke proses lebih mahal dari parse-nya.
+UPLOAD_PARALLEL_MIN_BYTES = int(os.environ.get("NADI_UPLOAD_PARALLEL_MIN_BYTES", str(2 * 1024 * 1024)))
+
+def _parse_upload_job(data, filename, today):
+    # dijalankan di proses pool (fungsi level modul -> bisa di-pickle)
+    date_report = {}
+    df, raw_columns = parse_upload(data, filename, today=today, date_report=date_report)
+    return df, raw_columns, date_report
+
+def _source_names(filenames):
+    # kategori Sumber_File harus unik: nama file kembar diberi akhiran " (2)", " (3)", ...
+    seen, out = {}, []
+    for name in filenames:
+        seen[name] = seen.get(name, 0) + 1
+        out.append(name if seen[name] == 1 else f"{name} ({seen[name]})")
+    return out
+
+def load_uploads(files, today=None, workers=None):
+    # files: list (data bytes, filename). Return: (df gabungan, sources) — df berskema ringkas
+    # dengan kolom Sumber_File (category), sources: list dict per file (file, rows, raw_columns,
+    # cache_hit, date_report, missing = kolom wajib yang tidak ada -> file tidak ikut digabung).
+    # Error baca file dilempar sebagai ValueError dengan nama file.
+    today = today or datetime.now().date()
+    names = _source_names([name for _, name in files])
+    with stage("hash_upload"):
+        keys = [_upload_cache_key(data, name, today) for data, name in files]
+    loaded = [_cache_get(key) for key in keys]
+    todo = [i for i, hit in enumerate(loaded) if hit is None]
+    workers = int(workers or SHARD_WORKERS)
+    parallel = len(todo) >= 2 and workers > 1 and sum(len(files[i][0]) for i in todo) >= UPLOAD_PARALLEL_MIN_BYTES
+
+    def done(i, out):
+        df, raw_columns, date_report = out
+        loaded[i] = _cache_put(keys[i], df, raw_columns, date_report)
+
+    with stage("parse_uploads", rows=len(todo)):
+        if parallel:
+            running = pool_map(_parse_upload_job, [(files[i][0], files[i][1], today) for i in todo], limit=workers)
+            try:
+                for k, fut in running:
+                    try:
+                        done(todo[k], fut.result())
+                    except Exception as e:
+                        raise ValueError(f"{names[todo[k]]}: {e}") from e
+            finally:
+                running.close()
+        else:
+            for i in todo:
+                try:
+                    done(i, _parse_upload_job(files[i][0], files[i][1], today))
+                except Exception as e:
+                    raise ValueError(f"{names[i]}: {e}") from e
+
+    sources, frames = [], []
+    for name, (df, raw_columns, cache_hit, date_report) in zip(names, loaded):
+        missing = sorted(REQUIRED_COLS - set(df.columns))
+        sources.append({"file": name, "rows": len(df), "raw_columns": raw_columns, "cache_hit": cache_hit,
+                        "date_report": date_report, "missing": missing})
+        if not missing:
+            frames.append((name, df))
+    return _merge_uploads(frames), sources
+
+def _str_names(names):
+    # kategori Nama -> teks; angka bulat bertipe float (kolom nomor RM dengan sel kosong) ditulis
+    # tanpa ".0", supaya 1001 dan 1001.0 dari file berbeda tetap pasien yang sama
+    cats = names.cat.categories
+    if cats.dtype.kind == "f" and np.isfinite(cats).all() and (cats == np.round(cats)).all():
+        cats = cats.astype("int64")
+    return names.cat.rename_categories(cats.astype(str))
+
+def _merge_uploads(frames):
+    # Nama tiap file punya kategori sendiri -> union_categoricals (tanpa kembali ke objek string).
+    # Tipe kategori harus sama: jika berbeda antar file (nomor RM int / float / teks), semua
+    # dijadikan teks dulu
+    if not frames:
+        return pd.DataFrame(columns=BASE_COLS + [SOURCE_COL])
+    with stage("merge_uploads", rows=sum(len(df) for _, df in frames)):
+        df = pd.concat([f.drop(columns="Nama") for _, f in frames], ignore_index=True)
+        names = [f["Nama"] for _, f in frames]
+        if len({str(n.cat.categories.dtype) for n in names}) > 1:
+            names = [_str_names(n) for n in names]
+        df.insert(0, "Nama", pd.api.types.union_categoricals(names))
+        sizes = np.array([len(f) for _, f in frames])
+        df[SOURCE_COL] = pd.Categorical.from_codes(np.repeat(np.arange(len(frames)), sizes),
+                                                   categories=[name for name, _ in frames])
+        compact_readings(df)
+    return df
+
+def clear_upload_cache():
+    global _parse_cache_bytes
+    with _parse_cache_lock:
+        _parse_cache.clear()
+        _parse_cache_bytes = 0
+
+# -----------------------
+# CHUNK READERS
+# -----------------------
+def iter_csv_chunks(source, chunksize=100_000):
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        yield chunk
+
+def count_csv_rows(source, chunksize=500_000):
+    # dipakai hanya jika kolom Tanggal tidak ada (tanggal dibuat dari posisi baris)
+    n = 0
+    for chunk in pd.read_csv(source, usecols=[0], chunksize=chunksize):
+        n += len(chunk)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return n
+
+# Excel: sheet XML di-stream langsung dari arsip .xlsx (zipfile + iterparse), tanpa membangun
+# objek cell openpyxl -> ~2-3x lebih cepat dari openpyxl read-only, memori ~1 chunk.
+# Hanya kolom Nama/Tanggal/Systolic/Diastolic (dicari lewat header) yang diambil nilainya;
+# semua sheet dibaca, sheet tanpa kolom minimal (mis. sheet keterangan) dilewati.
+_XL_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XL_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_XL_C, _XL_V, _XL_T, _XL_ROW = _XL_NS + "c", _XL_NS + "v", _XL_NS + "t", _XL_NS + "row"
+_XL_SHEETDATA = _XL_NS + "sheetData"
+_XL_DIGITS = "0123456789"
+
+def _col_index(letters, cache={}):
+    # "A" -> 0, "AB" -> 27
+    idx = cache.get(letters)
+    if idx is None:
+        idx = 0
+        for ch in letters:
+            idx = idx * 26 + ord(ch) - 64
+        idx = cache[letters] = idx - 1
+    return idx
+
+class _Workbook:
+    # metadata workbook: daftar (nama sheet, path XML), shared strings, sistem tanggal 1904
+    def __init__(self, source):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        self.zip = zipfile.ZipFile(source)
+        root = ElementTree.fromstring(self.zip.read("xl/workbook.xml"))
+        pr = root.find(_XL_NS + "workbookPr")
+        self.date1904 = pr is not None and pr.get("date1904") in ("1", "true")
+        rels = ElementTree.fromstring(self.zip.read("xl/_rels/workbook.xml.rels"))
+        targets = {r.get("Id"): r.get("Target") for r in rels}
+        self.sheets = []
+        for s in root.iter(_XL_NS + "sheet"):
+            target = targets[s.get(_XL_REL_NS + "id")]
+            path = target.lstrip("/") if target.startswith("/") else "xl/" + target
+            self.sheets.append((s.get("name"), path))
+        self.shared = []
+        if "xl/sharedStrings.xml" in self.zip.namelist():
+            with self.zip.open("xl/sharedStrings.xml") as f:
+                for _, el in ElementTree.iterparse(f):
+                    if el.tag == _XL_NS + "si":
+                        # teks biasa (<t>) maupun rich text (<r><t>..</t></r>...)
+                        self.shared.append("".join(t.text or "" for t in el.iter(_XL_T)))
+                        el.clear()
+
+    def close(self):
+        self.zip.close()
+
+    def rows(self, path, want=None):
+        # yield (nomor baris, {kolom: nilai}) per baris berisi; want = set indeks kolom (None = semua)
+        shared = self.shared
+        with self.zip.open(path) as f:
+            sheet_data = None
+            cur = {}
+            col = -1
+            rownum = 0
+            for event, el in ElementTree.iterparse(f, events=("start", "end")):
+                tag = el.tag
+                if event == "start":
+                    if tag == _XL_ROW:
+                        col = -1
+                        r = el.get("r")
+                        rownum = int(r) if r else rownum + 1
+                    elif tag == _XL_SHEETDATA:
+                        sheet_data = el
+                    continue
+                if tag == _XL_C:
+                    ref = el.get("r")
+                    col = _col_index(ref.rstrip(_XL_DIGITS)) if ref else col + 1
+                    if want is not None and col not in want:
+                        continue
+                    t = el.get("t")
+                    if t == "inlineStr":
+                        val = "".join(x.text or "" for x in el.iter(_XL_T))
+                    else:
+                        v = el.find(_XL_V)
+                        val = None if v is None else v.text
+                        if val is not None:
+                            if t == "s":
+                                val = shared[int(val)]
+                            elif t is None or t == "n":
+                                val = float(val)
+                            elif t == "b":
+                                val = val == "1"
+                            elif t == "e":
+                                val = None
+                    if val is not None:
+                        cur[col] = val
+                elif tag == _XL_ROW:
+                    if cur:
+                        yield rownum, cur
+                        cur = {}
+                    # baris yang sudah diproses dilepas supaya memori tidak tumbuh per baris
+                    sheet_data.clear()
+
+def _open_workbook(source):
+    return _Workbook(source)
+
+HEADER_SCAN_ROWS = 20
+
+def _sheet_header(wb, path):
+    # header = baris (dari HEADER_SCAN_ROWS baris berisi pertama) yang memuat kolom minimal,
+    # jadi judul laporan di atas tabel tidak masalah; jika tidak ada: baris berisi pertama.
+    # Return: (header, nomor baris header)
+    first = None
+    for k, (rownum, row) in enumerate(wb.rows(path)):
+        header = [str(row[i]).strip() if i in row else "" for i in range(max(row) + 1)]
+        if REQUIRED_COLS.issubset(header):
+            return header, rownum
+        first = first or (header, rownum)
+        if k + 1 >= HEADER_SCAN_ROWS:
+            break
+    return first or ([], 0)
+
+def _excel_headers(source):
+    # {nama_sheet: (header, nomor baris header)} (hanya awal tiap sheet yang diparse)
+    wb = _open_workbook(source)
+    try:
+        return {name: _sheet_header(wb, path) for name, path in wb.sheets}
+    finally:
+        wb.close()
+
+def excel_headers(source):
+    # Return: {nama_sheet: [header]}
+    return {name: header for name, (header, _) in _excel_headers(source).items()}
+
+def _excel_columns(headers):
+    # kolom yang dibaca: BASE_COLS; Tanggal hanya jika ada di salah satu sheet yang valid
+    usable = [h for h, _ in headers.values() if REQUIRED_COLS.issubset(h)]
+    has_tanggal = any("Tanggal" in h for h in usable)
+    return [c for c in BASE_COLS if c != "Tanggal" or has_tanggal]
+
+def iter_excel_chunks(source, chunksize=100_000, headers=None):
+    headers = _excel_headers(source) if headers is None else headers
+    columns = _excel_columns(headers)
+    wb = _open_workbook(source)
+    try:
+        for name, path in wb.sheets:
+            header, header_row = headers.get(name, ([], 0))
+            if not REQUIRED_COLS.issubset(header):
+                continue
+            idx = [header.index(c) if c in header else None for c in columns]
+            want = {i for i in idx if i is not None}
+            buf = []
+            for rownum, row in wb.rows(path, want=want):
+                if rownum <= header_row:
+                    continue
+                values = tuple(None if i is None else row.get(i) for i in idx)
+                if any(v is not None for v in values):
+                    buf.append(values)
+                if len(buf) >= chunksize:
+                    yield _excel_chunk(buf, columns, wb.date1904)
+                    buf = []
+            if buf:
+                yield _excel_chunk(buf, columns, wb.date1904)
+    finally:
+        wb.close()
+
+def _excel_chunk(buf, columns, date1904=False):
+    chunk = pd.DataFrame.from_records(buf, columns=columns)
+    for col in ("Systolic", "Diastolic"):
+        chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+    if "Tanggal" in chunk.columns:
+        # tanggal Excel tersimpan sebagai nomor seri hari -> Timestamp (teks dibiarkan untuk to_datetime)
+        tgl = chunk["Tanggal"]
+        serial = tgl.map(type).eq(float).to_numpy()
+        if serial.any():
+            origin = "1904-01-01" if date1904 else "1899-12-30"
+            tgl = tgl.astype(object)
+            tgl[serial] = pd.to_datetime(tgl[serial].astype("float64"), unit="D", origin=origin)
+            chunk["Tanggal"] = tgl
+    return chunk
+
+def read_excel_fast(source):
+    # Return: (df semua sheet digabung, raw_columns) -> siap untuk normalize_frame
+    headers = _excel_headers(source)
+    raw_columns = list(dict.fromkeys(c for h, _ in headers.values() for c in h if c))
+    chunks = list(iter_excel_chunks(source, chunksize=500_000, headers=headers))
+    if not chunks:
+        # tidak ada sheet dengan kolom minimal: kembalikan header sheet pertama untuk pesan error
+        first = next(iter(headers.values()), ([], 0))[0]
+        return pd.DataFrame(columns=[c for c in first if c]), raw_columns
+    return pd.concat(chunks, ignore_index=True), raw_columns
+
+def count_excel_rows(source, chunksize=500_000):
+    n = sum(len(chunk) for chunk in iter_excel_chunks(source, chunksize=chunksize))
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return n
+
+def iter_table_chunks(source, filename, chunksize=100_000):
+    # chunk DataFrame dari CSV atau XLSX (semua sheet), untuk stream_population
+    if filename.lower().endswith(".csv"):
+        return iter_csv_chunks(source, chunksize=chunksize)
+    return iter_excel_chunks(source, chunksize=chunksize)
+
+def count_table_rows(source, filename):
+    if filename.lower().endswith(".csv"):
+        return count_csv_rows(source)
+    return count_excel_rows(source)
+
+def preview_table(source, filename, nrows=30):
+    # beberapa baris pertama + daftar kolom; source di-seek ke awal sesudahnya
+    if filename.lower().endswith(".csv"):
+        preview = pd.read_csv(source, nrows=nrows)
+        preview.columns = [str(c).strip() for c in preview.columns]
+    else:
+        headers = _excel_headers(source)
+        preview = next(iter_excel_chunks(source, chunksize=nrows, headers=headers), None)
+        if preview is None:
+            first = next(iter(headers.values()), ([], 0))[0]
+            preview = pd.DataFrame(columns=[c for c in first if c])
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return preview
+
+# -----------------------
+# STREAMING POPULATION ANALYSIS
+# -----------------------
+# State per pasien dibuat sekecil mungkin: 2 bacaan terakhir (untuk RK4) + counter.
+# Memori puncak ~ jumlah pasien + 1 chunk, bukan jumlah baris file.
+def _merge_last_two(state, rows):
+    # state & rows: kolom Nama, _key, _seq, Tanggal, Systolic, Diastolic
+    touched = state["Nama"].isin(rows["Nama"].unique())
+    merged = pd.concat([state.loc[touched], rows], ignore_index=True)
+    merged = merged.sort_values(["_key","_seq"], kind="stable")
+    merged = merged.groupby("Nama", sort=False).tail(2)
+    return pd.concat([state.loc[~touched], merged], ignore_index=True)
+
+STATE_COLS = ["Nama","_key","_seq","Tanggal","Systolic","Diastolic"]
+STATS_AGG = {"first_seq":"min", "n_rows":"sum", "n_valid":"sum", "n_anom":"sum",
+             "first_date":"min", "last_date":"max"}
+
+def _empty_state():
+    return pd.DataFrame({"Nama": pd.Series(dtype=object), "_key": pd.Series(dtype="int64"),
+                         "_seq": pd.Series(dtype="int64"), "Tanggal": pd.Series(dtype="datetime64[ns]"),
+                         "Systolic": pd.Series(dtype="float64"), "Diastolic": pd.Series(dtype="float64")})
+
+def _row_stats(c):
+    # counter per pasien dari baris beranotasi (kolom _seq, Tanggal, tensi, Anom_Total)
+    has_value = c["Systolic"].notna() | c["Diastolic"].notna()
+    return pd.DataFrame({
+        "first_seq": c["_seq"].to_numpy(), "n_rows": 1,
+        "n_valid": has_value.to_numpy(dtype="int64"),
+        "n_anom": c["Anom_Total"].to_numpy(dtype="int64"),
+        "first_date": c["Tanggal"].to_numpy(), "last_date": c["Tanggal"].to_numpy(),
+    }, index=pd.Index(c["Nama"].to_numpy(), name="Nama")).groupby(level=0, sort=False).agg(STATS_AGG)
+
+def _last_prev(state, index):
+    # bacaan terakhir & sebelumnya per pasien (urut Tanggal, NaT paling akhir), di-reindex ke `index`
+    state = state.sort_values(["_key","_seq"], kind="stable")
+    g = state.groupby("Nama", sort=False)
+    return g.nth(-1).set_index("Nama").reindex(index), g.nth(-2).set_index("Nama").reindex(index)
+
+def _merge_stats(stats, chunk_stats):
+    if stats is None:
+        return chunk_stats
+    both = pd.concat([stats, chunk_stats])
+    return both.groupby(level=0, sort=False).agg(STATS_AGG)
+
+def stream_population(chunks, sink, n_rows=None, today=None, progress=None):
+    # chunks: iterator DataFrame (mis. iter_csv_chunks); sink: path / file teks untuk
+    # baris beranotasi (Hipertensi/Hipotensi/Anom_Total), ditulis per chunk sesuai urutan file.
+    # n_rows: total baris, wajib jika kolom Tanggal tidak ada.
+    # progress(rows_done, patients_done): dipanggil tiap chunk selesai (lihat nadi_jobs).
+    # Return: (summary per pasien atau None, alert_names, processing_errors, total_rows)
+    own_file = not hasattr(sink, "write")
+    out = open(sink, "w", newline="", encoding="utf-8") if own_file else sink
+    today = today or datetime.now().date()
+
+    state = _empty_state()
+    stats = None
+    dates = DateParser()    # format diinferensi sekali, cache nilai dibagi antar-chunk
+    ffilled = 0
+    carry_date = pd.NaT
+    offset = 0
+    header = True
+    try:
+        for chunk in chunks:
+            missing = {"Nama","Systolic","Diastolic"} - set(chunk.columns)
+            if missing:
+                raise ValueError(f"Kolom minimal harus ada: {sorted(missing)}")
+            seq = np.arange(offset, offset + len(chunk), dtype="int64")
+            offset += len(chunk)
+
+            # handle tanggal (ffill lintas chunk, sama seperti ffill di seluruh file)
+            if "Tanggal" in chunk.columns:
+                tgl = dates.parse(chunk["Tanggal"])
+                missing = int(tgl.isna().sum())
+                if len(tgl) and pd.isna(tgl.iloc[0]):
+                    tgl.iloc[0] = carry_date
+                tgl = tgl.ffill()
+                ffilled += missing - int(tgl.isna().sum())
+                if tgl.notna().any():
+                    carry_date = tgl.dropna().iloc[-1]
+            else:
+                if n_rows is None:
+                    raise ValueError("n_rows wajib diisi jika kolom Tanggal tidak ada")
+                base = pd.Timestamp(today)
+                tgl = pd.Series(base - pd.to_timedelta(n_rows - 1 - seq, unit="D"), index=chunk.index)
+
+            c = pd.DataFrame({"Nama": chunk["Nama"], "Tanggal": tgl,
+                              "Systolic": chunk["Systolic"], "Diastolic": chunk["Diastolic"]})
+            keep = c["Nama"].notna().to_numpy()
+            c = detect_anomaly_df(c.loc[keep])
+            if c.empty:
+                continue
+            c[BASE_COLS + FLAG_COLS].to_csv(out, header=header, index=False)
+            header = False
+
+            c["_seq"] = seq[keep]
+            c["_key"] = _date_sort_key(c["Tanggal"])
+            stats = _merge_stats(stats, _row_stats(c))
+            state = _merge_last_two(state, c[STATE_COLS])
+            if progress is not None:
+                progress(offset, len(stats))
+    finally:
+        if own_file:
+            out.close()
+
+    note = date_note(dates.report(ffilled=ffilled)) if dates.rows else None
+    if stats is None:
+        return None, [], [note] if note else [], offset
+    summary, alert_names, processing_errors = _finalize_stream(state, stats)
+    return summary, alert_names, ([note] if note else []) + processing_errors, offset
+
+def _finalize_stream(state, stats):
+    # urutan pasien = urutan kemunculan pertama (sama dengan groupby(sort=False))
+    stats = stats.sort_values("first_seq", kind="stable")
+    valid = stats["n_valid"] > 0
+    processing_errors = [f"{name}: semua nilai Systolic/Diastolic kosong. Dilewati."
+                         for name in stats.index[~valid]]
+    stats = stats.loc[valid]
+    if stats.empty:
+        return None, [], processing_errors
+
+    last, prev = _last_prev(state, stats.index)
+
+    fc_sys, fc_dia = rk4_forecast_bp(np.column_stack([prev["Systolic"], last["Systolic"]]),
+                                     np.column_stack([prev["Diastolic"], last["Diastolic"]]))
+    summary = pd.DataFrame({
+        "Nama": stats.index,
+        "Jumlah_Data": stats["n_rows"].to_numpy(),
+        "Jumlah_Anomali": stats["n_anom"].to_numpy(),
+        "Tanggal_Pertama": stats["first_date"].to_numpy(),
+        "Tanggal_Terakhir": last["Tanggal"].to_numpy(),
+        "Systolic_Terakhir": last["Systolic"].to_numpy(),
+        "Diastolic_Terakhir": last["Diastolic"].to_numpy(),
+        "Prediksi_Systolic": fc_sys[:, 0],
+        "Prediksi_Diastolic": fc_dia[:, 0],
+    })
+    # pasien dengan 1 bacaan: tidak ada prediksi (prev kosong -> NaN otomatis)
+    alert_names = list(stats.index[stats["n_anom"].to_numpy() > 0])
+    return summary, alert_names, processing_errors
@@ -0,0 +1,169 @@
+# nadi_jobs.py — NADI (RK4) — job analisis di background (progress, ETA, pembatalan)
+# ============================================================
+# Streamlit menjalankan ulang script setiap interaksi; analisis yang berjalan di dalam script
+# ikut terputus. Job di sini berjalan di thread pool level modul (bertahan antar-rerun), UI
+# hanya membaca status lewat job_id.
+#
+#   job_id = submit_job(fn, arg, label="populasi", rows_total=n)
+#   # fn(arg, progress=job.update) -> hasil; progress(rows_done, patients_done) melempar
+#   # JobCancelled jika job dibatalkan.
+#   job = get_job(job_id); job.status, job.fraction(), job.eta(), job.result
+# metrics=True -> fn dijalankan di dalam run nadi_metrics milik worker (stage() di fn ikut
+# tercatat, plus tahap "job_total"); record-nya ada di job.metrics_records untuk UI.
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+import uuid
+
+from nadi_metrics import begin_run, end_run, stage
+
+JOB_WORKERS = int(os.environ.get("NADI_JOB_WORKERS", "2"))
+JOB_TTL = float(os.environ.get("NADI_JOB_TTL_MINUTES", "60")) * 60
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "antri", "berjalan", "selesai", "gagal", "dibatalkan"
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, label, rows_total=None, patients_total=None, metrics=False):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.metrics = metrics
+        self.metrics_records = []
+        self.status = QUEUED
+        self.rows_total = rows_total
+        self.patients_total = patients_total
+        self.rows_done = 0
+        self.patients_done = 0
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    def update(self, rows_done=None, patients_done=None):
+        # dipanggil dari fungsi job; sekaligus titik pembatalan
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if rows_done is not None:
+            self.rows_done = int(rows_done)
+        if patients_done is not None:
+            self.patients_done = int(patients_done)
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def rows_per_sec(self):
+        t = self.elapsed()
+        return self.rows_done / t if t > 0 else 0.0
+
+    def fraction(self):
+        if self.status == DONE:
+            return 1.0
+        if not self.rows_total:
+            return None
+        return min(self.rows_done / self.rows_total, 1.0)
+
+    def eta(self):
+        # detik tersisa (perkiraan linear dari baris/detik) atau None jika belum bisa dihitung
+        rate = self.rows_per_sec()
+        if self.status != RUNNING or not self.rows_total or rate <= 0:
+            return None
+        return max(self.rows_total - self.rows_done, 0) / rate
+
+_pool = None
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _jobs_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="nadi-job")
+        return _pool
+
+def _run(job, fn, args, kwargs):
+    if job._cancel.is_set():
+        job.status = CANCELLED
+        job.finished = time.time()
+        return
+    job.status = RUNNING
+    job.started = time.time()
+    begin_run("job", enabled=job.metrics, job=job.label)
+    try:
+        with stage("job_total", rows=job.rows_total):
+            job.result = fn(*args, progress=job.update, **kwargs)
+        if job.rows_total:
+            job.rows_done = job.rows_total
+        job.status = DONE
+    except JobCancelled:
+        job.status = CANCELLED
+    except Exception as e:
+        job.error = f"{type(e).__name__}: {e}"
+        job.status = FAILED
+    finally:
+        job.metrics_records = end_run(write=False)
+        job.finished = time.time()
+
+def _purge_locked():
+    # job selesai yang lebih tua dari NADI_JOB_TTL_MINUTES dilupakan (hasil ikut dilepas)
+    cutoff = time.time() - JOB_TTL
+    for job_id in [j.id for j in _jobs.values() if not j.active and j.finished and j.finished < cutoff]:
+        del _jobs[job_id]
+
+def submit_job(fn, *args, label="analisis", rows_total=None, patients_total=None, metrics=False, **kwargs):
+    # Return: job_id. fn dipanggil di thread pool sebagai fn(*args, progress=..., **kwargs)
+    job = Job(label, rows_total=rows_total, patients_total=patients_total, metrics=metrics)
+    with _jobs_lock:
+        _purge_locked()
+        _jobs[job.id] = job
+    job.future = _get_pool().submit(_run, job, fn, args, kwargs)
+    return job.id
+
+def get_job(job_id):
+    if not job_id:
+        return None
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def cancel_job(job_id):
+    # job antri langsung dibatalkan; job berjalan berhenti di panggilan progress berikutnya
+    job = get_job(job_id)
+    if job is None or not job.active:
+        return False
+    job._cancel.set()
+    if job.future is not None and job.future.cancel():
+        job.status = CANCELLED
+        job.finished = time.time()
+    return True
+
+def take_result(job_id):
+    # hasil job selesai diambil sekali (lalu dilepas dari job supaya memori tidak tertahan)
+    job = get_job(job_id)
+    if job is None or job.status != DONE or job.result is None:
+        return None
+    result, job.result = job.result, None
+    return result
+
+def queue_position(job_id):
+    # 1 = job antri berikutnya yang akan dijalankan; None jika job tidak sedang antri
+    job = get_job(job_id)
+    if job is None or job.status != QUEUED:
+        return None
+    with _jobs_lock:
+        return sum(1 for j in _jobs.values() if j.status == QUEUED and j.submitted <= job.submitted)
+
+def list_jobs():
+    with _jobs_lock:
+        return sorted(_jobs.values(), key=lambda j: j.submitted)
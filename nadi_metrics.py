@@ -0,0 +1,128 @@
+# nadi_metrics.py — NADI (RK4) — instrumentasi per tahap (waktu, jumlah baris, delta RSS)
+# ============================================================
+# Pemakaian:
+#   run = begin_run("input", enabled=True, file="x.csv")
+#   with stage("read_file") as s:
+#       df = ...; s.rows = len(df)
+#   records = end_run()
+# atau, supaya run selalu ditutup (juga saat st.stop() / exception keluar dari blok):
+#   with metrics_run("input", enabled=True):
+#       ...
+# Tanpa run aktif (diagnostik mati), stage() hanya mengembalikan objek no-op bersama.
+# Run bersifat per thread: job background (nadi_jobs) membuka run sendiri di worker, record-nya
+# disimpan di job (end_run(write=False)) lalu digabung ke run UI saat hasil diambil (add_records).
+
+from contextlib import contextmanager
+import json
+import os
+import resource
+import threading
+import time
+
+LOG_PATH = os.environ.get("NADI_METRICS_LOG", "nadi_metrics.jsonl")
+
+_local = threading.local()
+_log_lock = threading.Lock()
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def _rss_bytes():
+    # RSS saat ini (Linux: /proc/self/statm), fallback ke max RSS proses
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _maxrss_bytes():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class _NullStage:
+    rows = None
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def __setattr__(self, key, value): pass
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    __slots__ = ("run", "name", "rows", "t0", "rss0", "maxrss0")
+
+    def __init__(self, run, name, rows):
+        self.run = run
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.rss0 = _rss_bytes()
+        self.maxrss0 = _maxrss_bytes()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.t0
+        self.run.records.append({
+            "stage": self.name,
+            "seconds": round(seconds, 6),
+            "rows": self.rows,
+            "rows_per_sec": round(self.rows / seconds) if self.rows and seconds > 0 else None,
+            "rss_delta_mb": round((_rss_bytes() - self.rss0) / 2**20, 2),
+            "peak_rss_delta_mb": round((_maxrss_bytes() - self.maxrss0) / 2**20, 2),
+            "error": None if exc_type is None else exc_type.__name__,
+        })
+        return False
+
+class Run:
+    def __init__(self, flow, context):
+        self.flow = flow
+        self.context = context
+        self.records = []
+        self.started = time.time()
+
+def begin_run(flow, enabled=True, **context):
+    # enabled=False -> tidak ada run aktif, semua stage() jadi no-op
+    _local.run = Run(flow, context) if enabled else None
+    return _local.run
+
+def current_run():
+    return getattr(_local, "run", None)
+
+def stage(name, rows=None):
+    run = getattr(_local, "run", None)
+    if run is None:
+        return _NULL_STAGE
+    return _Stage(run, name, rows)
+
+def add_records(records, prefix=""):
+    # record dari thread lain (mis. job background) -> run aktif thread ini; nama tahap diberi
+    # prefix supaya terbedakan dari tahap UI
+    run = getattr(_local, "run", None)
+    if run is None or not records:
+        return
+    run.records.extend({**rec, "stage": prefix + rec["stage"]} for rec in records)
+
+def end_run(log_path=None, write=True):
+    # lepas run aktif & tulis record sebagai JSON lines (satu baris per tahap);
+    # write=False -> record hanya dikembalikan
+    run = getattr(_local, "run", None)
+    _local.run = None
+    if run is None:
+        return []
+    log_path = log_path or LOG_PATH
+    if write and log_path and run.records:
+        base = {"ts": run.started, "flow": run.flow, **run.context}
+        with _log_lock, open(log_path, "a", encoding="utf-8") as f:
+            for rec in run.records:
+                f.write(json.dumps({**base, **rec}, default=str) + "\n")
+    return run.records
+
+@contextmanager
+def metrics_run(flow, enabled=True, **context):
+    # begin_run + jaminan end_run: run yang masih aktif saat blok selesai (termasuk keluar lewat
+    # StopException st.stop() atau exception) ditutup & ditulis, tidak bocor ke rerun berikutnya
+    # di thread yang sama. end_run() di dalam blok (render_diagnostics) tetap boleh.
+    run = begin_run(flow, enabled=enabled, **context)
+    try:
+        yield run
+    finally:
+        if run is not None and current_run() is run:
+            end_run()
@@ -0,0 +1,331 @@
+# nadi_results.py — NADI (RK4) — query hasil di server: filter, paginasi, agregat
+# ============================================================
+# Tabel hasil bisa berjuta baris; browser hanya menerima satu halaman. Filter dijalankan
+# di server sebagai mask vektor, agregat dihitung sekali saat hasil disimpan.
+# Hasil disimpan di store bersama per proses (bukan per sesi): sesi hanya memegang handle,
+# memori dibatasi budget (LRU), hasil yang tergusur ditulis ke disk dan dimuat ulang saat dibuka.
+# Handle bisa dibagikan lewat URL (?hasil=), jadi hasil tidak pernah dihapus eksplisit: hanya
+# tergusur LRU ke disk, file spill dihapus setelah NADI_RESULT_MAX_AGE_HOURS.
+
+from bisect import bisect_left
+from collections import OrderedDict
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+
+import pandas as pd
+import numpy as np
+
+from nadi_schema import flag, has_flags, frame_nbytes, compact_summary, PATIENT_COLS, SOURCE_COL
+from nadi_engine import summarize_result
+from nadi_charts import population_aggregates
+from nadi_trends import patient_trends
+
+PAGE_SIZES = [50, 100, 500, 1000]
+KINDS = ["Semua", "Hipertensi", "Hipotensi"]
+
+def result_aggregates(result):
+    # agregat untuk tabel baris (Anom_Total dst.) maupun ringkasan per pasien (Jumlah_Anomali)
+    agg = {"rows": len(result), "patients": int(result["Nama"].nunique()) if "Nama" in result else 0}
+    if has_flags(result):
+        anom = flag(result, "Anom_Total")
+        agg["anom_rows"] = int(anom.sum())
+        agg["hipertensi_rows"] = int(flag(result, "Hipertensi").sum())
+        agg["hipotensi_rows"] = int(flag(result, "Hipotensi").sum())
+        agg["anom_patients"] = int(result["Nama"][anom].nunique())
+    elif "Jumlah_Anomali" in result.columns:
+        agg["anom_rows"] = int(result["Jumlah_Anomali"].sum())
+        agg["anom_patients"] = int((result["Jumlah_Anomali"] > 0).sum())
+    return agg
+
+class PatientIndex:
+    # ringkasan per pasien (satu baris per pasien, kolom Nama + PATIENT_COLS) dengan
+    #   get(nama)      -> O(1) (hash index pandas)
+    #   search(awalan) -> O(log n + k) lewat urutan nama huruf kecil (permutasi int64 saja,
+    #                     dibangun saat pertama dipakai)
+    #   rows(nama)     -> potongan baris pasien di tabel hasil (hasil terurut per pasien), tanpa scan
+    def __init__(self, summary, result=None):
+        if not summary.index.equals(pd.RangeIndex(len(summary))):
+            summary = summary.reset_index(drop=True)
+        self.summary = summary
+        self._names = pd.Index(np.asarray(summary["Nama"], dtype=object))
+        self._order = None
+        self._bounds = None
+        if result is not None and isinstance(result["Nama"].dtype, pd.CategoricalDtype):
+            # baris tiap kategori bersebelahan (output analyze_population) -> [awal, akhir) per pasien
+            codes = result["Nama"].cat.codes.to_numpy()
+            if len(codes) and (codes >= 0).all() and (np.diff(codes) >= 0).all():
+                cats = result["Nama"].cat.categories
+                sizes = np.bincount(codes, minlength=len(cats))
+                ends = np.cumsum(sizes)
+                pos = cats.get_indexer(self._names)
+                known = pos >= 0
+                self._bounds = np.zeros((len(pos), 2), dtype="int64")
+                self._bounds[known, 0] = (ends - sizes)[pos[known]]
+                self._bounds[known, 1] = ends[pos[known]]
+
+    def __getstate__(self):
+        # spill: nama (objek string) & urutan pencarian dibangun ulang dari summary saat dimuat
+        return {"summary": self.summary, "_bounds": self._bounds}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._names = pd.Index(np.asarray(self.summary["Nama"], dtype=object))
+        self._order = None
+
+    def __len__(self):
+        return len(self.summary)
+
+    @property
+    def has_rows(self):
+        return self._bounds is not None
+
+    def position(self, name):
+        try:
+            pos = self._names.get_loc(name)
+        except KeyError:
+            return None
+        return pos if isinstance(pos, (int, np.integer)) else None
+
+    def get(self, name):
+        pos = self.position(name)
+        return None if pos is None else self.summary.iloc[pos]
+
+    def take(self, names):
+        # baris ringkasan untuk daftar nama (urutan dipertahankan, nama tak dikenal dilewati)
+        pos = self._names.get_indexer(pd.unique(np.asarray(names, dtype=object)))
+        return self.summary.iloc[pos[pos >= 0]]
+
+    def search(self, prefix, limit=50):
+        # nama yang diawali prefix (tanpa beda huruf besar/kecil), urut alfabet
+        if self._order is None:
+            keys = self._names.astype(str).str.lower().to_numpy(dtype=object)
+            self._order = np.argsort(keys, kind="stable")
+        names, order = self._names, self._order
+        def key(i):
+            return str(names[i]).lower()
+        prefix = str(prefix).strip().lower()
+        start = bisect_left(order, prefix, key=key)
+        stop = start
+        while stop < len(order) and stop - start < limit and key(order[stop]).startswith(prefix):
+            stop += 1
+        return self.summary.iloc[order[start:stop]]
+
+    def rows(self, frame, name):
+        # Return: baris pasien dari tabel hasil (frame yang sama dengan saat index dibuat) atau None
+        pos = self.position(name)
+        if pos is None or self._bounds is None:
+            return None
+        start, stop = self._bounds[pos]
+        return frame.iloc[start:stop]
+
+def _patient_summary(result, patients=None):
+    # tabel pasien engine (index Nama) -> frame berkolom Nama; hasil streaming / inkremental
+    # sudah berupa ringkasan per pasien; selain itu diringkas dari tabel baris
+    if patients is not None and set(PATIENT_COLS).issubset(patients.columns):
+        return summarize_result(result, patients)
+    if "Nama" not in result.columns:
+        return None
+    if has_flags(result) and "Tanggal" in result.columns:
+        return summarize_result(result, patients)
+    if set(PATIENT_COLS).issubset(result.columns):
+        return result
+    return None
+
+def prepare_result(result, predictions=None):
+    # hasil + index ringkasan per pasien + agregat & agregat grafik (dihitung sekali), disimpan
+    # bersama supaya rerun tidak menghitung ulang. predictions: tabel pasien dari analyze_population
+    summary = _patient_summary(result, predictions)
+    if summary is not None and summary is not result and has_flags(result) and len(result):
+        # statistik tren (rata-rata bergerak, run hipertensi, prediksi RK4 turunan least-squares)
+        # seluruh populasi dalam satu pass, ditempel ke ringkasan per pasien
+        trends = patient_trends(result).reindex(np.asarray(summary["Nama"], dtype=object))
+        summary = pd.concat([summary, trends.reset_index(drop=True).set_axis(summary.index)], axis=1)
+    if summary is not None:
+        # ringkasan juga berskema ringkas (Nama category, float32) di memori maupun file spill
+        if summary is result:
+            result = summary = compact_summary(result)
+        else:
+            summary = compact_summary(summary)
+    patients = None if summary is None else PatientIndex(summary, result if has_flags(result) else None)
+    return {"frame": result, "patients": patients, "agg": result_aggregates(result),
+            "charts": population_aggregates(result, summary)}
+
+def _date_col(result):
+    for col in ("Tanggal", "Tanggal_Terakhir"):
+        if col in result.columns:
+            return col
+    return None
+
+def _name_mask(names, query):
+    # kategori: cocokkan di daftar kategori (unik) dulu, lalu isin -> O(kategori + baris)
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        cats = names.cat.categories
+        hit = cats[cats.astype(str).str.contains(query, case=False, regex=False)]
+        return names.isin(hit).to_numpy()
+    return names.astype(str).str.contains(query, case=False, regex=False).to_numpy()
+
+def filter_mask(result, anomalies_only=False, name=None, date_from=None, date_to=None, kind="Semua",
+                source="Semua", sustained_only=False):
+    mask = np.ones(len(result), dtype=bool)
+    if sustained_only and "Hipertensi_Menetap" in result.columns:
+        mask &= result["Hipertensi_Menetap"].to_numpy(dtype=bool)
+    if anomalies_only:
+        if has_flags(result):
+            mask &= flag(result, "Anom_Total")
+        elif "Jumlah_Anomali" in result.columns:
+            mask &= result["Jumlah_Anomali"].to_numpy() > 0
+    if kind in ("Hipertensi", "Hipotensi") and has_flags(result):
+        mask &= flag(result, kind)
+    if name:
+        mask &= _name_mask(result["Nama"], name.strip())
+    if source not in (None, "Semua") and SOURCE_COL in result.columns:
+        # category -> bandingkan kode, tanpa string per baris
+        src = result[SOURCE_COL].cat
+        mask &= src.codes.to_numpy() == src.categories.get_loc(source)
+    col = _date_col(result)
+    if col is not None and (date_from is not None or date_to is not None):
+        tgl = pd.to_datetime(result[col])
+        if date_from is not None:
+            mask &= (tgl >= pd.Timestamp(date_from)).to_numpy()
+        if date_to is not None:
+            # date_to inklusif sepanjang hari itu
+            mask &= (tgl < pd.Timestamp(date_to) + pd.Timedelta(days=1)).to_numpy()
+    return mask
+
+def query_result(result, page=0, page_size=100, **filters):
+    # Return: (DataFrame satu halaman, jumlah baris yang cocok, jumlah halaman)
+    if any(v not in (None, False, "", "Semua") for v in filters.values()):
+        idx = np.flatnonzero(filter_mask(result, **filters))
+    else:
+        idx = None
+    total = len(result) if idx is None else len(idx)
+    n_pages = max(1, -(-total // page_size))
+    page = min(max(int(page), 0), n_pages - 1)
+    start, stop = page * page_size, (page + 1) * page_size
+    rows = result.iloc[start:stop] if idx is None else result.iloc[idx[start:stop]]
+    return rows, total, n_pages
+
+# -----------------------
+# SHARED RESULT STORE (LRU + spill ke disk)
+# -----------------------
+RESULT_BUDGET_BYTES = int(float(os.environ.get("NADI_RESULT_BUDGET_MB", "1024")) * 2**20)
+RESULT_DIR = os.environ.get("NADI_RESULT_DIR", "hasil_cache")
+RESULT_MAX_AGE = float(os.environ.get("NADI_RESULT_MAX_AGE_HOURS", "24")) * 3600
+
+_results = OrderedDict()     # handle -> (view, context, nbytes), urutan LRU
+_results_bytes = 0
+_spilling = {}               # handle -> (view, context) yang sedang ditulis ke disk
+_results_lock = threading.Lock()
+_HANDLE_RE = re.compile(r"[0-9a-f]{32}")
+
+def _spill_path(handle):
+    return os.path.join(RESULT_DIR, f"{handle}.pkl")
+
+def _view_nbytes(view):
+    patients = view.get("patients")
+    if patients is None or patients.summary is view["frame"]:    # hasil streaming = ringkasan
+        return frame_nbytes(view["frame"])
+    return frame_nbytes(view["frame"]) + frame_nbytes(patients.summary)
+
+def _evict_locked():
+    # hasil paling lama tidak dipakai keluar dari memori; yang terbaru selalu tetap di memori
+    global _results_bytes
+    victims = []
+    while _results_bytes > RESULT_BUDGET_BYTES and len(_results) > 1:
+        handle, (view, context, nbytes) = _results.popitem(last=False)
+        _results_bytes -= nbytes
+        _spilling[handle] = (view, context)
+        victims.append(handle)
+    return victims
+
+def _spill(victims):
+    # ditulis di luar lock; selama penulisan hasil tetap bisa diambil dari _spilling
+    for handle in victims:
+        try:
+            view, context = _spilling[handle]
+            try:
+                # file sudah ada (hasil dimuat ulang dari disk): cukup perbarui mtime supaya umur
+                # NADI_RESULT_MAX_AGE_HOURS dihitung dari pemakaian terakhir
+                os.utime(_spill_path(handle))
+            except OSError:
+                os.makedirs(RESULT_DIR, exist_ok=True)
+                tmp = _spill_path(handle) + ".tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump((view, context), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, _spill_path(handle))
+        finally:
+            with _results_lock:
+                _spilling.pop(handle, None)
+
+def _insert(handle, view, context):
+    global _results_bytes
+    nbytes = _view_nbytes(view)
+    with _results_lock:
+        _results[handle] = (view, context, nbytes)
+        _results_bytes += nbytes
+        victims = _evict_locked()
+    _spill(victims)
+
+def _sweep_disk():
+    # file spill lebih tua dari NADI_RESULT_MAX_AGE_HOURS dihapus
+    if not os.path.isdir(RESULT_DIR):
+        return
+    cutoff = time.time() - RESULT_MAX_AGE
+    for fname in os.listdir(RESULT_DIR):
+        path = os.path.join(RESULT_DIR, fname)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def put_result(view, context):
+    # view: hasil prepare_result (dihitung di job / pemanggil, di sini hanya disimpan)
+    # Return: handle (string hex) untuk disimpan di sesi / URL
+    handle = uuid.uuid4().hex
+    _insert(handle, view, context)
+    _sweep_disk()
+    return handle
+
+def get_result(handle):
+    # Return: (view, context) atau (None, None) jika handle tidak dikenal / sudah kedaluwarsa
+    if not handle or not _HANDLE_RE.fullmatch(str(handle)):
+        return None, None
+    with _results_lock:
+        hit = _results.get(handle)
+        if hit is not None:
+            _results.move_to_end(handle)
+            return hit[0], hit[1]
+        hit = _spilling.get(handle)
+    if hit is None:
+        try:
+            with open(_spill_path(handle), "rb") as f:
+                hit = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None, None
+        try:
+            os.utime(_spill_path(handle))       # dibuka lagi (mis. lewat URL) -> TTL mulai ulang
+        except OSError:
+            pass
+    with _results_lock:
+        if handle in _results:
+            return _results[handle][0], _results[handle][1]
+    _insert(handle, *hit)
+    return hit
+
+def release_result(handle):
+    # sesi tidak memakai hasil ini lagi (reset / diganti hasil baru). Tidak dihapus: handle bisa
+    # masih dibuka lewat URL bersama -> hanya jadi kandidat pertama untuk digusur ke disk (LRU)
+    if not handle or not _HANDLE_RE.fullmatch(str(handle)):
+        return
+    with _results_lock:
+        if handle in _results:
+            _results.move_to_end(handle, last=False)
+
+def result_store_stats():
+    with _results_lock:
+        return {"in_memory": len(_results), "bytes": _results_bytes, "budget": RESULT_BUDGET_BYTES}
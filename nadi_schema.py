@@ -0,0 +1,102 @@
+# nadi_schema.py — NADI (RK4) — skema kolom ringkas untuk frame upload & hasil
+# ============================================================
+# Skema ringkas (per baris):
+#   Nama       category            (~1-4 byte kode, bukan objek string per baris)
+#   Tanggal    datetime64[ns]      (8 byte)
+#   Systolic   float32             (4 byte; tensi bilangan bulat 40..250 -> eksak, NaN = kosong)
+#   Diastolic  float32             (4 byte)
+#   Anom_Kode  uint8               (bit 0 = Hipertensi, bit 1 = Hipotensi; != 0 -> Anom_Total)
+#   Sumber_File category           (opsional: hanya jika beberapa file di-upload sekaligus)
+# Prediksi RK4 tidak lagi disimpan sebagai kolom baris yang hampir semuanya NaN, tapi di
+# tabel samping per pasien (index Nama, kolom PATIENT_COLS: jumlah data/anomali, tanggal
+# pertama/terakhir, bacaan terakhir, Prediksi_Systolic, Prediksi_Diastolic).
+# Layout lama (3 kolom bool + 2 kolom prediksi) hanya dibentuk saat export / tampilan.
+# Tensi berdesimal (84.3) tidak eksak di float32: hitungan (RK4, tren) & export memakai
+# pressure_values (float64, dibulatkan kembali ke nilai input) supaya tidak muncul 84.29999542.
+
+import pandas as pd
+import numpy as np
+
+PRESSURE_DTYPE = "float32"
+# float32 menyimpan tensi < 1000 dengan galat < 3.1e-5 -> pembulatan ke 4 desimal mengembalikan
+# nilai input (maks. 4 desimal) persis
+PRESSURE_DECIMALS = 4
+FLAG_HIPERTENSI = 1
+FLAG_HIPOTENSI = 2
+FLAG_COLUMN = "Anom_Kode"
+FLAG_NAMES = {"Hipertensi": FLAG_HIPERTENSI, "Hipotensi": FLAG_HIPOTENSI,
+              "Anom_Total": FLAG_HIPERTENSI | FLAG_HIPOTENSI}
+SOURCE_COL = "Sumber_File"
+PRED_COLS = ["Prediksi_Systolic", "Prediksi_Diastolic"]
+# kolom ringkasan per pasien (= summarize_result / ringkasan mode streaming, tanpa Nama)
+PATIENT_COLS = ["Jumlah_Data", "Jumlah_Anomali", "Tanggal_Pertama", "Tanggal_Terakhir",
+                "Systolic_Terakhir", "Diastolic_Terakhir"] + PRED_COLS
+
+def pressure_values(values):
+    # tensi (float32 / apa pun) -> float64 seperti nilai di file, untuk hitungan & export
+    return np.round(np.asarray(values, dtype="float64"), PRESSURE_DECIMALS)
+
+def compact_readings(df):
+    # cast in-place kolom tensi & nama ke skema ringkas (kolom lain dibiarkan)
+    for col in ("Systolic", "Diastolic"):
+        if col in df.columns and df[col].dtype != PRESSURE_DTYPE:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(PRESSURE_DTYPE)
+    if "Nama" in df.columns and not isinstance(df["Nama"].dtype, pd.CategoricalDtype):
+        df["Nama"] = df["Nama"].astype("category")
+    return df
+
+def compact_summary(summary):
+    # ringkasan per pasien -> skema ringkas: Nama category, kolom float (tensi, prediksi, tren)
+    # float32; salinan dangkal, kolom lain dibiarkan
+    out = compact_readings(summary.copy(deep=False))
+    for col in out.columns:
+        if out[col].dtype == "float64":
+            out[col] = out[col].astype(PRESSURE_DTYPE)
+    return out
+
+def pack_flags(hipertensi, hipotensi):
+    return (np.asarray(hipertensi, dtype="uint8") * FLAG_HIPERTENSI
+            | np.asarray(hipotensi, dtype="uint8") * FLAG_HIPOTENSI)
+
+def has_flags(frame):
+    return FLAG_COLUMN in frame.columns or "Anom_Total" in frame.columns
+
+def flag(frame, name):
+    # bool array Hipertensi / Hipotensi / Anom_Total dari frame ringkas maupun layout lama
+    if FLAG_COLUMN in frame.columns:
+        return (frame[FLAG_COLUMN].to_numpy() & FLAG_NAMES[name]) != 0
+    return frame[name].to_numpy(dtype=bool)
+
+def empty_patients():
+    dtypes = {"Jumlah_Data": "int64", "Jumlah_Anomali": "int64", "Tanggal_Pertama": "datetime64[ns]",
+              "Tanggal_Terakhir": "datetime64[ns]", "Systolic_Terakhir": "float64",
+              "Diastolic_Terakhir": "float64", "Prediksi_Systolic": "float64", "Prediksi_Diastolic": "float64"}
+    return pd.DataFrame({c: pd.Series(dtype=dtypes[c]) for c in PATIENT_COLS},
+                        index=pd.Index([], dtype=object, name="Nama"))
+
+def expand_result(result, predictions=None):
+    # layout lama untuk export / tampilan: kolom bool + (opsional) prediksi di baris terakhir
+    # tiap pasien. result harus terurut per pasien (seperti output analyze_population).
+    # predictions: tabel per pasien berindex Nama dengan PRED_COLS (mis. tabel pasien engine).
+    if FLAG_COLUMN not in result.columns:
+        return result
+    out = result.drop(columns=FLAG_COLUMN)
+    for col in ("Systolic", "Diastolic"):
+        out[col] = pressure_values(out[col])
+    for name in FLAG_NAMES:
+        out[name] = flag(result, name)
+    if predictions is not None:
+        codes = out["Nama"].cat.codes.to_numpy() if isinstance(out["Nama"].dtype, pd.CategoricalDtype) \
+            else pd.factorize(out["Nama"])[0]
+        is_last = np.ones(len(out), dtype=bool)
+        is_last[:-1] = codes[1:] != codes[:-1]
+        last_pos = np.flatnonzero(is_last)
+        pred = predictions.reindex(out["Nama"].to_numpy()[last_pos].astype(object))
+        for col in PRED_COLS:
+            values = np.full(len(out), np.nan)
+            values[last_pos] = pred[col].to_numpy(dtype="float64")
+            out[col] = values
+    return out
+
+def frame_nbytes(df):
+    return int(df.memory_usage(deep=True, index=False).sum())
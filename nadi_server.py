@@ -0,0 +1,373 @@
+# nadi_server.py — NADI (RK4) — layanan HTTP lokal untuk bacaan tensi dari alat (micro-batch)
+# ============================================================
+# Alat tensi mengirim bacaan langsung (tanpa export CSV ke halaman Input):
+#   POST /readings   satu bacaan {"Nama": .., "Tanggal": .., "Systolic": .., "Diastolic": ..}
+#                    atau banyak: [ {...}, ... ] / {"readings": [ {...}, ... ]}
+#                    -> {"results": [per bacaan, urutan sama: flag anomali + prediksi RK4], "batch": {...}}
+#   GET  /health     -> {"status": "ok"}
+#   GET  /stats      -> jumlah bacaan / batch, rata-rata ukuran batch, latensi
+# Request tidak dianalisis satu per satu: bacaan dari semua request yang masuk dalam jendela
+# NADI_BATCH_WINDOW_MS (atau sampai NADI_BATCH_SIZE bacaan) digabung jadi satu DataFrame, lalu
+# detect_anomaly_df + rk4_forecast_bp dijalankan sekali per batch. Latensi per request dibatasi
+# jendela batch + waktu analisis satu batch.
+# Prediksi RK4 per bacaan memakai bacaan sebelumnya dari pasien yang sama (urutan kedatangan);
+# bacaan terakhir per pasien disimpan di memori proses (bacaan pertama pasien: prediksi null).
+# Tanggal kosong = waktu terima server; Tanggal yang dikirim tapi tidak bisa dibaca tidak
+# diganti waktu terima: bacaan itu tidak dianalisis / disimpan dan hasilnya berisi "error".
+# Body tidak valid (tipe kolom salah, tensi bukan angka) ditolak 400 sebelum masuk antrian;
+# jika analisis satu batch tetap gagal, tiap request dianalisis sendiri supaya error hanya
+# sampai ke request penyebabnya.
+#
+#   python nadi_server.py --port 8502 --window-ms 50 --batch-size 5000
+#   curl -X POST localhost:8502/readings -d '{"Nama": "Budi", "Systolic": 150, "Diastolic": 95}'
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+import numpy as np
+
+from nadi_engine import detect_anomaly_df, rk4_forecast_bp
+from nadi_dates import DateParser
+
+BATCH_WINDOW = float(os.environ.get("NADI_BATCH_WINDOW_MS", "50")) / 1000
+BATCH_SIZE = int(os.environ.get("NADI_BATCH_SIZE", "5000"))
+REQUEST_TIMEOUT = float(os.environ.get("NADI_REQUEST_TIMEOUT", "30"))
+MAX_REQUEST_READINGS = int(os.environ.get("NADI_MAX_REQUEST_READINGS", "100000"))
+
+FIELDS = ["Nama", "Tanggal", "Systolic", "Diastolic"]
+REQUIRED = ("Nama", "Systolic", "Diastolic")
+
+# -----------------------
+# ANALISIS PER BATCH (state bacaan terakhir per pasien)
+# -----------------------
+class ReadingAnalyzer:
+    def __init__(self):
+        self._slots = {}                                  # nama -> posisi di array state
+        self._last_sys = np.full(1024, np.nan)
+        self._last_dia = np.full(1024, np.nan)
+        self._dates = DateParser()                        # format Tanggal diinferensi sekali, cache nilai
+
+    def _slot_ids(self, names):
+        # posisi state untuk tiap nama unik di batch (nama baru mendapat slot baru)
+        slots = np.empty(len(names), dtype="int64")
+        fresh = np.zeros(len(names), dtype=bool)
+        for i, name in enumerate(names):
+            slot = self._slots.get(name)
+            if slot is None:
+                slot = self._slots[name] = len(self._slots)
+                fresh[i] = True
+            slots[i] = slot
+        if len(self._slots) > len(self._last_sys):
+            size = max(len(self._slots), 2 * len(self._last_sys))
+            for attr in ("_last_sys", "_last_dia"):
+                grown = np.full(size, np.nan)
+                old = getattr(self, attr)
+                grown[:len(old)] = old
+                setattr(self, attr, grown)
+        return slots, fresh
+
+    def analyze(self, records, received):
+        # records: list dict (dari parse_readings). Return: list dict hasil, urutan sama dengan input
+        batch = pd.DataFrame.from_records(records, columns=FIELDS)
+        batch["Systolic"] = batch["Systolic"].astype("float64")
+        batch["Diastolic"] = batch["Diastolic"].astype("float64")
+        sent = batch["Tanggal"].notna().to_numpy()
+        tgl = self._dates.parse(batch["Tanggal"])
+        bad = sent & tgl.isna().to_numpy()
+        batch["Tanggal"] = tgl.fillna(pd.Timestamp.fromtimestamp(received).floor("s"))
+        if not bad.any():
+            return self._analyze(batch)
+        out = [{"Nama": records[i]["Nama"], "Tanggal": records[i]["Tanggal"],
+                "error": "Tanggal tidak valid; bacaan tidak dianalisis"} if b else None
+               for i, b in enumerate(bad)]
+        good = np.flatnonzero(~bad)
+        for i, res in zip(good, self._analyze(batch.iloc[good].reset_index(drop=True)) if len(good) else []):
+            out[i] = res
+        return out
+
+    def _analyze(self, batch):
+        c = detect_anomaly_df(batch)
+
+        # bacaan sebelumnya: baris sebelumnya di batch untuk pasien yang sama, atau state
+        codes, names = pd.factorize(c["Nama"], sort=False)
+        slots, _ = self._slot_ids(names)
+        order = np.argsort(codes, kind="stable")
+        sys_v = c["Systolic"].to_numpy()
+        dia_v = c["Diastolic"].to_numpy()
+        sorted_codes = codes[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_codes[1:] != sorted_codes[:-1]
+        prev_sys = np.empty(len(order))
+        prev_dia = np.empty(len(order))
+        prev_sys[1:], prev_dia[1:] = sys_v[order][:-1], dia_v[order][:-1]
+        prev_sys[first] = self._last_sys[slots[sorted_codes[first]]]
+        prev_dia[first] = self._last_dia[slots[sorted_codes[first]]]
+        fc_sys, fc_dia = rk4_forecast_bp(np.column_stack([prev_sys, sys_v[order]]),
+                                         np.column_stack([prev_dia, dia_v[order]]))
+        pred_sys = np.empty(len(order))
+        pred_dia = np.empty(len(order))
+        pred_sys[order], pred_dia[order] = fc_sys[:, 0], fc_dia[:, 0]
+
+        tanggal = c["Tanggal"].dt.strftime("%Y-%m-%dT%H:%M:%S").to_numpy(dtype=object)
+        out = [{"Nama": n, "Tanggal": t, "Systolic": _num(s), "Diastolic": _num(d),
+                 "Hipertensi": bool(hi), "Hipotensi": bool(lo), "Anom_Total": bool(an),
+                 "Prediksi_Systolic": _num(ps), "Prediksi_Diastolic": _num(pd_)}
+                for n, t, s, d, hi, lo, an, ps, pd_ in zip(
+                    c["Nama"].to_numpy(dtype=object), tanggal, sys_v.tolist(), dia_v.tolist(),
+                    c["Hipertensi"].to_numpy(), c["Hipotensi"].to_numpy(), c["Anom_Total"].to_numpy(),
+                    pred_sys.tolist(), pred_dia.tolist())]
+
+        # bacaan terakhir tiap pasien di batch -> state (langkah terakhir: batch yang gagal di
+        # atas tidak mengubah state, jadi aman dianalisis ulang per request)
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = sorted_codes[1:] != sorted_codes[:-1]
+        self._last_sys[slots[sorted_codes[last]]] = sys_v[order][last]
+        self._last_dia[slots[sorted_codes[last]]] = dia_v[order][last]
+        return out
+
+    @property
+    def patients(self):
+        return len(self._slots)
+
+def _num(v):
+    # NaN -> null di JSON
+    return None if v != v else round(v, 2)
+
+# -----------------------
+# MICRO-BATCHER
+# -----------------------
+class _Pending:
+    __slots__ = ("records", "received", "done", "results", "error", "batch_size")
+
+    def __init__(self, records):
+        self.records = records
+        self.received = time.time()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+        self.batch_size = 0
+
+class MicroBatcher:
+    # request mengantri; satu thread mengambil bacaan yang terkumpul selama `window` detik
+    # (dihitung dari request tertua) atau sampai `max_batch` bacaan, lalu menganalisis sekaligus
+    def __init__(self, analyzer=None, window=BATCH_WINDOW, max_batch=BATCH_SIZE):
+        self.analyzer = analyzer or ReadingAnalyzer()
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = []
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._stats = {"requests": 0, "readings": 0, "batches": 0, "batch_seconds": 0.0,
+                       "max_latency_ms": 0.0, "latency_ms_total": 0.0}
+        self._thread = threading.Thread(target=self._loop, name="nadi-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, records, timeout=REQUEST_TIMEOUT):
+        # Return: (list hasil per bacaan, ukuran batch). TimeoutError jika melewati timeout.
+        item = _Pending(records)
+        with self._cond:
+            self._queue.append(item)
+            self._queued += len(records)
+            self._cond.notify()
+        if not item.done.wait(timeout):
+            raise TimeoutError("analisis batch melewati batas waktu")
+        if item.error is not None:
+            raise item.error
+        return item.results, item.batch_size
+
+    def _take(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].received + self.window
+            while self._queued < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            # request utuh; request yang sendirian melebihi max_batch tetap diproses sekali jalan
+            taken, n = [], 0
+            while self._queue and (not taken or n + len(self._queue[0].records) <= self.max_batch):
+                item = self._queue.pop(0)
+                taken.append(item)
+                n += len(item.records)
+            self._queued -= n
+            return taken, n
+
+    def _loop(self):
+        while True:
+            taken, n = self._take()
+            records = [r for item in taken for r in item.records]
+            t0 = time.perf_counter()
+            try:
+                results = self.analyzer.analyze(records, taken[0].received)
+                start = 0
+                for item in taken:
+                    item.results = results[start:start + len(item.records)]
+                    start += len(item.records)
+            except Exception as e:
+                if len(taken) == 1:
+                    taken[0].error = e
+                else:
+                    # batch gagal: analisis ulang per request, error hanya untuk request penyebabnya
+                    for item in taken:
+                        try:
+                            item.results = self.analyzer.analyze(item.records, item.received)
+                        except Exception as e:
+                            item.error = e
+            elapsed = time.perf_counter() - t0
+            now = time.time()
+            for item in taken:
+                item.batch_size = n
+                item.done.set()
+            with self._cond:
+                s = self._stats
+                s["requests"] += len(taken)
+                s["readings"] += n
+                s["batches"] += 1
+                s["batch_seconds"] += elapsed
+                for item in taken:
+                    latency = (now - item.received) * 1000
+                    s["latency_ms_total"] += latency
+                    s["max_latency_ms"] = max(s["max_latency_ms"], latency)
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            queued = self._queued
+        return {"requests": s["requests"], "readings": s["readings"], "batches": s["batches"],
+                "queued": queued, "patients": self.analyzer.patients,
+                "avg_batch": s["readings"] / s["batches"] if s["batches"] else 0.0,
+                "avg_batch_ms": 1000 * s["batch_seconds"] / s["batches"] if s["batches"] else 0.0,
+                "avg_latency_ms": s["latency_ms_total"] / s["requests"] if s["requests"] else 0.0,
+                "max_latency_ms": s["max_latency_ms"],
+                "window_ms": self.window * 1000, "batch_size": self.max_batch}
+
+# -----------------------
+# HTTP
+# -----------------------
+def _pressure(value, i, key):
+    # angka JSON atau string angka -> float; selain itu ditolak (bool juga, walau subclass int)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"bacaan #{i}: {key} harus angka")
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"bacaan #{i}: {key} harus angka, bukan {value!r}") from None
+
+def parse_readings(payload):
+    # Return: list dict bacaan bertipe bersih (Nama str, Tanggal str / None, tensi float);
+    # ValueError dengan pesan yang bisa dikirim ke klien
+    if isinstance(payload, dict) and "readings" in payload:
+        payload = payload["readings"]
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list) or not payload:
+        raise ValueError("body harus objek bacaan, list bacaan, atau {\"readings\": [...]}")
+    if len(payload) > MAX_REQUEST_READINGS:
+        raise ValueError(f"maksimal {MAX_REQUEST_READINGS} bacaan per request")
+    records = []
+    for i, r in enumerate(payload):
+        if not isinstance(r, dict):
+            raise ValueError(f"bacaan #{i} bukan objek JSON")
+        missing = [k for k in REQUIRED if r.get(k) in (None, "")]
+        if missing:
+            raise ValueError(f"bacaan #{i}: kolom wajib kosong {missing}")
+        nama, tanggal = r["Nama"], r.get("Tanggal")
+        if isinstance(nama, bool) or not isinstance(nama, (str, int)) or not str(nama).strip():
+            raise ValueError(f"bacaan #{i}: Nama harus teks")
+        if tanggal is not None and not isinstance(tanggal, str):
+            raise ValueError(f"bacaan #{i}: Tanggal harus teks tanggal")
+        records.append({"Nama": str(nama).strip(), "Tanggal": (tanggal or "").strip() or None,
+                        "Systolic": _pressure(r["Systolic"], i, "Systolic"),
+                        "Diastolic": _pressure(r["Diastolic"], i, "Diastolic")})
+    return records
+
+class ReadingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive: alat bisa memakai ulang koneksi
+    batcher = None
+    quiet = True
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send(200, self.batcher.stats())
+        else:
+            self._send(404, {"error": "tidak ditemukan"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/readings":
+            self._send(404, {"error": "tidak ditemukan"})
+            return
+        t0 = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            records = parse_readings(json.loads(self.rfile.read(length) or b"null"))
+        except (ValueError, UnicodeDecodeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        try:
+            results, batch_size = self.batcher.submit(records)
+        except TimeoutError as e:
+            self._send(503, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(200, {"results": results,
+                         "batch": {"size": batch_size, "latency_ms": round((time.perf_counter() - t0) * 1000, 1)}})
+
+    def log_message(self, fmt, *args):
+        if not self.quiet:
+            super().log_message(fmt, *args)
+
+class ReadingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024           # default socketserver (5) menolak koneksi saat banyak alat mengirim bersamaan
+
+def make_server(host="127.0.0.1", port=8502, window=BATCH_WINDOW, max_batch=BATCH_SIZE, quiet=True):
+    # server belum berjalan: panggil serve_forever() (atau di thread untuk uji di localhost)
+    handler = type("NadiReadingHandler", (ReadingHandler,),
+                   {"batcher": MicroBatcher(window=window, max_batch=max_batch), "quiet": quiet})
+    return ReadingServer((host, port), handler)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="nadi_server", description="NADI (RK4) — layanan HTTP bacaan tensi (micro-batch)")
+    ap.add_argument("--host", default="127.0.0.1", help="alamat bind (default: 127.0.0.1)")
+    ap.add_argument("--port", type=int, default=8502, help="port (default: 8502)")
+    ap.add_argument("--window-ms", type=float, default=BATCH_WINDOW * 1000,
+                    help="jendela micro-batch dalam ms (NADI_BATCH_WINDOW_MS)")
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                    help="maksimal bacaan per batch (NADI_BATCH_SIZE)")
+    ap.add_argument("-v", "--verbose", action="store_true", help="log tiap request")
+    args = ap.parse_args(argv)
+
+    server = make_server(args.host, args.port, window=args.window_ms / 1000, max_batch=args.batch_size,
+                         quiet=not args.verbose)
+    print(f"NADI reading service di http://{args.host}:{server.server_address[1]} "
+          f"(jendela {args.window_ms:g} ms, batch maks {args.batch_size})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
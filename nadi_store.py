@@ -0,0 +1,233 @@
+# nadi_store.py — NADI (RK4) — state per pasien persisten (SQLite) untuk upload inkremental
+# ============================================================
+# Klinik meng-upload export kumulatif tiap minggu. Store ini menyimpan per pasien:
+# 2 bacaan terakhir (untuk RK4), counter anomali, prediksi terakhir, dan high-water mark
+# (Tanggal terbaru yang sudah diproses) + jumlah bacaan di Tanggal itu. Upload berikutnya
+# hanya memproses baris yang lebih baru dari high-water mark pasien tersebut, plus bacaan di
+# Tanggal yang sama di luar n_last bacaan pertama (urutan file) yang sudah diproses.
+# Butuh kolom Tanggal yang ter-parse di semua baris (lihat incremental_problem): tanggal buatan
+# dari posisi baris / hasil ffill tidak bisa dibandingkan dengan high-water mark.
+
+from datetime import datetime
+import os
+import sqlite3
+
+import pandas as pd
+import numpy as np
+
+from nadi_engine import detect_anomaly_df, _date_sort_key
+from nadi_ingest import (BASE_COLS, FLAG_COLS, STATE_COLS, _empty_state, _row_stats,
+                         _merge_last_two, _merge_stats, _last_prev, _finalize_stream)
+from nadi_metrics import stage
+from nadi_schema import pressure_values
+
+STORE_PATH = os.environ.get("NADI_STORE", "nadi_store.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pasien (
+    nama        TEXT PRIMARY KEY,
+    n_rows      INTEGER NOT NULL,
+    n_valid     INTEGER NOT NULL,
+    n_anom      INTEGER NOT NULL,
+    first_date  TEXT,
+    last_date   TEXT,               -- high-water mark
+    n_last      INTEGER,            -- jumlah bacaan di last_date (NULL: store lama, tidak diketahui)
+    last_tgl    TEXT,
+    last_sys    REAL,
+    last_dia    REAL,
+    prev_tgl    TEXT,
+    prev_sys    REAL,
+    prev_dia    REAL,
+    pred_sys    REAL,
+    pred_dia    REAL,
+    updated_at  TEXT NOT NULL
+)
+"""
+
+_COLS = ["nama","n_rows","n_valid","n_anom","first_date","last_date","n_last","last_tgl","last_sys",
+         "last_dia","prev_tgl","prev_sys","prev_dia","pred_sys","pred_dia","updated_at"]
+
+def connect(db_path=None):
+    conn = sqlite3.connect(db_path or STORE_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(SCHEMA)
+    if "n_last" not in {row[1] for row in conn.execute("PRAGMA table_info(pasien)")}:
+        with conn:
+            conn.execute("ALTER TABLE pasien ADD COLUMN n_last INTEGER")
+    return conn
+
+def incremental_problem(raw_columns, date_report):
+    # Return: pesan kenapa mode inkremental ditolak untuk upload ini, atau None
+    if "Tanggal" not in raw_columns:
+        return ("Mode inkremental butuh kolom Tanggal: tanpa Tanggal, baris baru tidak bisa "
+                "dibedakan dari baris yang sudah diproses.")
+    bad = (date_report or {}).get("rows_invalid", 0)
+    if bad:
+        return (f"Mode inkremental ditolak: {bad} baris dengan Tanggal kosong/tidak valid. "
+                "Perbaiki Tanggal di file atau matikan mode inkremental.")
+    return None
+
+def _iso(ts):
+    return None if pd.isna(ts) else pd.Timestamp(ts).isoformat()
+
+def load_state(conn, names):
+    # state tersimpan untuk nama-nama di upload (via temp table, bukan IN (...) raksasa)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _upload_names (nama TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM _upload_names")
+    conn.executemany("INSERT OR IGNORE INTO _upload_names VALUES (?)", ((n,) for n in names))
+    stored = pd.read_sql_query(
+        "SELECT p.* FROM pasien p JOIN _upload_names u ON u.nama = p.nama", conn)
+    for col in ("first_date", "last_date", "last_tgl", "prev_tgl"):
+        stored[col] = pd.to_datetime(stored[col], errors="coerce")
+    return stored.set_index("nama")
+
+def _stored_as_state(stored):
+    # 2 bacaan tersimpan -> baris state (seq negatif: lebih lama dari baris upload mana pun)
+    parts = []
+    for tgl, s, d, seq in (("prev_tgl","prev_sys","prev_dia",-2), ("last_tgl","last_sys","last_dia",-1)):
+        rows = stored.loc[stored[tgl].notna() | stored[s].notna() | stored[d].notna()]
+        parts.append(pd.DataFrame({"Nama": rows.index.to_numpy(dtype=object),
+                                   "Tanggal": rows[tgl].to_numpy(),
+                                   "Systolic": rows[s].to_numpy(dtype="float64"),
+                                   "Diastolic": rows[d].to_numpy(dtype="float64"),
+                                   "_seq": np.full(len(rows), seq, dtype="int64")}))
+    rows = pd.concat(parts, ignore_index=True)
+    if rows.empty:
+        return _empty_state()
+    rows["_key"] = _date_sort_key(rows["Tanggal"])
+    return rows[STATE_COLS]
+
+def _stored_as_stats(stored):
+    return pd.DataFrame({
+        "first_seq": np.iinfo(np.int64).max, "n_rows": stored["n_rows"].to_numpy(),
+        "n_valid": stored["n_valid"].to_numpy(), "n_anom": stored["n_anom"].to_numpy(),
+        "first_date": stored["first_date"].to_numpy(), "last_date": stored["last_date"].to_numpy(),
+    }, index=pd.Index(stored.index.to_numpy(dtype=object), name="Nama"))
+
+def _new_rows_mask(work, stored):
+    # baris upload yang belum diproses: pasien baru, Tanggal > high-water mark, atau bacaan ke
+    # n_last+1 dst. (urutan file) di Tanggal = high-water mark. Pasien tersimpan tanpa
+    # high-water mark (store lama, semua Tanggal kosong): bacaan ke n_rows+1 dst.
+    names = work["Nama"]
+    known = names.isin(stored.index).to_numpy()
+    tgl = work["Tanggal"].to_numpy()
+    hwm = stored["last_date"].reindex(names).to_numpy()
+    is_new = ~known | (tgl > hwm)
+    for mask, count in ((known & (tgl == hwm), "n_last"), (known & np.isnat(hwm), "n_rows")):
+        if mask.any():
+            seen = stored[count].reindex(names[mask]).to_numpy(dtype="float64")
+            is_new[mask] = names[mask].groupby(names[mask]).cumcount().to_numpy() >= seen
+    return is_new
+
+def _count_at_last(c, touched, stats):
+    # n_last baru: bacaan di last_date (tersimpan jika high-water mark tidak bergeser + baris baru)
+    last = stats["last_date"]
+    at_last = c["Tanggal"].to_numpy() == last.reindex(c["Nama"]).to_numpy()
+    counted = c.loc[at_last].groupby("Nama").size().reindex(stats.index, fill_value=0)
+    kept = touched["n_last"].where(touched["last_date"] == last.reindex(touched.index), 0)
+    return counted + kept.reindex(stats.index, fill_value=0)     # NULL tetap NULL
+
+def incremental_analyze(df, db_path=None):
+    # df: frame ternormalisasi (load_upload / read_table) dengan Tanggal asli dari file
+    # (cek dulu incremental_problem).
+    # Return: (summary pasien yang tersentuh atau None, baris baru beranotasi,
+    #          alert_names (anomali di baris baru), processing_errors, info)
+    if "Tanggal" not in df.columns:
+        raise ValueError("Mode inkremental butuh kolom Tanggal")
+    work = df.loc[df["Nama"].notna(), BASE_COLS].reset_index(drop=True)
+    work["Nama"] = work["Nama"].astype(str).astype(object)
+    for col in ("Systolic", "Diastolic"):
+        work[col] = pressure_values(work[col])      # state & prediksi dari nilai float64 seperti di file
+    if work["Tanggal"].isna().any():
+        raise ValueError(f"Mode inkremental ditolak: {int(work['Tanggal'].isna().sum())} baris tanpa Tanggal valid")
+    info = {"rows_total": len(work), "rows_new": 0, "patients_new": 0, "patients_updated": 0}
+
+    conn = connect(db_path)
+    try:
+        with stage("store_load"):
+            names = pd.unique(work["Nama"])
+            stored = load_state(conn, names)
+
+        # hanya baris setelah high-water mark pasien (pasien baru: semua baris)
+        new_rows = work.loc[_new_rows_mask(work, stored)]
+        info["rows_new"] = len(new_rows)
+        if new_rows.empty:
+            return None, new_rows, [], [], info
+
+        with stage("store_analyze", rows=len(new_rows)):
+            c = detect_anomaly_df(new_rows)
+            c["_seq"] = np.arange(len(c), dtype="int64")
+            c["_key"] = _date_sort_key(c["Tanggal"])
+            touched = stored.loc[stored.index.isin(pd.unique(c["Nama"]))]
+            info["patients_updated"] = len(touched)
+            info["patients_new"] = int(c["Nama"].nunique()) - len(touched)
+
+            stats = _merge_stats(_stored_as_stats(touched), _row_stats(c))
+            n_last = _count_at_last(c, touched, stats)
+            state = _merge_last_two(_stored_as_state(touched), c[STATE_COLS])
+            summary, _, processing_errors = _finalize_stream(state, stats)
+
+            # alert = pasien dengan anomali di baris baru (urutan kemunculan pertama)
+            new_anom = c.loc[c["Anom_Total"], "Nama"]
+            alert_names = list(pd.unique(new_anom))
+
+        with stage("store_write", rows=len(stats)):
+            _upsert(conn, state, stats, summary, n_last)
+
+        order = np.lexsort((c["_key"].to_numpy(), pd.factorize(c["Nama"])[0]))
+        new_out = c.iloc[order][BASE_COLS + FLAG_COLS].reset_index(drop=True)
+        return summary, new_out, alert_names, processing_errors, info
+    finally:
+        conn.close()
+
+def _upsert(conn, state, stats, summary, n_last):
+    last, prev = _last_prev(state, stats.index)
+    pred = pd.DataFrame(index=stats.index, columns=["pred_sys","pred_dia"], dtype="float64")
+    if summary is not None:
+        s = summary.set_index("Nama")
+        pred.loc[s.index, "pred_sys"] = s["Prediksi_Systolic"].to_numpy()
+        pred.loc[s.index, "pred_dia"] = s["Prediksi_Diastolic"].to_numpy()
+    def iso(col):
+        col = pd.to_datetime(pd.Series(col, index=stats.index))
+        return col.map(_iso, na_action="ignore")
+
+    out = pd.DataFrame({
+        "nama": stats.index.to_numpy(dtype=object),
+        "n_rows": stats["n_rows"].to_numpy(dtype="int64"),
+        "n_valid": stats["n_valid"].to_numpy(dtype="int64"),
+        "n_anom": stats["n_anom"].to_numpy(dtype="int64"),
+        "first_date": iso(stats["first_date"].to_numpy()).to_numpy(),
+        "last_date": iso(stats["last_date"].to_numpy()).to_numpy(),
+        "n_last": n_last.to_numpy(dtype="float64"),
+        "last_tgl": iso(last["Tanggal"].to_numpy()).to_numpy(),
+        "last_sys": last["Systolic"].to_numpy(dtype="float64"),
+        "last_dia": last["Diastolic"].to_numpy(dtype="float64"),
+        "prev_tgl": iso(prev["Tanggal"].to_numpy()).to_numpy(),
+        "prev_sys": prev["Systolic"].to_numpy(dtype="float64"),
+        "prev_dia": prev["Diastolic"].to_numpy(dtype="float64"),
+        "pred_sys": pred["pred_sys"].to_numpy(dtype="float64"),
+        "pred_dia": pred["pred_dia"].to_numpy(dtype="float64"),
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+    })[_COLS]
+    out = out.astype(object).where(out.notna(), None)
+    rows = list(out.itertuples(index=False, name=None))
+    placeholders = ",".join("?" * len(_COLS))
+    updates = ",".join(f"{c}=excluded.{c}" for c in _COLS[1:])
+    with conn:
+        conn.executemany(f"INSERT INTO pasien ({','.join(_COLS)}) VALUES ({placeholders}) "
+                         f"ON CONFLICT(nama) DO UPDATE SET {updates}", rows)
+
+def store_summary(db_path=None):
+    # seluruh isi store sebagai tabel ringkasan (kolom sama dengan summarize_result)
+    conn = connect(db_path)
+    try:
+        p = pd.read_sql_query("SELECT * FROM pasien ORDER BY nama", conn)
+    finally:
+        conn.close()
+    return pd.DataFrame({
+        "Nama": p["nama"], "Jumlah_Data": p["n_rows"], "Jumlah_Anomali": p["n_anom"],
+        "Tanggal_Pertama": pd.to_datetime(p["first_date"]), "Tanggal_Terakhir": pd.to_datetime(p["last_tgl"]),
+        "Systolic_Terakhir": p["last_sys"], "Diastolic_Terakhir": p["last_dia"],
+        "Prediksi_Systolic": p["pred_sys"], "Prediksi_Diastolic": p["pred_dia"],
+    })
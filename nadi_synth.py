@@ -0,0 +1,94 @@
+# nadi_synth.py — NADI (RK4) — generator data tensi sintetis (skema template upload)
+# ============================================================
+# Contoh:
+#   python nadi_synth.py --patients 10000 --readings 30 -o sintetis.csv
+#   python nadi_synth.py --rows 10000000 --missing 0.02 --bad-dates 0.01 -o besar.csv
+
+import argparse
+import sys
+
+import pandas as pd
+import numpy as np
+
+BAD_DATE_VALUES = np.array(["", "kemarin", "31/02/2024", "2024-13-01", "-", "N/A"], dtype=object)
+
+def generate_population(n_patients=1000, readings_per_patient=10, missing_rate=0.0,
+                        bad_date_rate=0.0, anomaly_rate=0.1, seed=0, start="2024-01-01",
+                        shuffle=True, date_format="%Y-%m-%d"):
+    # Riwayat tensi multi-pasien: Nama, Tanggal (string, seperti hasil export), Systolic, Diastolic.
+    # readings_per_patient = rata-rata (jumlah per pasien ~ Poisson, minimal 1).
+    # anomaly_rate = proporsi bacaan yang didorong ke hipertensi / hipotensi.
+    rng = np.random.default_rng(seed)
+    counts = np.maximum(rng.poisson(readings_per_patient, n_patients), 1)
+    n = int(counts.sum())
+    pid = np.repeat(np.arange(n_patients), counts)
+    # urutan bacaan di dalam pasien (0..count-1) -> tanggal harian berurutan per pasien
+    within = np.arange(n) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    base_sys = rng.normal(122, 10, n_patients)
+    base_dia = rng.normal(79, 7, n_patients)
+    drift = rng.normal(0, 0.15, n_patients)          # tren pelan per pasien (mmHg / hari)
+    systolic = base_sys[pid] + drift[pid] * within + rng.normal(0, 6, n)
+    diastolic = base_dia[pid] + 0.5 * drift[pid] * within + rng.normal(0, 4, n)
+
+    anom = rng.random(n) < anomaly_rate
+    high = rng.random(n) < 0.7
+    systolic = np.where(anom & high, rng.normal(160, 12, n), systolic)
+    diastolic = np.where(anom & high, rng.normal(100, 8, n), diastolic)
+    systolic = np.where(anom & ~high, rng.normal(84, 5, n), systolic)
+    diastolic = np.where(anom & ~high, rng.normal(55, 4, n), diastolic)
+
+    offset = rng.integers(0, 30, n_patients)[pid] + within
+    tanggal = (pd.Timestamp(start) + pd.to_timedelta(offset, unit="D")).strftime(date_format)
+    tanggal = np.asarray(tanggal, dtype=object)
+    if bad_date_rate > 0:
+        bad = rng.random(n) < bad_date_rate
+        tanggal[bad] = rng.choice(BAD_DATE_VALUES, int(bad.sum()))
+
+    df = pd.DataFrame({
+        "Nama": np.char.add("Pasien_", pid.astype(str)),
+        "Tanggal": tanggal,
+        "Systolic": np.round(systolic).astype("float64"),
+        "Diastolic": np.round(diastolic).astype("float64"),
+    })
+    if missing_rate > 0:
+        df.loc[rng.random(n) < missing_rate, "Systolic"] = np.nan
+        df.loc[rng.random(n) < missing_rate, "Diastolic"] = np.nan
+    if shuffle:
+        # export klinik biasanya tidak terurut per pasien
+        df = df.iloc[rng.permutation(n)].reset_index(drop=True)
+    return df
+
+def generate_rows(n_rows, readings_per_patient=10, **kwargs):
+    # ukuran ditentukan lewat jumlah baris (1k .. 10M); jumlah pasien diturunkan dari rata-rata bacaan
+    n_patients = max(1, int(round(n_rows / max(readings_per_patient, 1))))
+    df = generate_population(n_patients=n_patients, readings_per_patient=readings_per_patient, **kwargs)
+    return df.iloc[:n_rows].reset_index(drop=True) if len(df) > n_rows else df
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="nadi_synth", description="Generator data tensi sintetis NADI")
+    ap.add_argument("-o", "--out", required=True, help="file output (.csv / .xlsx)")
+    ap.add_argument("--rows", type=int, default=None, help="target jumlah baris (mengabaikan --patients)")
+    ap.add_argument("--patients", type=int, default=1000)
+    ap.add_argument("--readings", type=float, default=10, help="rata-rata bacaan per pasien")
+    ap.add_argument("--missing", type=float, default=0.0, help="proporsi nilai tensi kosong")
+    ap.add_argument("--bad-dates", type=float, default=0.0, help="proporsi tanggal rusak")
+    ap.add_argument("--anomaly", type=float, default=0.1, help="proporsi bacaan hipertensi/hipotensi")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    opts = dict(missing_rate=args.missing, bad_date_rate=args.bad_dates,
+                anomaly_rate=args.anomaly, seed=args.seed)
+    if args.rows:
+        df = generate_rows(args.rows, readings_per_patient=args.readings, **opts)
+    else:
+        df = generate_population(n_patients=args.patients, readings_per_patient=args.readings, **opts)
+    if args.out.lower().endswith(".xlsx"):
+        df.to_excel(args.out, index=False)
+    else:
+        df.to_csv(args.out, index=False)
+    print(f"{len(df)} baris, {df['Nama'].nunique()} pasien -> {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+# nadi_trends.py — NADI (RK4) — statistik tren per pasien untuk riwayat panjang
+# ============================================================
+# Analisis dasar hanya melihat dua bacaan terakhir (turunan RK4 = selisih keduanya) dan flag
+# per baris. Di sini, per pasien:
+#   - rata-rata bergerak NADI_TREND_WINDOWS bacaan (default 7 & 30; awal riwayat memakai bacaan
+#     yang sudah ada, NaN dilewati);
+#   - run hipertensi: jumlah bacaan hipertensi berturut-turut sampai baris itu; run terakhir
+#     >= NADI_SUSTAINED_READINGS -> hipertensi menetap;
+#   - kemiringan least-squares NADI_SLOPE_WINDOW bacaan terakhir (mmHg per bacaan), dipakai
+#     sebagai turunan RK4 (Prediksi_Tren_*) yang tidak terseret satu bacaan menyimpang.
+# Seluruh populasi dihitung sekaligus dari jumlah kumulatif di atas tabel hasil yang terurut
+# per pasien: jendela = selisih dua cumsum -> O(n), tanpa loop per pasien / per jendela.
+# Posisi x untuk least-squares = urutan bacaan di dalam pasien (bukan posisi global) dan
+# jumlah x / x^2 dihitung dengan int64 (eksak), supaya selisih cumsum tetap presisi.
+
+import os
+
+import pandas as pd
+import numpy as np
+
+from nadi_engine import rk4_forecast_bp
+from nadi_schema import flag, has_flags, pressure_values
+
+TREND_WINDOWS = tuple(int(w) for w in os.environ.get("NADI_TREND_WINDOWS", "7,30").split(","))
+SLOPE_WINDOW = int(os.environ.get("NADI_SLOPE_WINDOW", "7"))
+SUSTAINED_READINGS = int(os.environ.get("NADI_SUSTAINED_READINGS", "3"))
+
+# -----------------------
+# JENDELA PER PASIEN (cumsum)
+# -----------------------
+def group_starts(codes):
+    # codes bersebelahan per pasien -> (posisi baris pertama pasien untuk tiap baris, posisi
+    # baris pertama tiap pasien)
+    new = np.ones(len(codes), dtype=bool)
+    new[1:] = codes[1:] != codes[:-1]
+    first = np.flatnonzero(new)
+    return first[np.cumsum(new) - 1], first
+
+def _cumsum0(values, dtype="float64"):
+    # cumsum berawalan 0: jumlah baris [a, b) = out[b] - out[a]
+    out = np.zeros(len(values) + 1, dtype=dtype)
+    np.cumsum(values, out=out[1:])
+    return out
+
+def _window_sum(csum, start, window, at):
+    # jumlah baris [max(i - window + 1, awal pasien), i] untuk tiap posisi i di `at`
+    hi = at + 1
+    return csum[hi] - csum[np.maximum(hi - window, start[at])]
+
+def rolling_mean(values, start, window, at=None):
+    v = np.asarray(values, dtype="float64")
+    at = np.arange(len(v)) if at is None else at
+    ok = ~np.isnan(v)
+    total = _window_sum(_cumsum0(np.where(ok, v, 0.0)), start, window, at)
+    count = _window_sum(_cumsum0(ok, "int64"), start, window, at)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / count                  # jendela tanpa nilai: 0/0 -> NaN
+
+def rolling_slope(values, start, window, at=None):
+    # kemiringan regresi linear y ~ x di tiap jendela (x = urutan bacaan); < 2 nilai -> NaN
+    v = np.asarray(values, dtype="float64")
+    at = np.arange(len(v)) if at is None else at
+    ok = ~np.isnan(v)
+    x = np.arange(len(v), dtype="int64") - start
+    y = np.where(ok, v, 0.0)
+    xo = np.where(ok, x, 0)
+    n = _window_sum(_cumsum0(ok, "int64"), start, window, at)
+    sx = _window_sum(_cumsum0(xo, "int64"), start, window, at)
+    sxx = _window_sum(_cumsum0(xo * xo, "int64"), start, window, at)
+    sy = _window_sum(_cumsum0(y), start, window, at)
+    sxy = _window_sum(_cumsum0(xo * y), start, window, at)
+    denom = (n * sxx - sx * sx).astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denom > 0, (n * sxy - sx * sy) / denom, np.nan)
+
+def hypertension_runs(hyper, start):
+    # panjang run bacaan hipertensi berturut-turut yang berakhir di tiap baris (0 = bukan hipertensi)
+    h = np.asarray(hyper, dtype=bool)
+    idx = np.arange(len(h))
+    breaks = np.maximum(np.where(h, -1, idx), start - 1)
+    return np.where(h, idx - np.maximum.accumulate(breaks), 0)
+
+# -----------------------
+# TABEL HASIL -> TREN
+# -----------------------
+def _sorted_view(result):
+    # Return: (codes terurut, nama pasien per code, urutan baris atau None jika sudah terurut)
+    names = result["Nama"]
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        codes, cats = names.cat.codes.to_numpy(), names.cat.categories
+    else:
+        codes, cats = pd.factorize(names, sort=False)
+    order = None
+    if len(codes) > 1 and (np.diff(codes) < 0).any():
+        # bukan output analyze_population: satukan baris tiap pasien (urutan di dalam pasien tetap)
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+    return codes, pd.Index(np.asarray(cats, dtype=object), name="Nama"), order
+
+def _column(result, col, order):
+    v = pressure_values(result[col])
+    return v if order is None else v[order]
+
+def rolling_trends(result, windows=TREND_WINDOWS, slope_window=SLOPE_WINDOW):
+    # per baris (index sama dengan result): MA{w}_Systolic/Diastolic, Tren_Systolic/Diastolic
+    # (mmHg per bacaan) dan Run_Hipertensi. Untuk potongan kecil (drill-down satu pasien) atau
+    # export; ringkasan populasi cukup patient_trends.
+    codes, _, order = _sorted_view(result)
+    start, _ = group_starts(codes)
+    out = {}
+    for col in ("Systolic", "Diastolic"):
+        v = _column(result, col, order)
+        for w in windows:
+            out[f"MA{w}_{col}"] = rolling_mean(v, start, w).astype("float32")
+        out[f"Tren_{col}"] = rolling_slope(v, start, slope_window).astype("float32")
+    if has_flags(result):
+        hyper = flag(result, "Hipertensi")
+        out["Run_Hipertensi"] = hypertension_runs(hyper if order is None else hyper[order], start).astype("int32")
+    trends = pd.DataFrame(out)
+    if order is not None:
+        trends = trends.iloc[np.argsort(order, kind="stable")]
+    trends.index = result.index
+    return trends
+
+def patient_trends(result, windows=TREND_WINDOWS, slope_window=SLOPE_WINDOW, sustained=SUSTAINED_READINGS):
+    # satu baris per pasien (index Nama, urutan kemunculan): nilai jendela pada bacaan terakhir,
+    # run hipertensi terakhir & terpanjang, Hipertensi_Menetap, dan prediksi RK4 dengan turunan
+    # = kemiringan least-squares. Jendela hanya dievaluasi di bacaan terakhir tiap pasien.
+    codes, cats, order = _sorted_view(result)
+    if not len(codes):
+        return pd.DataFrame(index=pd.Index([], dtype=object, name="Nama"))
+    start, first = group_starts(codes)
+    last = np.append(first[1:], len(codes)) - 1
+    out = {}
+    latest = {}
+    for col in ("Systolic", "Diastolic"):
+        v = _column(result, col, order)
+        latest[col] = v[last]
+        for w in windows:
+            out[f"MA{w}_{col}"] = rolling_mean(v, start, w, at=last)
+        out[f"Tren_{col}"] = rolling_slope(v, start, slope_window, at=last)
+    if has_flags(result):
+        hyper = flag(result, "Hipertensi")
+        runs = hypertension_runs(hyper if order is None else hyper[order], start)
+        out["Run_Hipertensi"] = runs[last].astype("int32")
+        out["Run_Hipertensi_Maks"] = np.maximum.reduceat(runs, first).astype("int32")
+        out["Hipertensi_Menetap"] = out["Run_Hipertensi"] >= sustained
+    fc_sys, fc_dia = rk4_forecast_bp(latest["Systolic"][:, None], latest["Diastolic"][:, None],
+                                     slopes=(out["Tren_Systolic"], out["Tren_Diastolic"]))
+    out["Prediksi_Tren_Systolic"] = fc_sys[:, 0]
+    out["Prediksi_Tren_Diastolic"] = fc_dia[:, 0]
+    names = cats[codes[first]] if codes[0] >= 0 else pd.Index(
+        [cats[c] if c >= 0 else None for c in codes[first]], dtype=object, name="Nama")
+    return pd.DataFrame(out, index=names)
@@ -0,0 +1,5 @@
+# modul nadi_* ada di root repo (tanpa paket) -> root masuk sys.path untuk `pytest` maupun `python -m pytest`
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
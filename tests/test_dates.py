@@ -0,0 +1,41 @@
+# regresi nadi_dates: semua bentuk Tanggal yang dulu diterima pd.to_datetime tetap ter-parse
+import pandas as pd
+import pytest
+
+from nadi_dates import DateParser, parse_dates
+
+# nilai yang dulu ter-parse oleh pd.to_datetime(values) (parser sebelum nadi_dates)
+OLD_PARSER_VALUES = [
+    "2024-01-05", "2024-01-05 08:30", "2024-01-05 08:30:15", "2024-01-05T08:30:00",
+    "2024-01-05T08:30:00.123456", "2024/01/05", "2024/01/05 08:30:15", "20240105",
+    "January 5, 2024", "Jan 5 2024", "5 January 2024", "05-Jan-2024",
+]
+
+@pytest.mark.parametrize("value", OLD_PARSER_VALUES)
+def test_old_parser_formats_still_parse(value):
+    expected = pd.to_datetime(value)
+    # sendiri, dan bercampur dengan format utama lain (format diinferensi dari mayoritas)
+    alone, _ = parse_dates(pd.Series([value]))
+    mixed, report = parse_dates(pd.Series(["05/01/2024", "06/01/2024", "07/01/2024", value]))
+    assert alone[0] == expected
+    assert mixed[3] == expected
+    assert report["rows_invalid"] == 0
+
+def test_indonesian_and_invalid_values():
+    parsed, report = parse_dates(pd.Series(["5 Januari 2024", "Senin, 8 Mei 2023", "kemarin", "31/02/2024", None]))
+    assert parsed[0] == pd.Timestamp("2024-01-05")
+    assert parsed[1] == pd.Timestamp("2023-05-08")
+    assert parsed[2:].isna().all()
+    assert report["rows_invalid"] == 3
+
+def test_timezone_offsets_are_dropped():
+    parsed, _ = parse_dates(pd.Series(["2024-01-05", "2024-01-05T08:30:00+07:00"]))
+    assert parsed.dtype == "datetime64[ns]"
+    assert parsed[1] == pd.Timestamp("2024-01-05 08:30:00")
+
+def test_catch_all_results_are_cached():
+    parser = DateParser()
+    parser.parse(pd.Series(["2024-01-05", "January 5, 2024"]))
+    assert "January 5, 2024" in parser._cache
+    again = parser.parse(pd.Series(["January 5, 2024"]))
+    assert again[0] == pd.Timestamp("2024-01-05")
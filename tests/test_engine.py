@@ -0,0 +1,119 @@
+# regresi nadi_engine: hasil export sama dengan loop groupby per pasien sebelum vektorisasi
+# (analyze_population, jalur shard in-process & process pool)
+import numpy as np
+import pandas as pd
+import pytest
+
+import nadi_engine
+from nadi_engine import analyze_population, analyze_population_sharded, summarize_result
+from nadi_ingest import normalize_frame
+from nadi_schema import expand_result
+
+def _rk4_predict_value(last, prev, h=1.0):
+    slope = last - prev
+    def f(t, y): return slope
+    k1 = f(0, last)
+    k2 = f(h/2, last + h*k1/2)
+    k3 = f(h/2, last + h*k2/2)
+    k4 = f(h, last + h*k3)
+    return last + (h/6)*(k1 + 2*k2 + 2*k3 + k4)
+
+def baseline_analyze(raw):
+    # loop per pasien aplikasi awal (float64); sort stabil: bacaan bertanggal sama tetap urutan file
+    df = raw.copy()
+    df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors="coerce").ffill()
+    df["Systolic"] = pd.to_numeric(df["Systolic"], errors="coerce")
+    df["Diastolic"] = pd.to_numeric(df["Diastolic"], errors="coerce")
+    parts, alert_names, processing_errors = [], [], []
+    for name, g in df.groupby("Nama", sort=False):
+        g2 = g.sort_values("Tanggal", kind="stable").reset_index(drop=True)
+        g2 = g2[["Nama","Tanggal","Systolic","Diastolic"]].copy()
+        if g2["Systolic"].isna().all() and g2["Diastolic"].isna().all():
+            processing_errors.append(f"{name}: semua nilai Systolic/Diastolic kosong. Dilewati.")
+            continue
+        g2["Hipertensi"] = (g2["Systolic"] > 140) | (g2["Diastolic"] > 90)
+        g2["Hipotensi"] = (g2["Systolic"] < 90) | (g2["Diastolic"] < 60)
+        g2["Anom_Total"] = g2["Hipertensi"] | g2["Hipotensi"]
+        g2["Prediksi_Systolic"] = np.nan
+        g2["Prediksi_Diastolic"] = np.nan
+        if len(g2) >= 2:
+            g2.at[len(g2)-1, "Prediksi_Systolic"] = _rk4_predict_value(g2["Systolic"].iloc[-1], g2["Systolic"].iloc[-2])
+            g2.at[len(g2)-1, "Prediksi_Diastolic"] = _rk4_predict_value(g2["Diastolic"].iloc[-1], g2["Diastolic"].iloc[-2])
+        parts.append(g2)
+        if g2["Anom_Total"].any():
+            alert_names.append(name)
+    return pd.concat(parts, ignore_index=True), alert_names, processing_errors
+
+def make_population(n_rows=3000, n_patients=300, decimals=0, seed=7):
+    # nilai kosong, tanggal rusak / kosong, nama kosong, pasien tanpa tensi & pasien satu bacaan
+    rng = np.random.default_rng(seed)
+    names = np.array([f"P{i}" for i in range(n_patients)], dtype=object)
+    raw = pd.DataFrame({
+        "Nama": rng.choice(names, n_rows),
+        "Tanggal": (pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 90, n_rows), unit="D")).strftime("%Y-%m-%d"),
+        "Systolic": rng.normal(128, 22, n_rows).round(decimals),
+        "Diastolic": rng.normal(82, 13, n_rows).round(decimals),
+    })
+    raw.loc[rng.random(n_rows) < 0.05, "Systolic"] = np.nan
+    raw.loc[rng.random(n_rows) < 0.05, "Diastolic"] = np.nan
+    raw["Tanggal"] = raw["Tanggal"].astype(object)
+    raw.loc[rng.random(n_rows) < 0.03, "Tanggal"] = "bukan tanggal"
+    raw.loc[rng.random(n_rows) < 0.02, "Tanggal"] = None
+    raw.loc[rng.random(n_rows) < 0.01, "Nama"] = None
+    raw.loc[raw["Nama"] == "P3", ["Systolic", "Diastolic"]] = np.nan
+    single = pd.DataFrame({"Nama": ["Tunggal_A", "Tunggal_B"], "Tanggal": ["2024-02-01", "2024-02-02"],
+                           "Systolic": [150.5, 85.0], "Diastolic": [95.25, 55.0]})
+    return pd.concat([single, raw], ignore_index=True)
+
+def _export_csv(frame):
+    out = frame.copy()
+    out["Nama"] = out["Nama"].astype(object)
+    return out.to_csv(index=False)
+
+def test_decimal_readings_export_matches_float64_baseline():
+    # float32 internal tidak boleh bocor ke export (84.29999542236328 -> 84.3)
+    raw = make_population(decimals=2)
+    expected, _, _ = baseline_analyze(raw)
+    result, patients, _, _ = analyze_population(normalize_frame(raw.copy()))
+    assert _export_csv(expand_result(result, patients)) == _export_csv(expected)
+    assert (summarize_result(result, patients).to_csv(index=False)
+            == summarize_result(expected).to_csv(index=False))
+
+def _engine(raw, path):
+    df = normalize_frame(raw.copy())
+    if path == "unsharded":
+        return analyze_population(df)
+    if path == "pool":
+        return analyze_population_sharded(df, workers=2, min_rows=0, shard_rows=500)
+    # shard in-process (workers=1 dengan progress): urutan gabungan antar-shard tetap diuji
+    return analyze_population_sharded(df, workers=1, shard_rows=500, progress=lambda rows, patients: None)
+
+@pytest.mark.parametrize("path", ["unsharded", "pool", "shards_in_process"])
+def test_engine_matches_groupby_loop(path, monkeypatch):
+    monkeypatch.setattr(nadi_engine, "PROGRESS_MIN_ROWS", 0)
+    raw = make_population()
+    expected, alert_names, processing_errors = baseline_analyze(raw)
+    result, patients, alerts, errors = _engine(raw, path)
+    got = expand_result(result, patients)
+    got["Nama"] = got["Nama"].astype(object)
+    expected["Nama"] = expected["Nama"].astype(object)
+    expected["Tanggal"] = expected["Tanggal"].astype("datetime64[ns]")     # pandas 3: unit [us]
+    # flag, prediksi, urutan pasien & baris; nilai persis (bukan toleransi)
+    pd.testing.assert_frame_equal(got, expected, check_exact=True)
+    assert alerts == alert_names
+    assert errors == processing_errors
+    assert "P3: semua nilai Systolic/Diastolic kosong. Dilewati." in errors
+    assert np.isnan(patients.loc["Tunggal_A", "Prediksi_Systolic"])     # satu bacaan: tanpa prediksi
+
+def test_single_patient_reports_progress():
+    # satu pasien tidak bisa di-shard -> tetap lapor progress awal & akhir
+    raw = pd.DataFrame({"Nama": ["A"] * 60_000, "Tanggal": "2024-01-01", "Systolic": 150.0, "Diastolic": 95.0})
+    calls = []
+    analyze_population_sharded(normalize_frame(raw), workers=1, progress=lambda rows, patients: calls.append((rows, patients)))
+    assert calls == [(0, 0), (60_000, 1)]
+
+@pytest.mark.parametrize("value", ["abc", "160,100", "160;100;90;60"])
+def test_malformed_profile_env_falls_back_to_default(value, monkeypatch):
+    monkeypatch.setenv("NADI_PROFILE_PUSKESMAS", value)
+    profile = nadi_engine._env_profile("NADI_PROFILE_PUSKESMAS", "160,100,90,60")
+    assert (profile["sys_high"], profile["dia_high"], profile["sys_low"], profile["dia_low"]) == (160, 100, 90, 60)
@@ -0,0 +1,27 @@
+# regresi nadi_ingest: gabungan beberapa file upload
+import numpy as np
+import pandas as pd
+
+from nadi_ingest import _merge_uploads, normalize_frame
+from nadi_schema import SOURCE_COL
+
+def _frame(names):
+    n = len(names)
+    return normalize_frame(pd.DataFrame({"Nama": names, "Tanggal": ["2024-01-0%d" % (i + 1) for i in range(n)],
+                                         "Systolic": [150] * n, "Diastolic": [95] * n}))
+
+def test_merge_mixed_name_dtypes():
+    # nomor RM int, nomor RM float (ada sel kosong), dan nama teks di file berbeda
+    frames = [("a.csv", _frame([1001, 1002])), ("b.csv", _frame([1001.0, np.nan, 1003.0])),
+              ("c.csv", _frame(["Budi", "1002"]))]
+    df = _merge_uploads(frames)
+    assert isinstance(df["Nama"].dtype, pd.CategoricalDtype)
+    names = df["Nama"].astype(object)
+    assert names.isna().tolist() == [False, False, False, True, False, False, False]
+    assert names.dropna().tolist() == ["1001", "1002", "1001", "1003", "Budi", "1002"]
+    assert df["Nama"].cat.categories.tolist() == ["1001", "1002", "1003", "Budi"]
+    assert df[SOURCE_COL].astype(str).tolist() == ["a.csv"] * 2 + ["b.csv"] * 3 + ["c.csv"] * 2
+
+def test_merge_same_name_dtype_keeps_categories():
+    df = _merge_uploads([("a.csv", _frame([1, 2])), ("b.csv", _frame([2, 3]))])
+    assert df["Nama"].tolist() == [1, 2, 2, 3]
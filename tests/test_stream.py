@@ -0,0 +1,50 @@
+# regresi: mode streaming & store inkremental sama dengan analisis penuh di memori
+import io
+
+import numpy as np
+import pandas as pd
+
+from nadi_engine import analyze_population, summarize_result
+from nadi_ingest import iter_csv_chunks, normalize_frame, stream_population
+from nadi_store import incremental_analyze, store_summary
+from test_engine import make_population
+
+def _in_memory(raw):
+    result, patients, alerts, errors = analyze_population(normalize_frame(raw.copy()))
+    return summarize_result(result, patients), alerts, errors
+
+def test_stream_matches_in_memory_summary():
+    raw = make_population(decimals=1)
+    csv = raw.to_csv(index=False)
+    expected, alerts, errors = _in_memory(pd.read_csv(io.StringIO(csv)))
+    rows = io.StringIO()
+    summary, stream_alerts, stream_errors, total_rows = stream_population(
+        iter_csv_chunks(io.StringIO(csv), chunksize=397), rows)
+    assert total_rows == len(raw)
+    assert stream_alerts == alerts
+    # catatan parsing Tanggal hanya ada di mode streaming (mode memori: di date_report)
+    assert [m for m in stream_errors if not m.startswith("Tanggal")] == errors
+    summary["Nama"] = summary["Nama"].astype(object)
+    pd.testing.assert_frame_equal(summary, expected, check_exact=True, check_dtype=False)
+    assert len(pd.read_csv(io.StringIO(rows.getvalue()))) == raw["Nama"].notna().sum()
+
+def test_incremental_store_matches_full_recompute(tmp_path):
+    # export kumulatif: upload pertama = separuh awal file (urut Tanggal, batas jatuh di tengah
+    # bacaan bertanggal sama), upload kedua = seluruh file, upload ketiga = sama (tidak ada baru)
+    raw = make_population(decimals=1)
+    raw = raw.loc[pd.to_datetime(raw["Tanggal"], errors="coerce", format="%Y-%m-%d").notna()]
+    raw = raw.sort_values("Tanggal", kind="stable").reset_index(drop=True)
+    db = str(tmp_path / "store.sqlite3")
+    cut = len(raw) // 2
+    assert raw["Tanggal"].iloc[cut - 1] == raw["Tanggal"].iloc[cut]
+    for part in (raw.iloc[:cut], raw):
+        incremental_analyze(normalize_frame(part.copy()), db_path=db)
+    *_, info = incremental_analyze(normalize_frame(raw.copy()), db_path=db)
+    assert info["rows_new"] == 0
+
+    expected, _, _ = _in_memory(raw)
+    expected = expected.set_index("Nama")
+    got = store_summary(db).set_index("Nama").loc[expected.index]
+    assert got["Jumlah_Data"].sum() == raw["Nama"].notna().sum() - (raw["Nama"] == "P3").sum()
+    for col in expected.columns:
+        np.testing.assert_array_equal(got[col].to_numpy(), expected[col].to_numpy(), err_msg=col)